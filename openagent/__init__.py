@@ -9,12 +9,28 @@ from .chatclient import (
     Response, 
     ResponseStream,
     Chunk as RawChunk,
+    TextChunk,
+    StreamingOptions,
     Prompt,
     Options,
     FunctionTool,
     function_tool, 
     make_function_tool
     )
+from .tools import ToolError, ToolProgress, set_max_tool_concurrency, read_tool_result
+from .tool_cache import ToolCacheOptions, ToolCacheStats, get_tool_cache_stats, clear_tool_caches
+from .tool_router import ToolRouter, ToolRouterOptions, ToolRouterStats, get_tool_router_stats
+from .memory_store import BaseMemoryStore, InMemoryMemoryStore, SQLiteMemoryStore, MemoryStoreStats
+from .compaction import Compactor, CompactionOptions, CompactionStats, get_compaction_stats
+from .utils.multitask import ExecutorStats, register_executor, get_executor_stats
+from .balancer import LoadBalancedChatClient, EndpointConfig, EndpointStats, AffinityStats
+from .transport import TransportOptions, TransportStats, get_transport_stats
+from .llm_cache import BaseLLMCache, InMemoryLLMCache, SQLiteLLMCache
+from .ratelimit import RateLimitOptions, RateLimitStats, get_rate_limit_stats
+from .usage import TokenUsage, get_token_usage
+from .context_window import ContextWindowOptions, ContextWindowStats, ContextFitReport, get_context_window_stats
+from .hedging import HedgingOptions, HedgingStats, get_hedging_stats
+from .resilience import RetryPolicy, CircuitBreakerOptions, ResilienceStats, get_resilience_stats, call_with_retry
 # Agent Frameworks: Assistant Agent, ReAct, Plan and Execution, Agentic Workflows
 from .base_agent import (
     BaseAgent,
@@ -23,7 +39,7 @@ from .base_agent import (
     Chunk as AgentChunk,
     AgentContext
     )
-from .exceptions import ErrorCode, AgentException
+from .exceptions import ErrorCode, AgentException, CircuitOpenError
 from .react import ReactAgent
 from .assistant_agent import AssistantAgent
 from .sequential_workflow import SequentialWorkflow
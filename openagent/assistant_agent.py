@@ -2,7 +2,7 @@
 A simple assistant agent based on OpenAIChatClient.
 Supporting tool calls enabled by llm endpoint, such as openai and OpenAI API compatibily endpoint of ollama, vllm
 """
-import json
+import asyncio, json
 from typing import Optional, override, Any, Dict, List, Literal
 from pydantic import BaseModel, ValidationError
 from datetime import datetime
@@ -14,14 +14,22 @@ from .base_agent import (
     AgentContext,
     MessageType,
     MAX_STEPS,
+    OPENAGENT_STABLE_PROMPT,
+    OPENAGENT_MAX_TOOL_RESULT_TOKENS,
+    OPENAGENT_MEMORY_MAX_TOKENS,
     BaseChatClient,
     OpenAIChatClient,
     Options,
     Chunk,
+    Answer,
     AgentStream,
     ResponseStream,
     logging,
 )
+from .tools import ToolProgress, iter_tool_progress
+from .tool_router import ToolRouter, EmbedFunction
+from .memory_store import BaseMemoryStore
+from .compaction import Compactor
 from .utils import format_template_with_json
 from .exceptions import *
 from .mcp import *
@@ -165,6 +173,15 @@ class AssistantAgent(BaseAgent):
                  response_format:Optional[Dict[str, Any]] = None,
                  use_actor_tools:Optional[bool] = False, # use actor tools (implemented by AssistantAgent) or use llm tools
                  max_steps:Optional[int] = MAX_STEPS,
+                 stable_prompt:Optional[bool] = OPENAGENT_STABLE_PROMPT,
+                 max_tool_result_tokens:Optional[int] = OPENAGENT_MAX_TOOL_RESULT_TOKENS,
+                 memory_max_tokens:Optional[int] = OPENAGENT_MEMORY_MAX_TOKENS,
+                 memory_recall:Optional[int] = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 memory_compactor:Optional[Compactor] = None,
+                 tool_router:Optional[ToolRouter] = None,
                  logger:Optional[logging.Logger] = None,
                  verbose:Optional[bool] = False) -> None:
         # don't clone tools
@@ -182,6 +199,15 @@ class AssistantAgent(BaseAgent):
                          tools = tools,
                          mcps = mcps,
                          max_steps = max_steps,
+                         stable_prompt = stable_prompt,
+                         max_tool_result_tokens = max_tool_result_tokens,
+                         memory_max_tokens = memory_max_tokens,
+                         memory_recall = memory_recall,
+                         memory_embed = memory_embed,
+                         memory_store = memory_store,
+                         session_id = session_id,
+                         memory_compactor = memory_compactor,
+                         tool_router = tool_router,
                          logger = logger,
                          verbose = verbose)
     # override abstract method from BaseAgent
@@ -192,7 +218,7 @@ class AssistantAgent(BaseAgent):
         prompt = str(PROMPT_TEMPLATE.replace("{{instructions}}", self.instructions or ''))
         variables = {
             "agent_name" : self.name or '',
-            "time_now": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "time_now": self.get_time_now(),
             "tools": self.get_tool_list_str(),
             "handoff_section":""
         }
@@ -204,7 +230,7 @@ class AssistantAgent(BaseAgent):
             else:
                 variables["handoff_section"] += "\nYou are the triage agent."
 
-        return format_template_with_json(prompt, variables)
+        return self.format_system_prompt(prompt, variables)
 
     def get_handoffs_str(self)->str:
         self.handoffs
@@ -219,13 +245,32 @@ class AssistantAgent(BaseAgent):
         self._is_triage_agent = True
     
     @override
-    def register_tools(self, tools: list[FunctionTool]):
-        super().register_tools(tools)
+    def register_tools(self, tools: list[FunctionTool], pinned:bool = False):
+        super().register_tools(tools, pinned)
         if not self.use_actor_tools:
             for tool in tools:
                 self.llm_client.register_tool(tool)
         
             
+    # non-streamed completions end to end, without splitting and relaying the chunks of answer
+    async def _execute_with_llm_tools_once(self, input:Prompt, context:Optional[AgentContext]) -> Answer:
+        if input is not None:
+            self.add_user_message(input)
+        messages = self.get_messages()
+        history_length = len(messages)
+        response_text = await self.call_llm(
+            messages = messages, # message list
+            system = self.system_prompt,
+            context = context,
+            options = Options(response_format = self.response_format, max_iterations=self.max_steps),
+            stream = False)
+        self.add_agent_message(response_text)
+        # the tool calls in the run are the steps
+        think_steps = [f'**take action**: {tool_call["function"]["name"]}\n'
+                       for message in (context.messages or [])[history_length:] if message.get("role") == "assistant"
+                       for tool_call in message.get("tool_calls") or []]
+        return Answer(think = '\n'.join(think_steps), final = response_text)
+
     async def _execute_with_llm_tools(self, input:Prompt, context:Optional[AgentContext]) -> AgentStream:
         if input is not None:
             self.add_user_message(input)
@@ -240,6 +285,8 @@ class AssistantAgent(BaseAgent):
         async for chunk in response_stream:
             if chunk.function_call: # step
                 yield Chunk(type=Chunk.Type.Step, done=False, text = f'**take action**: {chunk.function_call.name}\n')
+            elif chunk.tool_progress: # progress of streaming tool, not part of the answer
+                yield Chunk(type=Chunk.Type.Step, done=False, text = f'**progress** {chunk.tool_progress.tool}: {chunk.tool_progress.text}\n')
             elif not chunk.done: # it's the tokens of answer
                 yield Chunk(type=Chunk.Type.Answer, done=False, text = chunk.text)
             else: # done with final answer. chunk.text is the full answer.
@@ -272,7 +319,15 @@ class AssistantAgent(BaseAgent):
                 tool_name = actor_response.action.get("name") or ''
                 tool_args = actor_response.action.get("arguments") or {}
                 yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**take_action**. name:{tool_name}, arguments:{tool_args}\n'))
-                call_result  = await self.call_function(tool_name, tool_args, context=context)
+                # relay the progress of streaming tool as steps while the tool runs
+                progress_queue:asyncio.Queue[ToolProgress] = asyncio.Queue()
+                call = asyncio.ensure_future(self.call_function(tool_name, tool_args, context=context, on_progress=progress_queue.put_nowait))
+                try:
+                    async for progress in iter_tool_progress([call], progress_queue):
+                        yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**progress**: {progress.text}\n'))
+                    call_result = await call
+                finally:
+                    call.cancel() # no-op if done, cancel the call if the stream is closed
                 actor_response.action_result = str(call_result)
                 yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**action_result**:\n{actor_response.action_result}\n'))
                 action_result_text = json.dumps({"action_result" : actor_response.action_result}, ensure_ascii=False)
@@ -304,4 +359,13 @@ class AssistantAgent(BaseAgent):
         # relay the chunks
         async for chunk in corontine:
             yield chunk
+
+    # override from BaseAgent, the fast path of `run(stream=False)`
+    @override
+    async def _run_once(self,
+                        input:Prompt,
+                        context:Optional[AgentContext]) -> Answer:
+        if not self.use_actor_tools:
+            return await self._execute_with_llm_tools_once(input, context=context)
+        return await super()._run_once(input, context=context) # actor tools call LLM without streaming already
         
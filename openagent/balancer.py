@@ -0,0 +1,239 @@
+"""
+Load balancing of several OpenAI API compatible replicas (e.g. vLLM/Ollama) serving the same model.
+- Each request goes to the healthy replica with the least outstanding requests.
+- Passive health checking: a replica is ejected after consecutive failures and readmitted after a successful probe
+  (the per-endpoint circuit breaker), the failed request fails over to the other replicas.
+- Session affinity: the calls of one session are routed by consistent hashing of the session id, so a multi-step run
+  lands on the same replica and reuses its prefix (KV) cache. If the replica is unhealthy, the call goes to the next
+  replica on the hash ring, which stays the same for the session while the replica is down.
+"""
+import asyncio, bisect, hashlib, random, time
+from typing import Optional, List, Dict, Any
+from pydantic import BaseModel
+from .chatclient import OpenAIChatClient, CompletionStream
+from .exceptions import CircuitOpenError
+from .hedging import LatencyTracker
+from .resilience import CircuitBreaker, CircuitBreakerOptions, CircuitState, circuit_breaker_registry, is_transient_error
+
+class EndpointConfig(BaseModel):
+    end_point: str
+    api_key: Optional[str] = None # same as the balancing client if None
+    api_version: Optional[str] = None
+
+class EndpointStats(BaseModel):
+    end_point: Optional[str] = None
+    state: Optional[str] = CircuitState.Closed.value # closed: healthy, open: ejected, half_open: probing
+    outstanding: Optional[int] = 0 # requests in flight, including open streams
+    requests: Optional[int] = 0
+    errors: Optional[int] = 0
+    ejected: Optional[int] = 0 # times the replica was ejected
+    latency_avg: Optional[float] = 0.0 # seconds to the response (or the start of the stream)
+    latency_p50: Optional[float] = 0.0
+    latency_p95: Optional[float] = 0.0
+
+LATENCY_WINDOW_SIZE = 200
+class Replica:
+    """One endpoint of the pool, with its own client (connection pool, rate limiter) and health state."""
+    def __init__(self, client:OpenAIChatClient, breaker:CircuitBreaker) -> None:
+        self.client = client
+        self.breaker = breaker
+        self.stats = EndpointStats(end_point=client.end_point)
+        self.latencies = LatencyTracker(LATENCY_WINDOW_SIZE)
+        self._latency_sum = 0.0
+        self._latency_count = 0 # completed requests, the cancelled ones (e.g. hedge losers) are not latency samples
+
+    @property
+    def end_point(self)->str:
+        return self.client.end_point
+
+    def is_available(self)->bool:
+        return self.breaker.state != CircuitState.Open or self.breaker.ready_to_probe()
+
+    def _record_latency(self, started_at:float)->None:
+        latency = time.monotonic() - started_at
+        self.latencies.record(latency)
+        self._latency_sum += latency
+        self._latency_count += 1
+
+    def _done(self, started_at:float, error:Optional[BaseException] = None, cancelled:bool = False)->None:
+        self.stats.outstanding -= 1
+        if error is not None:
+            self.stats.errors += 1
+        elif not cancelled:
+            self._record_latency(started_at)
+
+    async def send(self, params:Dict[str, Any])->object:
+        self.breaker.before_call() # raise CircuitOpenError if ejected
+        self.stats.requests += 1
+        self.stats.outstanding += 1
+        started_at = time.monotonic()
+        try:
+            completion = await self.client._send_completion(params)
+        except Exception as e:
+            self.breaker.on_error(e)
+            self._done(started_at, e)
+            raise
+        except BaseException:
+            self.breaker.on_cancel()
+            self._done(started_at, cancelled=True)
+            raise
+        self.breaker.on_success()
+        if not params.get("stream"):
+            self._done(started_at)
+            return completion
+        self._record_latency(started_at) # to the start of the stream
+        def _on_close(error:Optional[BaseException])->None: # outstanding until the stream ends
+            self.stats.outstanding -= 1
+            if error is not None:
+                self.stats.errors += 1
+        return CompletionStream(completion, on_close=_on_close)
+
+    def get_stats(self)->EndpointStats:
+        self.stats.state = self.breaker.state.value
+        self.stats.ejected = self.breaker.stats.opened
+        self.stats.latency_avg = round(self._latency_sum/self._latency_count, 3) if self._latency_count else 0.0
+        self.stats.latency_p50 = round(self.latencies.percentile(50), 3)
+        self.stats.latency_p95 = round(self.latencies.percentile(95), 3)
+        return self.stats.model_copy()
+
+class AffinityStats(BaseModel):
+    requests: Optional[int] = 0 # requests with a session id
+    hits: Optional[int] = 0 # routed to the replica owning the session
+    fallbacks: Optional[int] = 0 # routed to another replica, as the owner is unhealthy or failed
+    hit_rate: Optional[float] = 0.0
+
+def _hash(key:str)->int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+VIRTUAL_NODES = 100 # points of each replica on the hash ring, to spread the sessions evenly
+class HashRing:
+    """Consistent hash ring of replicas, adding or removing a replica only moves the sessions of it."""
+    def __init__(self, replicas:List[Replica], virtual_nodes:int = VIRTUAL_NODES) -> None:
+        points = sorted((_hash(f"{replica.end_point}#{i}"), n) for n, replica in enumerate(replicas) for i in range(virtual_nodes))
+        self._keys = [point for point, _ in points]
+        self._replicas = [replicas[n] for _, n in points]
+        self._count = len(replicas)
+
+    def lookup(self, key:str)->List[Replica]:
+        """Return the distinct replicas in ring order starting from the owner of the key."""
+        start = bisect.bisect(self._keys, _hash(key))
+        replicas:List[Replica] = []
+        for i in range(len(self._replicas)):
+            replica = self._replicas[(start + i) % len(self._replicas)]
+            if replica not in replicas:
+                replicas.append(replica)
+                if len(replicas) == self._count:
+                    break
+        return replicas
+
+class ReplicaPool:
+    """Replicas shared by a balancing client and its clones."""
+    def __init__(self, replicas:List[Replica]) -> None:
+        self.replicas = replicas
+        self.ring = HashRing(replicas)
+        self.affinity = AffinityStats()
+
+    def choose(self, exclude:Optional[set] = None, session_id:Optional[str] = None)->Optional[Replica]:
+        """
+        Return the replica of the session if session_id is set, otherwise the available replica with the least outstanding
+        requests (random among ties). None if all replicas are unavailable.
+        """
+        if session_id:
+            return self._choose_by_session(session_id, exclude)
+        candidates = [r for r in self.replicas if (not exclude or r not in exclude) and r.is_available()]
+        if not candidates:
+            return None
+        least = min(r.stats.outstanding for r in candidates)
+        return random.choice([r for r in candidates if r.stats.outstanding == least])
+
+    def _choose_by_session(self, session_id:str, exclude:Optional[set] = None)->Optional[Replica]:
+        for n, replica in enumerate(self.ring.lookup(session_id)):
+            if (exclude and replica in exclude) or not replica.is_available():
+                continue
+            if not exclude: # count once per request, not per failover
+                self.affinity.requests += 1
+                if n == 0:
+                    self.affinity.hits += 1
+                else:
+                    self.affinity.fallbacks += 1
+            return replica
+        return None
+
+    def get_affinity_stats(self)->AffinityStats:
+        stats = self.affinity.model_copy()
+        stats.hit_rate = round(stats.hits/stats.requests, 4) if stats.requests else 0.0
+        return stats
+
+DEFAULT_HEALTH_CHECK = CircuitBreakerOptions(failure_threshold=3, recovery_timeout=10.0)
+class LoadBalancedChatClient(OpenAIChatClient):
+    """
+    Drop-in chat client balancing the requests over several endpoints serving the same model.
+    Usage:
+    client = LoadBalancedChatClient(end_points=["http://10.0.0.1:8000/v1", "http://10.0.0.2:8000/v1"], model="qwen3", api_key="none")
+    agent = AssistantAgent(llm_client=client)
+    """
+    def __init__(self,
+                 end_points:List[str|EndpointConfig],
+                 circuit_breaker:Optional[CircuitBreakerOptions] = DEFAULT_HEALTH_CHECK, # eject and readmit replicas
+                 session_affinity:Optional[bool] = True, # route the calls of one session (Options.session_id) to the same replica
+                 _pool:Optional[ReplicaPool] = None, # the replicas shared with the client cloned from
+                 **kwargs) -> None:
+        self.session_affinity = session_affinity
+        self.end_points = [EndpointConfig(end_point=e) if isinstance(e, str) else e for e in end_points]
+        if not self.end_points:
+            raise ValueError("LoadBalancedChatClient requires at least one endpoint")
+        kwargs["end_point"] = self.end_points[0].end_point
+        super().__init__(circuit_breaker=circuit_breaker, **kwargs)
+        self._pool = _pool or ReplicaPool([self._make_replica(config) for config in self.end_points])
+
+    def _make_replica(self, config:EndpointConfig)->Replica:
+        args = OpenAIChatClient.get_init_args(self)
+        args.update(end_point = config.end_point,
+                    api_key = config.api_key or self.api_key,
+                    api_version = config.api_version or self.api_version,
+                    hedging = None)
+        client = OpenAIChatClient(**args)
+        return Replica(client, circuit_breaker_registry.get(config.end_point, self.circuit_breaker or DEFAULT_HEALTH_CHECK))
+
+    # override from base class, the clones share the replicas and their load
+    def clone(self, with_tools:bool|None=False)->"LoadBalancedChatClient":
+        args = self.get_init_args(with_tools)
+        args.pop("end_point")
+        return LoadBalancedChatClient(end_points=self.end_points, session_affinity=self.session_affinity, _pool=self._pool, **args)
+
+    def get_endpoint_stats(self)->List[EndpointStats]:
+        return [replica.get_stats() for replica in self._pool.replicas]
+
+    def get_affinity_stats(self)->AffinityStats:
+        return self._pool.get_affinity_stats()
+
+    # override: route the request to a replica, fail over to the other replicas on transient errors,
+    ## then back off by the retry policy once all replicas failed
+    async def _create_completion_with_retry(self, params:Dict[str, Any], session_id:Optional[str] = None)->object:
+        attempt = 0
+        tried = set()
+        error = None
+        if not self.session_affinity:
+            session_id = None
+        while True:
+            replica = self._pool.choose(exclude=tried, session_id=session_id)
+            if replica is None:
+                if not tried:
+                    raise CircuitOpenError(details=f"All endpoints are unavailable: {[e.end_point for e in self.end_points]}", module="llm")
+                tried.clear() # all replicas tried
+                delay = self.retry_policy.get_delay(error, attempt) if self.retry_policy else None
+                if delay is None:
+                    raise error
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            try:
+                return await replica.send(params)
+            except CircuitOpenError as e: # ejected or probing by another request
+                tried.add(replica)
+                error = error or e
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise
+                tried.add(replica)
+                error = e
@@ -19,70 +19,23 @@ from .chatclient import (
     MessageType,
     prompt_to_message
     )
-from .tools import transform_string_function_style, __CTX_NAME__
+from .tools import transform_string_function_style, __CTX_NAME__, call_tool, ToolProgress, ProgressCallback, iter_tool_progress, read_tool_result
 from .utils.logger import logging, get_global_logger
 from .utils import multitask, identity, formatter
+from datetime import datetime
 from .default import *
 from .exceptions import *
-from .chatclient import APIConnectionError, BadRequestError, RateLimitError, OpenAIError
+from .resilience import error_code_from_exception
+from .tool_router import ToolRouter, EmbedFunction
+from .memory import Memory, MemoryArchive, MAX_IN_MEMORY_MESSAGES, message_to_text
+from .compaction import Compactor
+from .memory_store import BaseMemoryStore
 from .mcp import *
 
 MAX_STEPS:Optional[int] = OPENAGENT_MAX_STEPS
-# =============================================================================
-# Memory Management Classes
-# TO-DO: persist in DB
-# =============================================================================
-MAX_IN_MEMORY_MESSAGES = 50
-class Memory:
-    """
-    Implements a In-cahe memory for agents.
-    """
-    def __init__(self, 
-                 messages:Optional[List[MessageType]] = None) -> None:
-        """
-        cache: the memory in cache
-        persist_id: the persist ID (datatable ID) in DB
-        """
-        # make a copy of message list
-        self.cache: Optional[List[MessageType]] = list(messages) if messages else []
-
-    def add(self, message: MessageType) -> None:
-        """
-        Add a new message to memory. If short-term exceeds 10 entries,
-        archive the oldest messages.
-        """
-        self.cache.append(message)
-        # only keep MAX_IN_MEMORY_MESSAGES items
-        if len(self.cache) > MAX_IN_MEMORY_MESSAGES:
-            self.cache.pop(0)
-
-    def get_messages(self) -> List[MessageType]:
-        """
-        Returns the full conversation context as a list as:
-        [
-            {
-                "role": ...
-                "content":...
-            }
-        ]
-        """
-        all_messages = list(self.cache) # make a copy of current memory in cache
-        return all_messages
-    
-    def get_messages_str(self) -> str:
-        """
-        Returns the full conversation context as a formatted string as:
-        '''
-        [user]:%content%,
-        [assistant]:%content%
-        '''
-        """
-        all_messages = self.cache
-        return "\n".join([f"[{msg['role']}]: {msg['content']}" for msg in all_messages])
-    
-    # Search context from memory (from both cache and persistence)
-    def search_context(term:str, top_k:Optional[int]=5)->List[MessageType]:
-        pass
+PROMPT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+STABLE_PROMPT_TIME_FORMAT = '%Y-%m-%d %H:00' # coarse time keeps the prompt stable within the hour
+VOLATILE_PROMPT_VARIABLES = ["time_now"] # moved to the end of system prompt in stable prompt mode
 
 class AgentContext(ChatContext):
     @property
@@ -137,6 +90,21 @@ class AgentResponse(BaseModel):
   -- use decorator @function_tool to define a function, or make_function_tool to define it. refer package to openagent.tools
 - max_steps (int=30): max reasoning steps to complete a task in one agent.run(...) to avoid dead loop.
   -- note: agents typically need take multiple reasoning steps, such as mutiple tool calls step by step or reasoning in a loop until meet a exit criteria.
+- stable_prompt (bool=False): keep the system prompt byte-stable across steps (volatile values such as time at the end, in coarse granularity),
+  -- so that the prompt caching of providers (e.g. OpenAI prefix caching, vLLM prefix cache) hits.
+- max_tool_result_tokens (int=0): store the tool results larger than the tokens out of the messages of the run, 0 to disable.
+  -- the LLM gets a preview and pages through the result by the tool `read_tool_result`, registered if enabled.
+- memory_max_tokens (int=0): the token budget of the conversation history in memory, 0 for unlimited.
+  -- the oldest messages are evicted first, a tool call and its results are evicted together.
+- memory_recall (int=0): recall the top-k older turns evicted from memory relevant to the input, 0 to disable.
+  -- the evicted turns are indexed by embeddings (memory_embed, or local feature hashing if None), the recalled turns are sent before the history.
+- memory_store (BaseMemoryStore=None): persist the conversation history to the session in the store, e.g. SQLiteMemoryStore.
+  -- the messages are written behind in batches; the tail of the session is loaded on the first run, so a session resumes after restarts.
+- session_id (str=None): the session of the conversation, to resume the session from memory_store. a new session if None.
+- memory_compactor (Compactor=None): replace the older turns by a running summary (by a cheaper LLM) when the history approaches the budget.
+  -- the summary is computed in background after the message is added, not before the next LLM call. refer to openagent.compaction
+- tool_router (ToolRouter=None): send only the tools relevant to the turn (and the pinned tools) to the LLM, for large tool catalogs.
+  -- the tools are selected once per run, in the tool definitions of the requests and in the tool list of the system prompt.
 - logger (logging.Logger=None): log to a "xxx.log" file or on screen. If not set, only log to screen. 
 - verbose (bool=False): turn on detailed logging on screen (for debugging).
 """
@@ -149,19 +117,43 @@ class BaseAgent(ABC):
                  tools: Optional[list[FunctionTool]] = [],
                  mcps: Optional[list[MCPClient]] = [], 
                  max_steps:int|None = OPENAGENT_MAX_STEPS,
+                 stable_prompt:Optional[bool] = OPENAGENT_STABLE_PROMPT,
+                 max_tool_result_tokens:Optional[int] = OPENAGENT_MAX_TOOL_RESULT_TOKENS,
+                 memory_max_tokens:Optional[int] = OPENAGENT_MEMORY_MAX_TOKENS,
+                 memory_recall:Optional[int] = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 memory_compactor:Optional[Compactor] = None,
+                 tool_router:Optional[ToolRouter] = None,
                  logger:Optional[logging.Logger] = None,
                  verbose:bool|None=False) -> None:
         self.llm_client = llm_client
+        self.memory_max_tokens = memory_max_tokens
+        self.memory_recall = memory_recall
+        self.memory_embed = memory_embed
+        self._recalled:List[MessageType] = [] # the older turns recalled for the run
+        self.memory_store = memory_store
+        self.memory_compactor = memory_compactor
+        self.tool_router = tool_router
+        self.stable_prompt = stable_prompt
+        self.max_tool_result_tokens = max_tool_result_tokens
+        self.session_id = session_id or identity.unique_id() # the conversation of the agent instance, e.g. for session affinity of LLM calls
         self.name = name
         self.description = description
         self.instructions = instructions
         self.max_steps = max_steps
         self.tools:Optional[list[FunctionTool]] = []
         self.tools_map:Optional[Dict[str, FunctionTool]] = {}
+        self.pinned_tools:set[str] = set() # names of the tools always sent, if routed by tool_router
+        self._routed_tools:Optional[List[FunctionTool]] = None # the tools selected for the run, all tools if None
         self.register_tools(tools)
+        if self.max_tool_result_tokens and read_tool_result.name not in self.tools_map: # page through the stored results
+            self.register_tools([read_tool_result], pinned=True)
         self.mcps = mcps
         self.mcp_tools:Optional[list[FunctionTool]] = []
-        self.memory = Memory()
+        self._tool_list_str:Optional[tuple[tuple, str]] = None # (tools, rendered tool list)
+        self.memory = self.make_memory()
         self.logger:Optional[logging.Logger] = logger or get_global_logger()
         self.verbose = verbose
         self.interrupted = False
@@ -216,7 +208,7 @@ class BaseAgent(ABC):
             context = AgentContext()
         # if the input is a list of messages, use the message list as memory
         if isinstance(input, list):
-            self.memory = Memory(messages = input)
+            self.memory = self.make_memory(messages = input, persistent = False)
             self.log(f'run agent with message list as ipnut. #items:{len(input)}, context:{context.context}', logging.DEBUG)
             input = None # empty the input, leverage all messages in memory
         elif isinstance(input, str):
@@ -231,18 +223,13 @@ class BaseAgent(ABC):
         try:
             # delay loading mcp tools
             await self._register_all_mcp_tools_async() # load all mcp tools at the runing phase
+            await self.memory.load() # resume the session from memory store (if any) on the first run
+            await self.recall_memory(input)
+            await self.route_tools(input)
             rejection:Optional[Rejection] = None
             if not stream:
-                think_steps:list[str] = []
-                final_answer = ""
-                response_stream:AgentStream = self._run_impl(input, context=context)
-                async for chunk in response_stream:
-                    if not chunk.done:
-                        think_steps.append(chunk.text)
-                    if chunk.done:
-                        final_answer = chunk.text
                 return AgentResponse(type = AgentResponse.Type.Answer,
-                                     answer = Answer(think = '\n'.join(think_steps), final=final_answer))
+                                     answer = await self._run_once(input, context=context))
             else:
                 return _generate_stream(self._run_impl(input, context=context))
         except Exception as e: # unexpected exception
@@ -264,6 +251,27 @@ class BaseAgent(ABC):
     async def _run_impl(self, task:Prompt, context:Optional[AgentContext]) -> AgentStream:
         pass
 
+    # the implementation method of `agent.run(stream=False)`, return the answer in one shot
+    ## by default, it collects the chunks of `_run_impl`. subclass overrides it to skip streaming end to end.
+    async def _run_once(self, task:Prompt, context:Optional[AgentContext]) -> Answer:
+        think_steps:list[str] = []
+        final_answer = ""
+        response_stream:AgentStream = self._run_impl(task, context=context)
+        async for chunk in response_stream:
+            if not chunk.done:
+                think_steps.append(chunk.text)
+            if chunk.done:
+                final_answer = chunk.text
+        return Answer(think = '\n'.join(think_steps), final=final_answer)
+
+    # the memory of conversation history within the budget of the agent
+    ## persistent: persist to the session in memory_store (if any), not for the history owned by the caller or one-off runs
+    def make_memory(self, messages:Optional[List[MessageType]] = None, persistent:bool = True)->Memory:
+        store = self.memory_store if persistent else None
+        archive = MemoryArchive(self.memory_embed) if self.memory_recall else None
+        return Memory(messages=messages, max_tokens=self.memory_max_tokens, store=store, session_id=self.session_id, archive=archive,
+                      compactor=self.memory_compactor)
+
     def add_message(self, message:MessageType)->None:
         self.memory.add(message)
 
@@ -271,8 +279,9 @@ class BaseAgent(ABC):
         for message in messages:
             self.memory.add(message)
 
+    # the recalled older turns (if any) and the conversation history in memory
     def get_messages(self)->List[MessageType]:
-        return self.memory.get_messages()
+        return [*self._recalled, *self.memory.get_messages()] # a list, the callers extend it with the messages of the run
         
     # add user query
     def add_user_message(self, content:str|Prompt)->None:
@@ -292,18 +301,8 @@ class BaseAgent(ABC):
     # convert exception to AgentException and log the exception
     def _preprocess_exception(self, e:Exception)->AgentException:
         # convert exception to AgentException
-        if isinstance(e, APIConnectionError):
-            e = AgentException(details=str(e), error_code=ErrorCode.LlmAccessError, module=self.name)
-        elif isinstance(e, RateLimitError):
-            e = AgentException(details=str(e), error_code=ErrorCode.LlmAccessError, module=self.name)
-        elif isinstance(e, BadRequestError):
-            e = AgentException(details=str(e), error_code=ErrorCode.InvalidInput, module=self.name)
-        elif isinstance(e, OpenAIError):
-            e = AgentException(details=str(e), error_code=ErrorCode.LlmAccessError, module=self.name)
-        elif isinstance(e, AgentException):
-            pass
-        else:
-            e = AgentException(details=str(e), error_code=ErrorCode.Unknown, module=self.name)
+        if not isinstance(e, AgentException):
+            e = AgentException(details=str(e), error_code=error_code_from_exception(e), module=self.name)
         # log the exception
         self.log(f'!!!Caught agent exception. module:{e.module}, error_code:{e.error_code}, details:{str(e)}', level=logging.ERROR)
         if self.verbose: # log trace back in verbose mode for debugging
@@ -315,16 +314,29 @@ class BaseAgent(ABC):
     async def call_llm(self,
                        messages:Optional[List[MessageType]], # the message list including user prompt and conversation history
                        system:Optional[str]=None,
-                       context:Optional[AgentContext] = AgentContext(),
+                       context:Optional[AgentContext] = None, # a new context for the call if None, never shared by calls
                        options:Optional[Options] = None,
                        stream:Optional[bool] = False) -> str|AsyncGenerator[RawChunk]:
+        if context is None:
+            context = AgentContext()
         
         # replace place holders "{{...}}" with context state variables
         if system is not None \
             and context is not None \
             and context.context:
             system = formatter.format_template_with_json(system, context.context)
-            
+
+        options = (options or Options()).model_copy() # the caller's options may be reused by other calls and agents
+        if options.session_id is None:
+            options.session_id = self.session_id
+        if options.max_tool_result_tokens is None:
+            options.max_tool_result_tokens = self.max_tool_result_tokens
+        if options.tools is None and self._routed_tools is not None:
+            options.tools = [tool.name for tool in self._routed_tools]
+            if self.llm_client.tool_callbacks: # llm tools, counted by the client for each request of the tool steps
+                options.tool_router = self.tool_router
+            else: # the tool list of the system prompt, one request per call
+                self.tool_router.record_request(self.tools, self._routed_tools)
         response = await self.llm_client.send(
             prompt=messages,
             system=system,
@@ -337,11 +349,14 @@ class BaseAgent(ABC):
             return response
     
     # raise exception if found duplicate tool names
-    def register_tools(self, tools: list[FunctionTool]):
+    ## pinned: always send the tools to LLM, if the tools are routed
+    def register_tools(self, tools: list[FunctionTool], pinned:bool = False):
         for tool in tools:
             if tool.name not in self.tools_map.keys():
                 self.tools_map[tool.name] = tool
                 self.tools.append(tool)
+                if pinned:
+                    self.pinned_tools.add(tool.name)
             else:
                 raise AgentException(
                     f"Duplicate tool names found. tool:{tool.name}, agent:{self.name}",
@@ -358,23 +373,79 @@ class BaseAgent(ABC):
             self.mcp_tools = await MCPAccessUtil.get_all_function_tools(self.mcps)
             self.register_tools(self.mcp_tools)
     
+    # recall the older turns evicted from memory relevant to the input of the run, sent before the history as one message
+    async def recall_memory(self, input:Optional[Prompt] = None)->None:
+        self._recalled = []
+        if not self.memory_recall or self.memory.archive is None or not len(self.memory.archive):
+            return
+        if input is not None:
+            query = input.text or ""
+        else: # the message list as input, the last user message is the input
+            query = next((message["content"] for message in reversed(self.memory.get_messages())
+                          if message.get("role") == "user" and isinstance(message.get("content"), str)), "")
+        messages = await self.memory.search_context(query, self.memory_recall)
+        if messages:
+            recalled = '\n'.join(message_to_text(message) for message in messages)
+            self._recalled = [{"role":"user", "content":f"Earlier conversation recalled from memory, for reference:\n{recalled}"}]
+            self.log(f"recalled {len(messages)} messages from memory", logging.DEBUG)
+
+    # select the tools relevant to the input of the run by tool_router, kept for the steps of the run
+    ## the pinned tools and the tools called in the conversation are always kept
+    async def route_tools(self, input:Optional[Prompt] = None)->None:
+        self._routed_tools = None
+        if self.tool_router is None or not self.tool_router.is_routed(self.tools):
+            return
+        user_messages = []
+        called = set(self.pinned_tools)
+        for message in self.memory.get_messages():
+            if message.get("role") == "user" and isinstance(message.get("content"), str):
+                user_messages.append(message["content"])
+            for tool_call in message.get("tool_calls") or []:
+                called.add(((tool_call.get("function") or {}) if isinstance(tool_call, dict) else {}).get("name"))
+        if input is not None: # the input is added to memory by the run later
+            query, history = input.text or "", user_messages[-1:]
+        else: # the message list as input, the last user message is the input
+            query, history = (user_messages[-1], user_messages[-2:-1]) if user_messages else ("", [])
+        self._routed_tools = await self.tool_router.select(query, self.tools, pinned=list(called), history='\n'.join(history))
+        self.log(f"routed tools: {[tool.name for tool in self._routed_tools]}", logging.DEBUG)
+
     def get_tool_list_str(self):
+        tools = self._routed_tools if self._routed_tools is not None else self.tools
+        # rendered once until the tools change
+        key = tuple(id(function) for function in tools)
+        if self._tool_list_str is not None and self._tool_list_str[0] == key:
+            return self._tool_list_str[1]
         tool_list = []
         tool_names = []
-        for function in self.tools:
+        for function in tools:
             tool_names.append(function.name)
             tool_str = f'— **{function.name}**:\n  - Description: {function.description}\n  - Input Arguments and Types: {function.input_arguments}\n'
             tool_list.append(tool_str)
-        return '\n'.join(tool_list)
+        tool_list_str = '\n'.join(tool_list)
+        self._tool_list_str = (key, tool_list_str)
+        return tool_list_str
 
-    async def _invoke_function(self, function:FunctionTool, **arguments):
-        if not function.is_async: # sync function
-            result = function(**arguments)
-        else:
-            result = await function(**arguments) # async function
-        return result
+    # the time in system prompt, rounded to the hour in stable prompt mode
+    def get_time_now(self)->str:
+        return datetime.now().strftime(STABLE_PROMPT_TIME_FORMAT if self.stable_prompt else PROMPT_TIME_FORMAT)
+
+    # format system prompt template with variables
+    ## in stable prompt mode, the lines of volatile variables (e.g. time_now) are moved to the end of the prompt,
+    ## so the instructions and tools are a byte-stable prefix of the requests
+    def format_system_prompt(self, template:str, variables:Dict[str, Any])->str:
+        if self.stable_prompt:
+            lines = template.split('\n')
+            volatile_lines = [line for line in lines if any("{{" + name + "}}" in line for name in VOLATILE_PROMPT_VARIABLES)]
+            if volatile_lines:
+                template = '\n'.join(line for line in lines if line not in volatile_lines).rstrip() + '\n\n' + '\n'.join(volatile_lines)
+        return formatter.format_template_with_json(template, variables)
+
+    async def _invoke_function(self, function:FunctionTool, arguments:dict, on_progress:Optional[ProgressCallback] = None, context:Optional[AgentContext] = None):
+        # under the concurrency limits and timeout of the tool, served from the cache of the tool (if any) in the run or session
+        return await call_tool(function, arguments, on_progress,
+                               context=context, session_id=self.session_id, max_result_tokens=self.max_tool_result_tokens)
     
-    async def call_function(self, name:str, arguments:dict, context:AgentContext)->str|object:
+    async def call_function(self, name:str, arguments:dict, context:AgentContext, on_progress:Optional[ProgressCallback] = None)->str|object:
         name = name or ""
         arguments = arguments or {}
         self.log(f"-> call function `{name}` with {arguments}", logging.DEBUG)
@@ -385,9 +456,9 @@ class BaseAgent(ABC):
             # inject context:ContextType as the message history before the function call as context
             if function.has_context_argument():
                 # inject last message to context, but remove the function call messsage
-                context.messages = self.memory.get_messages()
+                context.messages = list(self.memory.get_messages())
                 arguments[__CTX_NAME__] = context
-            result = await self._invoke_function(function, **arguments)
+            result = await self._invoke_function(function, arguments, on_progress, context)
         else:
             result = f'**Error**: Unknown tool name "{name}"'
             self.log(result, logging.DEBUG)
@@ -418,15 +489,15 @@ class BaseAgent(ABC):
             """
             self.log(f'run agent_tool with input:"{input}", context:{context.context}', logging.DEBUG)
             if not stateful: # **empty** memory for the run if not stateful
-                self.memory = Memory()
+                self.memory = self.make_memory(persistent=False)
 
             if with_parent_context: # erase memory and **inject** conversations of parent agent to the memory
-                self.memory = Memory(messages=context.messages[:-1]) # **remove** the last message which is tool call message
+                self.memory = self.make_memory(messages=context.messages[:-1], persistent=False) # **remove** the last message which is tool call message
             result = await self.run(input, context=context, stream=False)
 
             # clear the memory for the run if not stateful or if the agent use conversations of parent agent
             if not stateful or with_parent_context:
-                self.memory = Memory()
+                self.memory = self.make_memory(persistent=False)
             return str(result) # this will return text of final answer or rejection
         return run_agent
     
@@ -456,7 +527,11 @@ class BaseAgent(ABC):
         """Cleanup all resources."""
         self.log("cleanup", logging.INFO)
         async with self._cleanup_lock:
-            pass
+            task = self.memory.compaction_task
+            if task is not None and not task.done(): # finish the compaction in progress
+                await asyncio.wait([task])
+            if self.memory_store is not None: # write the queued messages of the session
+                await self.memory_store.flush()
         """
             try:
                 if self.mcps:
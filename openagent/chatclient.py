@@ -1,14 +1,26 @@
 from .utils import env
-import json, asyncio
+import json, asyncio, time
+from collections import deque
 from urllib.parse import urlparse
 import re
-from openai import AsyncAzureOpenAI, AsyncOpenAI, NOT_GIVEN
+from openai import AsyncAzureOpenAI, AsyncOpenAI, NOT_GIVEN, DEFAULT_MAX_RETRIES
 from openai import APIConnectionError, BadRequestError, RateLimitError, OpenAIError
+from openai.types.chat import ChatCompletionMessageToolCall
 from collections.abc import AsyncGenerator
-from typing import Literal, Optional, override, Dict, List, Any, cast
+from typing import Literal, Optional, override, Dict, List, Any, Callable, cast
 from pydantic import BaseModel
 from abc import ABC, abstractmethod
 from .utils.formatter import AtomWordReader
+from .transport import TransportOptions, TransportStats, transport_registry
+from .llm_cache import BaseLLMCache, make_cache_key
+from .ratelimit import RateLimitOptions, RateLimiter, rate_limiter_registry
+from .utils.tokens import estimate_messages_tokens, estimate_json_tokens
+from .utils.logger import get_global_logger
+from .usage import TokenUsage, usage_registry
+from .hedging import HedgingOptions, HedgingStats, Hedger, hedger_registry
+from .resilience import RetryPolicy, CircuitBreakerOptions, CircuitBreaker, ResilienceStats, circuit_breaker_registry, call_with_retry
+from .context_window import ContextWindowOptions, ContextWindowStats, ContextFitReport, context_window_registry, fit_messages, is_context_length_error, \
+    UNKNOWN_WINDOW_RATIO
 #Azure OpenAI GPT-4o by default
 from .default import (
     OPENAGENT_LLM_ENDPOINT,
@@ -18,10 +30,12 @@ from .default import (
     OPENAGENT_LLM_TEMPERATURE,
     OPENAGENT_LLM_TOP_P,
     OPENAGENT_LLM_IS_REASONING,
-    OPENAGENT_LLM_REASONING_EFFORT
+    OPENAGENT_LLM_REASONING_EFFORT,
+    OPENAGENT_LLM_CONTEXT_TOKENS
 )
 
-from .tools import FunctionTool, function_tool, make_function_tool, __CTX_NAME__, ContextType
+from .tools import FunctionTool, function_tool, make_function_tool, __CTX_NAME__, ContextType, call_tool, gather_tool_calls, \
+    cancel_tool_calls, ToolProgress, ProgressCallback, iter_tool_progress
 
 SYSTEM_PROMPT = "You are helpful assistant that helps user find information"
 
@@ -37,6 +51,10 @@ class Options(BaseModel):
     session:Optional[dict] = None # the session of the context
     max_iterations:Optional[int] = MAX_ITERATIONS # call tools within steps < max_iterations-1
     response_format: Optional[dict] = None
+    session_id: Optional[str] = None # the session (or run) of the call, to route the calls of one session to the same replica
+    max_tool_result_tokens: Optional[int] = None # store larger tool results in the run (context), read by `read_tool_result`
+    tools: Optional[List[str]] = None # names of the registered tools sent in the request (e.g. selected by a tool router), all if None
+    tool_router: Optional[Any] = None # the ToolRouter which selected `tools`, counts the tokens saved by each request sent
 
 class Function(BaseModel):
     name: str
@@ -51,20 +69,226 @@ class Chunk(BaseModel):
     audio: Optional[str] = None # input audio, base64 encoded
     done:bool = False
     function_call: Optional[Function] = None # {"name":..., "arguments":...}
+    tool_progress: Optional[ToolProgress] = None # progress of a streaming tool, not part of the answer
+
+class TextChunk:
+    """Slotted text chunk with the same fields as Chunk, to skip pydantic construction of each chunk in the hot path of streams."""
+    __slots__ = ("text", "audio", "done", "function_call", "tool_progress")
+    def __init__(self, text:Optional[str] = None, done:bool = False) -> None:
+        self.text = text
+        self.audio = None
+        self.done = done
+        self.function_call = None
+        self.tool_progress = None
+
+    def __repr__(self) -> str:
+        return f"TextChunk(text={self.text!r}, done={self.done})"
 
 ResponseStream = AsyncGenerator[Chunk]
 
+class StreamingOptions(BaseModel):
+    word_boundaries: Optional[bool] = True # split the text into word atoms, False to relay the text as received (no re-tokenization)
+    flush_chars: Optional[int] = 0 # coalesce the text into chunks of at least N chars, 0 to disable coalescing
+    flush_interval: Optional[float] = 0.0 # or flush the coalesced text if N seconds passed since the last flush
+    lightweight_chunks: Optional[bool] = False # yield slotted TextChunk instead of pydantic Chunk for the text
+
+class StreamTextBuffer:
+    """
+    Split or coalesce the streamed text into the text of chunks by StreamingOptions.
+    - without coalescing, each delta is split into word atoms (or relayed as is)
+    - with coalescing, the text is buffered until `flush_chars` or `flush_interval` is reached (checked when a delta arrives),
+      and cut at the last whitespace if word boundaries are required, so words are not broken across chunks
+    """
+    def __init__(self, options:Optional[StreamingOptions] = None) -> None:
+        self.options = options or StreamingOptions()
+        self.coalesce = bool(self.options.flush_chars or self.options.flush_interval)
+        self._reader = AtomWordReader() if self.options.word_boundaries else None
+        self._buffer = ''
+        self._flushed_at = time.monotonic()
+
+    def feed(self, text:str) -> List[str]:
+        if not text:
+            return []
+        if not self.coalesce:
+            return list(self._reader.emit_atoms(text)) if self._reader else [text]
+        self._buffer += text
+        if (self.options.flush_chars and len(self._buffer) >= self.options.flush_chars) \
+            or (self.options.flush_interval and time.monotonic() - self._flushed_at >= self.options.flush_interval):
+            return self._take(partial=True)
+        return []
+
+    def flush(self) -> List[str]:
+        return self._take(partial=False) if self._buffer else []
+
+    def _take(self, partial:bool) -> List[str]:
+        text = self._buffer
+        if partial and self._reader: # keep the last (maybe incomplete) word in buffer
+            cut = max(text.rfind(' '), text.rfind('\n'))
+            if cut < 0:
+                return []
+            text, self._buffer = text[:cut+1], text[cut+1:]
+        else:
+            self._buffer = ''
+        self._flushed_at = time.monotonic()
+        return [text] if text else []
+
+class CompletionStream:
+    """
+    Proxy of a streamed completion, which calls `on_close(error)` once when the stream is exhausted, failed or closed.
+    The stream is iterated by several loops (tool calls first, then the content), so it keeps one iterator.
+    """
+    def __init__(self, stream:object, on_close:Optional[Callable[[Optional[BaseException]], None]] = None) -> None:
+        self._stream = stream
+        self._iterator = stream.__aiter__()
+        self._on_close = on_close
+        self._buffer:deque = deque() # chunks read ahead by `peek`
+        self._exhausted = False
+
+    def _close(self, error:Optional[BaseException] = None) -> None:
+        on_close, self._on_close = self._on_close, None
+        if on_close:
+            on_close(error)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._buffer:
+            return self._buffer.popleft()
+        if self._exhausted:
+            raise StopAsyncIteration
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._exhausted = True
+            self._close()
+            raise
+        except BaseException as e:
+            self._close(e)
+            raise
+
+    async def peek(self) -> Optional[object]:
+        """Read ahead until the first chunk with choices (i.e. the first token) arrives, the chunks are still returned by iteration."""
+        buffered = list(self._buffer)
+        self._buffer.clear()
+        try:
+            while True:
+                try:
+                    chunk = await self.__anext__()
+                except StopAsyncIteration:
+                    return None
+                buffered.append(chunk)
+                if getattr(chunk, "choices", None):
+                    return chunk
+        finally:
+            self._buffer.extend(buffered)
+
+    async def close(self) -> None:
+        self._close()
+        await self._stream.close()
+
+    def __getattr__(self, name:str):
+        return getattr(self._stream, name)
+
+    def __del__(self):
+        self._close() # the stream is abandoned without being exhausted or closed
+
 class ClientResponse(BaseModel):
     text: Optional[str] = None
     audio: Optional[str] = None # output audio, base64 encoded
     tool_calls: Optional[list[object]] = None
     raw_response: Optional[object] = None
 
+    # json serializable value stored in LLM response cache
+    def to_cache(self)->dict:
+        return {
+            "text": self.text,
+            "audio": self.audio,
+            "tool_calls": [t.model_dump() for t in self.tool_calls] if self.tool_calls else None
+        }
+
+    @classmethod
+    def from_cache(cls, value:dict)->"ClientResponse":
+        tool_calls = value.get("tool_calls")
+        return cls(text = value.get("text"),
+                   audio = value.get("audio"),
+                   tool_calls = [ChatCompletionMessageToolCall.model_validate(t) for t in tool_calls] if tool_calls else None)
+
 MessageType = Dict[str, Any]
 
 class ChatContext(ContextType):
     messages: Optional[List[MessageType]] = None # the conversation history so far in the call
 
+ToolCallCallback = Callable[[object], None]
+
+class ToolCallAssembler:
+    """
+    Assemble streamed tool call deltas by their `index` into complete tool calls.
+    The model may emit several tool calls and interleave their argument fragments, so each call is
+    tracked by index. `on_complete` is called once for each tool call as soon as its arguments text
+    is a complete json object, while the remaining calls are still streaming.
+    """
+    def __init__(self, on_complete:Optional[ToolCallCallback] = None) -> None:
+        self.on_complete = on_complete
+        self._calls:Dict[int, object] = {} # index -> tool call
+        self._completed:set[int] = set()
+        self._last_index:Optional[int] = None
+
+    def add(self, tool_call_deltas:list) -> None:
+        for delta in tool_call_deltas:
+            index = delta.index
+            function = delta.function
+            if index is None: # some OpenAI API compatible endpoints don't return the index
+                has_name = function is not None and function.name
+                index = len(self._calls) if has_name or self._last_index is None else self._last_index
+            self._last_index = index
+            tool_call = self._calls.get(index)
+            if tool_call is None:
+                tool_call = self._calls[index] = delta.model_copy(deep=True) # must use deep copy
+                tool_call.index = index
+                if tool_call.function is not None:
+                    tool_call.function.arguments = ''
+            else: # the fields of the first delta may be split into several deltas
+                if delta.id and not tool_call.id:
+                    tool_call.id = delta.id
+                if delta.type and not tool_call.type:
+                    tool_call.type = delta.type
+            if function is None:
+                continue
+            if tool_call.function is None:
+                tool_call.function = function.model_copy(deep=True)
+                tool_call.function.arguments = ''
+            if function.name and not tool_call.function.name:
+                tool_call.function.name = function.name
+            if function.arguments:
+                # the arguments string returns character by character
+                tool_call.function.arguments += function.arguments
+                self._try_complete(index)
+
+    def _try_complete(self, index:int) -> None:
+        if index in self._completed:
+            return
+        arguments = (self._calls[index].function.arguments or '').rstrip()
+        if not arguments.endswith('}'): # cheap check before parsing
+            return
+        try:
+            json.loads(arguments)
+        except ValueError:
+            return
+        self._complete(index)
+
+    def _complete(self, index:int) -> None:
+        self._completed.add(index)
+        if self.on_complete:
+            self.on_complete(self._calls[index])
+
+    def finish(self) -> list:
+        """Complete all pending tool calls (even if the arguments are not valid json), return tool calls ordered by index."""
+        for index in sorted(self._calls):
+            if index not in self._completed:
+                self._complete(index)
+        return [self._calls[index] for index in sorted(self._calls)]
+
 # helper function to convert prompt to user message
 def prompt_to_message(prompt:Prompt)->object:
     if not prompt.images and not prompt.audio: # simple text prompt
@@ -100,6 +324,8 @@ class BaseChatClient(ABC):
                  top_p:Optional[float] = None,
                  frequency_penalty: Optional[float]  = None,
                  presence_penalty: Optional[float] = None,
+                 cache:Optional[BaseLLMCache] = None, # opt-in cache of LLM responses, shared by clones
+                 cache_force:Optional[bool] = False, # cache even if temperature is not zero
                  verbose:Optional[bool] = False
                  ):
         super().__init__()
@@ -114,8 +340,11 @@ class BaseChatClient(ABC):
         self.top_p = top_p
         self.frequency_penalty = frequency_penalty
         self.presence_penalty = presence_penalty
+        self.cache = cache
+        self.cache_force = cache_force
         self.verbose = verbose
         self.tool_callbacks: Optional[Dict[str, FunctionTool]] = None
+        self._tool_definitions: Optional[List[Dict[str, Any]]] = None # precomputed, invalidated when tools change
         for tool in tools:
             self.register_tool(tool)
 
@@ -132,12 +361,27 @@ class BaseChatClient(ABC):
             self.tool_callbacks = {}
         if self.tool_callbacks.get(tool.name) is None:
             self.tool_callbacks[tool.name] = tool
+            self._tool_definitions = None
 
     def get_tools(self)->list[FunctionTool]:
         return [self.tool_callbacks[key] for key in self.tool_callbacks]
 
+    def is_cacheable(self)->bool:
+        """
+        Whether the (non-streamed) responses can be served from cache.
+        Cache is opt-in per client, and bypassed if temperature is not zero (non-deterministic) unless `cache_force` is set.
+        """
+        if self.cache is None:
+            return False
+        if self.cache_force:
+            return True
+        try:
+            return self.temperature is not None and float(self.temperature) == 0
+        except (TypeError, ValueError):
+            return False
+
     @abstractmethod
-    def get_tool_definitions(self) -> List[Dict[str, Any]]:
+    def get_tool_definitions(self, names:Optional[List[str]] = None) -> List[Dict[str, Any]]:
         pass
 
     @abstractmethod
@@ -145,13 +389,21 @@ class BaseChatClient(ABC):
                              messages:list,
                              options:Options | None = None,
                              call_tool:bool | None = True,
-                             stream:bool=False)->ClientResponse:
+                             stream:bool=False,
+                             on_tool_call:Optional[ToolCallCallback] = None)->ClientResponse:
+        """
+        Call LLM model and return the response. In stream mode, `on_tool_call` is called for each tool call
+        as soon as its arguments are completely streamed, so the tool can be dispatched before the stream ends.
+        """
         pass
 
     async def call_function(self,
                             tool:FunctionTool, 
                             arguments:str,
-                            context:Optional[ChatContext] = None):
+                            context:Optional[ChatContext] = None,
+                            on_progress:Optional[ProgressCallback] = None,
+                            session_id:Optional[str] = None,
+                            max_result_tokens:Optional[int] = None):
         # validate
         if not tool:
             if self.verbose:
@@ -171,10 +423,8 @@ class BaseChatClient(ABC):
         if context is not None and tool.has_context_argument():
             js_arguments[__CTX_NAME__] = context
 
-        if not tool.is_async: # sync function
-            result = tool(**js_arguments)
-        else:
-            result = await tool(**js_arguments) # async function
+        # under the concurrency limits and timeout of the tool, served from the cache of the tool (if any) in the run or session
+        result = await call_tool(tool, js_arguments, on_progress, context=context, session_id=session_id, max_result_tokens=max_result_tokens)
 
         if self.verbose:
             print(f"<- call result: {result}")
@@ -196,8 +446,10 @@ class BaseChatClient(ABC):
                    prompt:Optional[str|Prompt|List[MessageType]] = None,
                    system:Optional[str] = None,
                    options:Optional[Options] = None,
-                   context:Optional[ChatContext] = ChatContext(),
+                   context:Optional[ChatContext] = None, # a new context for the call if None, never shared by calls
                    stream:bool| None = False)->Response|ResponseStream:
+        if context is None: # the run-scoped state (e.g. cached and stored tool results) lives on the context
+            context = ChatContext()
         messages = [{"role":"system", "content":system or self.system_prompt}]
         if isinstance(prompt, Prompt):
             messages.append(prompt_to_message(prompt)) # add to message list sent to openai
@@ -244,6 +496,16 @@ class OpenAIChatClient(BaseChatClient):
             presence_penalty: Optional[float] = None,
             is_reasoning:Optional[bool] = OPENAGENT_LLM_IS_REASONING,
             reasoning_effort:Optional[Literal["low", "medium", "high"]] = OPENAGENT_LLM_REASONING_EFFORT,
+            transport_options:Optional[TransportOptions] = None, # tune the http connection pool shared by clients of the same endpoint
+            cache:Optional[BaseLLMCache] = None,
+            cache_force:Optional[bool] = False,
+            rate_limit:Optional[RateLimitOptions] = None, # client-side rate limit shared by clients of the same deployment
+            retry_policy:Optional[RetryPolicy] = None, # retry transient errors, replacing the built-in retries of openai client
+            circuit_breaker:Optional[CircuitBreakerOptions] = None, # fail fast when the endpoint is down
+            hedging:Optional[HedgingOptions] = None, # duplicate slow requests to cut the tail latency
+            stream_usage:Optional[bool] = False, # request the usage of streams (stream_options.include_usage), not supported by some old endpoints
+            streaming:Optional[StreamingOptions] = None, # split or coalesce the streamed text, word by word by default
+            context_window:Optional[ContextWindowOptions] = None, # fit the messages to the context window, instead of failing on overflow
             verbose:Optional[bool] = False):
         super().__init__(
             system_prompt = system_prompt,
@@ -258,33 +520,119 @@ class OpenAIChatClient(BaseChatClient):
             top_p = top_p,
             frequency_penalty = frequency_penalty,
             presence_penalty = presence_penalty,
+            cache = cache,
+            cache_force = cache_force,
             verbose = verbose
         )
         self.is_reasoning = is_reasoning
         self.reasoning_effort = reasoning_effort
+        self.transport_options = transport_options
+        self.rate_limit = rate_limit
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.stream_usage = stream_usage
+        self.streaming = streaming
+        self.context_window = context_window or ContextWindowOptions(max_context_tokens = OPENAGENT_LLM_CONTEXT_TOKENS or None)
         if self.is_reasoning:
             self.temperature = None
             self.top_p = None
         
     def get_client(self)->AsyncOpenAI:
         client = getattr(self, '_client', None)
+        # the pooled connections are bound to event loop, re-create the client if running in a new loop
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if client and self._client_loop is not loop:
+            client = None
         # support OpenAI/Azure OpenAI and Ollama/vllm API compatible
         if not client:
+            # all clients (and clones) of the same endpoint share one pooled http transport
+            self._transport = transport_registry.get(end_point = self.end_point,
+                                                     api_key = self.api_key,
+                                                     api_version = self.api_version,
+                                                     options = self.transport_options,
+                                                     client = self)
+            self._client_loop = loop
             parsed_url = urlparse(self.end_point)
             pattern = re.compile(r"^/v\d+(?:/|$)") # to match whehter it's "/v1...n"
             match = pattern.match(parsed_url.path or '')
+            max_retries = 0 if self.retry_policy else DEFAULT_MAX_RETRIES # don't stack retries with the retry policy
             if not match: # Azure OpenAI endpoint
                 client = self._client = AsyncAzureOpenAI(azure_endpoint = self.end_point,
                                                          api_key= self.api_key,
-                                                         api_version= self.api_version)
+                                                         api_version= self.api_version,
+                                                         max_retries = max_retries,
+                                                         http_client = self._transport.http_client)
             else: # OpenAI or Ollama/vllm openai api comptabile endpoint
                 client = self._client = AsyncOpenAI(base_url = self.end_point,
-                                                    api_key= self.api_key)
+                                                    api_key= self.api_key,
+                                                    max_retries = max_retries,
+                                                    http_client = self._transport.http_client)
+        return client
+
+    def get_rate_limiter(self)->Optional[RateLimiter]:
+        """Return the rate limiter shared by the clients of the same deployment, None if rate limit is not set."""
+        if not self.rate_limit:
+            return None
+        return rate_limiter_registry.get(self.end_point, self.model, self.rate_limit)
+
+    def get_circuit_breaker(self)->CircuitBreaker:
+        """Return the circuit breaker (and stats) shared by the clients of the same endpoint."""
+        return circuit_breaker_registry.get(self.end_point, self.circuit_breaker)
+
+    def get_resilience_stats(self)->ResilienceStats:
+        """Return the breaker state and retry counts of the endpoint."""
+        return self.get_circuit_breaker().get_stats()
+
+    def get_hedger(self)->Optional[Hedger]:
+        """Return the hedging state shared by the clients of the same deployment, None if hedging is not set."""
+        if not self.hedging:
+            return None
+        return hedger_registry.get(self.end_point, self.model, self.hedging)
+
+    def get_hedging_stats(self)->Optional[HedgingStats]:
+        hedger = self.get_hedger()
+        return hedger.get_stats() if hedger else None
+
+    # the client sending the duplicate requests, this client itself unless an alternate endpoint is set
+    def get_hedge_client(self)->"OpenAIChatClient":
+        options = self.hedging
+        if not (options.end_point or options.api_key or options.api_version or options.model):
+            return self
+        client = getattr(self, '_hedge_client', None)
+        if client is None:
+            client = self.clone()
+            client.end_point = options.end_point or self.end_point
+            client.api_key = options.api_key or self.api_key
+            client.api_version = options.api_version or self.api_version
+            client.model = options.model or self.model
+            client.hedging = None
+            self._hedge_client = client
         return client
+
+    def get_token_usage(self)->TokenUsage:
+        """Return the token usage of the deployment, including the prompt tokens served from the provider's prompt cache."""
+        return usage_registry.get(self.end_point, self.model).get_stats()
+
+    def get_context_window_stats(self)->ContextWindowStats:
+        """Return the context window and the fitted requests of the deployment."""
+        return context_window_registry.get(self.end_point, self.model).get_stats()
+
+    def get_transport_stats(self)->Optional[TransportStats]:
+        """Return the stats of the connection pool shared by the clients of this endpoint."""
+        transport = getattr(self, '_transport', None)
+        return transport.get_stats() if transport else None
     
     # override from base class
     def clone(self, with_tools:bool|None=False)->BaseChatClient:
-        return OpenAIChatClient(
+        return OpenAIChatClient(**self.get_init_args(with_tools))
+
+    # constructor arguments to clone the client
+    def get_init_args(self, with_tools:bool|None=False)->Dict[str, Any]:
+        return dict(
             system_prompt = self.system_prompt,
             end_point = self.end_point,
             model = self.model,
@@ -299,38 +647,65 @@ class OpenAIChatClient(BaseChatClient):
             presence_penalty = self.presence_penalty,
             is_reasoning = self.is_reasoning,
             reasoning_effort = self.reasoning_effort,
+            transport_options = self.transport_options,
+            cache = self.cache,
+            cache_force = self.cache_force,
+            rate_limit = self.rate_limit,
+            retry_policy = self.retry_policy,
+            circuit_breaker = self.circuit_breaker,
+            hedging = self.hedging,
+            stream_usage = self.stream_usage,
+            streaming = self.streaming,
+            context_window = self.context_window,
             verbose = self.verbose
-        )
+            )
 
     # override method BaseChatClient
-    def get_tool_definitions(self) -> List[Dict[str, Any]]:
+    def get_tool_definitions(self, names:Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
-        Return the list of tool definitions in the format expected by the OpenAI API.
+        Return the list of tool definitions in the format expected by the OpenAI API, only the tools of `names` if set.
+        The definitions are sorted by name and computed once until the tools change, so the request prefix is stable for prompt caching.
         """
-        tool_defs = [self.tool_callbacks[key].json_schema for key in self.tool_callbacks]
-        return tool_defs
+        if self._tool_definitions is None:
+            self._tool_definitions = [self.tool_callbacks[key].json_schema for key in sorted(self.tool_callbacks or {})]
+        if names is not None:
+            names = set(names)
+            return [definition for definition in self._tool_definitions if definition["function"]["name"] in names]
+        return self._tool_definitions
+
+    # the estimated tokens of the definition of each tool, computed once until the tools change
+    def get_tool_tokens(self)->Dict[str, int]:
+        definitions = self.get_tool_definitions()
+        if getattr(self, '_tool_tokens_of', None) is not definitions:
+            self._tool_tokens = {definition["function"]["name"]: estimate_json_tokens(definition) for definition in definitions}
+            self._tool_tokens_of = definitions
+        return self._tool_tokens
 
     # override method
     async def call_llm_model(self,
                              messages:list,
                              options:Options | None = None,
                              call_tool:bool | None = True,
-                             stream:bool=False)->ClientResponse:
-        client = self.get_client()
-
+                             stream:bool=False,
+                             on_tool_call:Optional[ToolCallCallback] = None)->ClientResponse:
         def _get_value(obj, attribute:str):
             value = getattr(obj, attribute, NOT_GIVEN) if obj else NOT_GIVEN
             return value if value is not None else NOT_GIVEN
         
-        use_tools = call_tool and not (not self.tool_callbacks)
-        completion = await client.chat.completions.create(
+        tool_definitions = self.get_tool_definitions(options.tools if options else None) if call_tool and self.tool_callbacks else None
+        use_tools = not (not tool_definitions)
+        if use_tools and options is not None and options.tools is not None and options.tool_router is not None:
+            tool_tokens = self.get_tool_tokens()
+            options.tool_router.record_tokens(sum(tool_tokens.values()), sum(tool_tokens.get(name, 0) for name in set(options.tools)))
+        params = dict(
             model = self.model,
             messages = messages,
             modalities = _get_value(self, "modalities"),
             audio = {"voice": options.voice, "format": "wav"} if (self.modalities and "audio" in self.modalities and options.voice) else NOT_GIVEN,
-            tools = self.get_tool_definitions() if use_tools else NOT_GIVEN,
+            tools = tool_definitions if use_tools else NOT_GIVEN,
             tool_choice = self.tool_choice if use_tools else NOT_GIVEN,
             stream = stream,
+            stream_options = {"include_usage": True} if stream and self.stream_usage else NOT_GIVEN,
             reasoning_effort = _get_value(self, "reasoning_effort") if self.is_reasoning else NOT_GIVEN,
             temperature = _get_value(self, "temperature") if not self.is_reasoning else NOT_GIVEN,
             top_p = _get_value(self, "top_p") if not self.is_reasoning else NOT_GIVEN,
@@ -338,41 +713,174 @@ class OpenAIChatClient(BaseChatClient):
             presence_penalty = _get_value(self, "presence_penalty") if not self.is_reasoning else NOT_GIVEN,
             response_format = _get_value(options, "response_format")
             )
+        params = {key:value for key, value in params.items() if value is not NOT_GIVEN}
 
-        oai_response = ClientResponse(raw_response=completion)
+        session_id = options.session_id if options else None
         if not stream:
-            message = completion.choices[0].message
-            if message.tool_calls:
-                oai_response.tool_calls = message.tool_calls
-            elif message.audio:
-                oai_response.text = message.audio.transcript
-                oai_response.audio = message.audio.data
-            else:
-                oai_response.text = message.content
+            if self.is_cacheable(): # identical concurrent requests share one call
+                async def _call()->dict:
+                    return self._parse_completion(await self._create_completion_in_window(params, session_id)).to_cache()
+                cached = await self.cache.get_or_call(make_cache_key(params), _call)
+                return ClientResponse.from_cache(cached)
+            return self._parse_completion(await self._create_completion_in_window(params, session_id))
+
+        completion = await self._create_completion_in_window(params, session_id)
+        oai_response = ClientResponse(raw_response=completion)
+        assembler = ToolCallAssembler(on_complete = on_tool_call)
+        async for chunk in completion:
+            if (len(chunk.choices)==0): #skip the header
+                self._record_usage(chunk)
+                continue
+            delta = chunk.choices[0].delta
+            # the first chunk may have content for some OpenAI API compatible endpoint implementation
+            oai_response.text = delta.content or '' 
+            tool_calls = delta.tool_calls
+            if tool_calls:
+                assembler.add(tool_calls)
+            elif tool_calls is None and delta.content is None: #skip empty chunk
+                continue
+            elif chunk.choices[0].finish_reason != 'tool_calls':
+                #not the end chunk of tool calls, should be start chunk of message content
+                break #jump out of the loop to leave the outsider methon to handle stream content
+        oai_response.tool_calls = assembler.finish() or None
+        return oai_response
+
+    # send the request with the messages fitted to the context window of the model
+    ## fitted ahead if the estimated tokens exceed the known window, or fitted to the window reported by a context-length error and retried once
+    async def _create_completion_in_window(self, params:Dict[str, Any], session_id:Optional[str] = None)->object:
+        options = self.context_window
+        tracker = context_window_registry.get(self.end_point, self.model)
+        tools = params.get("tools")
+        budget = tracker.get_budget(options, tools)
+        if budget is not None:
+            messages, report = fit_messages(params["messages"], budget, options)
+            if messages is not params["messages"]:
+                tracker.record(report, predicted=True)
+                self._log_context_fit(report, "the estimated tokens exceed the context window")
+                params = {**params, "messages": messages}
+        try:
+            return await self._create_completion(params, session_id)
+        except BadRequestError as e:
+            if not options.recover or not is_context_length_error(e):
+                raise
+            messages_tokens = estimate_messages_tokens(params["messages"])
+            tracker.learn(e, messages_tokens + (estimate_json_tokens(tools) if tools else 0))
+            budget = tracker.get_budget(options, tools)
+            budget = min(budget, int(messages_tokens*(1 - options.margin))) if budget is not None else int(messages_tokens*UNKNOWN_WINDOW_RATIO)
+            messages, report = fit_messages(params["messages"], budget, options)
+            if not report.messages_dropped and not report.tool_results_truncated: # nothing to drop, e.g. a single large message
+                tracker.record(report, recovered=False)
+                raise
+            self._log_context_fit(report, f"context length exceeded: {e.message}")
+            try:
+                completion = await self._create_completion({**params, "messages": messages}, session_id)
+            except BadRequestError as retry_error:
+                if is_context_length_error(retry_error):
+                    tracker.record(report, recovered=False)
+                raise
+            tracker.record(report, recovered=True)
+            return completion
+
+    def _log_context_fit(self, report:ContextFitReport, reason:str)->None:
+        get_global_logger().warning(f"{reason}; fitted the messages to the context window of {self.model}: "
+                                    f"dropped {report.messages_dropped} messages, truncated {report.tool_results_truncated} tool results, "
+                                    f"{report.tokens_before} -> {report.tokens_after} estimated tokens")
+
+    # send the request to the endpoint, hedge the slow request if hedging is set
+    ## session_id: the routing key of multi-endpoint clients, the hedge request is not bound to the session
+    async def _create_completion(self, params:Dict[str, Any], session_id:Optional[str] = None)->object:
+        hedger = self.get_hedger()
+        if hedger is None:
+            return await self._create_completion_with_retry(params, session_id)
+
+        hedge_client = self.get_hedge_client()
+        hedge_params = {**params, "model": hedge_client.model}
+        if not params.get("stream"):
+            return await hedger.run(lambda: self._create_completion_with_retry(params, session_id),
+                                    lambda: hedge_client._create_completion_with_retry(hedge_params))
+
+        # hedge the stream by the latency of the first token
+        async def _first_token(client:OpenAIChatClient, params:Dict[str, Any], session_id:Optional[str] = None)->CompletionStream:
+            completion = await client._create_completion_with_retry(params, session_id)
+            if not isinstance(completion, CompletionStream):
+                completion = CompletionStream(completion)
+            try:
+                await completion.peek()
+            except BaseException:
+                await completion.close()
+                raise
+            return completion
+
+        async def _close(completion:CompletionStream)->None:
+            await completion.close()
+
+        return await hedger.run(lambda: _first_token(self, params, session_id),
+                                lambda: _first_token(hedge_client, hedge_params),
+                                stream = True,
+                                discard = _close)
+
+    # retry transient errors by the retry policy
+    ## note: only the request is retried, errors in the middle of a stream are raised to the caller
+    async def _create_completion_with_retry(self, params:Dict[str, Any], session_id:Optional[str] = None)->object:
+        return await call_with_retry(lambda: self._send_completion(params),
+                                     policy = self.retry_policy,
+                                     breaker = self.get_circuit_breaker())
+
+    # send the request once, under the rate limit of the deployment
+    async def _send_completion(self, params:Dict[str, Any])->object:
+        client = self.get_client()
+        limiter = self.get_rate_limiter()
+        if limiter is None:
+            return await client.chat.completions.create(**params)
+
+        estimated_tokens = estimate_messages_tokens(params.get("messages"))
+        await limiter.acquire(estimated_tokens)
+        try:
+            completion = await client.chat.completions.create(**params)
+        except RateLimitError:
+            limiter.release(success=False, rate_limited=True)
+            raise
+        except BaseException:
+            limiter.release(success=False)
+            raise
+        if params.get("stream"): # the request is in flight until the stream ends
+            return CompletionStream(completion, on_close=lambda error: limiter.release(success=error is None))
+        usage = getattr(completion, "usage", None)
+        extra_tokens = usage.total_tokens - estimated_tokens if usage and usage.total_tokens else 0
+        limiter.release(success=True, extra_tokens=extra_tokens)
+        return completion
+
+    # accumulate the usage of the completion (or the last chunk of the stream)
+    def _record_usage(self, completion:object)->None:
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            usage_registry.get(self.end_point, self.model).record(usage)
+
+    # convert non-streamed completion to client response
+    def _parse_completion(self, completion:object)->ClientResponse:
+        self._record_usage(completion)
+        oai_response = ClientResponse(raw_response=completion)
+        message = completion.choices[0].message
+        if message.tool_calls:
+            oai_response.tool_calls = message.tool_calls
+        elif message.audio:
+            oai_response.text = message.audio.transcript
+            oai_response.audio = message.audio.data
         else:
-            async for chunk in completion:
-                if (len(chunk.choices)==0): #skip the header
-                    continue
-                delta = chunk.choices[0].delta
-                # the first chunk may have content for some OpenAI API compatible endpoint implementation
-                oai_response.text = delta.content or '' 
-                tool_calls = delta.tool_calls
-                if tool_calls:
-                    tool_call = tool_calls[0]
-                    if tool_call.function.name: # append
-                        oai_response.tool_calls = oai_response.tool_calls or []
-                        oai_response.tool_calls.append(tool_call.model_copy(deep=True)) # must use deep copy
-                        oai_response.tool_calls[-1].function.arguments = ''
-                    if tool_call.function.arguments:
-                        # the arguments string returns character by character
-                        oai_response.tool_calls[-1].function.arguments += tool_call.function.arguments
-                elif tool_calls is None and delta.content is None: #skip empty chunk
-                    continue
-                elif chunk.choices[0].finish_reason != 'tool_calls':
-                    #not the end chunk of tool calls, should be start chunk of message content
-                    break #jump out of the loop to leave the outsider methon to handle stream content
+            oai_response.text = message.content
         return oai_response
     
+    # remove the message (by identity) from the messages and the conversation of the context
+    @staticmethod
+    def _remove_message(messages:list, context:Optional[ChatContext], message:Optional[dict])->None:
+        if message is None:
+            return
+        for message_list in (messages, context.messages if context else None):
+            for i in range(len(message_list or []) - 1, -1, -1):
+                if message_list[i] is message:
+                    del message_list[i]
+                    break
+
     # helper method to convert function call to LLM message
     def call_result_to_message(self, call:object, call_result:str)->dict:
         role = "tool" if not self.is_reasoning else "user"
@@ -405,9 +913,11 @@ class OpenAIChatClient(BaseChatClient):
                 ## step-2: add call function and add response to message list
                 calls = [self.call_function(self.tool_callbacks.get(toolCall.function.name), 
                                             toolCall.function.arguments,
-                                            context=context)
+                                            context=context,
+                                            session_id=options.session_id if options else None,
+                                            max_result_tokens=options.max_tool_result_tokens if options else None)
                         for toolCall in client_response.tool_calls]
-                callResults = await asyncio.gather(*calls) # make function call
+                callResults = await gather_tool_calls(calls) # make function call, cancel the siblings if one fails
                 for (toolCall, callResult) in zip(client_response.tool_calls, callResults):
                     result_message = self.call_result_to_message(toolCall, callResult)
                     messages.append(result_message)
@@ -431,29 +941,50 @@ class OpenAIChatClient(BaseChatClient):
             context.messages = messages[1:] # store the conversation to context, skip system prompt
         for step in range(max_iterations):
             call_tool = step < max_iterations-1 # last step should not call tool
-            client_response = await self.call_llm_model(messages, options,call_tool=call_tool,stream=True)
+            # tools are dispatched as soon as their arguments are streamed, while the remaining calls are still streaming
+            call_message:Optional[dict] = None
+            tool_tasks:Dict[int, asyncio.Task] = {} # index of tool call -> call task
+            progress_queue:asyncio.Queue[ToolProgress] = asyncio.Queue() # progress of streaming tools
+            def dispatch_tool_call(tool_call:object)->None:
+                nonlocal call_message
+                if call_message is None:
+                    ## step-1: add responded message to message list with the dispatched tool calls, all tool calls when the stream ends
+                    call_message = {"role": "assistant", "content": None, "tool_calls": [tool_call.model_dump()]}
+                    messages.append(call_message)
+                    if context:
+                        context.messages = messages[1:] # store the conversation to context
+                else:
+                    call_message["tool_calls"].append(tool_call.model_dump())
+                ## step-2: call function
+                tool_tasks[tool_call.index] = asyncio.create_task(
+                    self.call_function(self.tool_callbacks.get(tool_call.function.name) if self.tool_callbacks else None,
+                                       tool_call.function.arguments,
+                                       context=context,
+                                       on_progress=progress_queue.put_nowait,
+                                       session_id=options.session_id if options else None,
+                                       max_result_tokens=options.max_tool_result_tokens if options else None))
+            try:
+                client_response = await self.call_llm_model(messages, options,call_tool=call_tool,stream=True,
+                                                            on_tool_call=dispatch_tool_call)
+            except BaseException:
+                await cancel_tool_calls(tool_tasks.values())
+                self._remove_message(messages, context, call_message) # the tool call is incomplete
+                raise
             if client_response.tool_calls:
-                # handle tool calls
-                ## step-1: add responded message to message list
-                call_message = ({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [t.model_dump() for t in client_response.tool_calls]
-                })
-                messages.append(call_message)
-                if context:
-                    context.messages.append(call_message)
-
-                for toolCall in client_response.tool_calls:
-                    yield Chunk(function_call=Function(name=toolCall.function.name, arguments=toolCall.function.arguments))
-                ## step-2: add call function and add response to message list
-                if context:
-                    context.messages = messages[1:] # store the conversation to context
-                calls = [self.call_function(self.tool_callbacks.get(toolCall.function.name), 
-                                            toolCall.function.arguments,
-                                            context=context)
-                        for toolCall in client_response.tool_calls]
-                callResults = await asyncio.gather(*calls) # make function call
+                call_message["tool_calls"] = [t.model_dump() for t in client_response.tool_calls]
+                try:
+                    for toolCall in client_response.tool_calls:
+                        yield Chunk(function_call=Function(name=toolCall.function.name, arguments=toolCall.function.arguments))
+                    ## step-3: relay the progress of streaming tools, wait for call results and add response to message list
+                    tasks = [tool_tasks[toolCall.index] for toolCall in client_response.tool_calls]
+                    async for progress in iter_tool_progress(tasks, progress_queue):
+                        yield Chunk(tool_progress=progress)
+                    callResults = await asyncio.gather(*tasks)
+                except BaseException:
+                    self._remove_message(messages, context, call_message) # the tool call has no results
+                    raise
+                finally:
+                    await cancel_tool_calls(tool_tasks.values()) # the pending ones if failed or the stream is closed
                 for (toolCall, callResult) in zip(client_response.tool_calls, callResults):
                     result_message = self.call_result_to_message(toolCall, callResult)
                     messages.append(result_message)
@@ -463,19 +994,23 @@ class OpenAIChatClient(BaseChatClient):
                 break # return the result
 
         client_response.text = client_response.text or ''
-        # yield the remaining text word by word (rather than token by token)
-        atom_w_reader = AtomWordReader()
+        # yield the remaining text word by word (rather than token by token), or coalesced by the streaming options
+        text_buffer = StreamTextBuffer(self.streaming)
+        make_chunk = TextChunk if self.streaming and self.streaming.lightweight_chunks else Chunk
         if client_response.text:
             # yield word by word, rather than token by token. one token may have multiple words.
             #yield Chunk(text=client_response.text, done = False)
-            for word in atom_w_reader.emit_atoms(client_response.text):
-                yield Chunk(text=word, done = False)
+            for word in text_buffer.feed(client_response.text):
+                yield make_chunk(text=word, done = False)
 
         async for chunk in client_response.raw_response:
             if len(chunk.choices) == 0: #skip the head
+                self._record_usage(chunk) # the usage comes in the last chunk without choices
                 continue
             if chunk.choices[0].finish_reason == 'content_filter':
-                yield Chunk(text='', done=True) # return empty string if filtered.
+                for word in text_buffer.flush():
+                    yield make_chunk(text=word, done = False)
+                yield make_chunk(text='', done=True) # return empty string if filtered.
                 return
             chunk_message = chunk.choices[0].delta.content
             if chunk_message == '': #skip the first empty character ''
@@ -488,9 +1023,11 @@ class OpenAIChatClient(BaseChatClient):
             # this will remove the dependancy on tokenizer and make downstream text parser easier.
             if chunk_message:
                 #yield Chunk(text=chunk_message, done = False)
-                for word in atom_w_reader.emit_atoms(chunk_message):
-                    yield Chunk(text=word, done = False)
+                for word in text_buffer.feed(chunk_message):
+                    yield make_chunk(text=word, done = False)
+        for word in text_buffer.flush():
+            yield make_chunk(text=word, done = False)
         if context:
             context.messages.append({"role":"assistant", "content":client_response.text})
-        yield Chunk(text=client_response.text, done=True)
+        yield make_chunk(text=client_response.text, done=True)
 
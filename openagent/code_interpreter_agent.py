@@ -2,7 +2,7 @@
 from .utils import env as env
 import os, subprocess, json, csv
 import pandas as pd
-from typing import Optional, override, Dict, Any, Tuple
+from typing import Optional, override, Dict, Any, Tuple, AsyncGenerator
 from pydantic import BaseModel, ValidationError
 from datetime import datetime
 from enum import Enum
@@ -18,6 +18,8 @@ from .base_agent import (
     logging
 )
 from .react import ReactAgent, MAX_STEPS
+from .tools import ToolProgress
+from .tool_cache import ToolCacheOptions
 from .utils.multitask import run_in_thread_pool
 from .utils import format_template_with_json
 from .mcp import *
@@ -205,7 +207,7 @@ class CodeInterpreterAgent(ReactAgent):
         self.code_client = code_client or self.llm_client # set code agent LLM client
     
     #To-do: copy file to docker
-    @function_tool
+    @function_tool(cache=ToolCacheOptions(scope="run")) # the file is described once per run
     async def locate_and_desc_csv_file(self, filepath:str)->str:
         """Locate and describe the contents of a CSV file: CSV data header and sample data rows
         Parameters:
@@ -242,17 +244,19 @@ class CodeInterpreterAgent(ReactAgent):
             return error_msg        
 
     @function_tool
-    async def write_and_run_python_code(self, task:str)->str:
+    async def write_and_run_python_code(self, task:str)->AsyncGenerator[ToolProgress|str, None]:
         """Fulfill the task or requirement via coding, returns the written codes and python runtime output.
         Parameters:
             task (required): The **detailed** description of user task/requirement
         Returns:
             str: The python source codes in standalone program and the execution output of codes from docker.
         """
+        yield ToolProgress(f"writing python code for the task: {task}")
         python_code = await self.write_python_code(task)
+        yield ToolProgress(f"running python code:\n{python_code}")
         output = await self.execute_python_code(python_code)
 
-        return f"## Python code:\n{python_code}\n\n## Python runtime output:\n{output}"
+        yield f"## Python code:\n{python_code}\n\n## Python runtime output:\n{output}"
         
     async def write_python_code(self, task:str)->str:
         """Write codes in python and run the codes to fulfill the task or requirement.
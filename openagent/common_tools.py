@@ -1,30 +1,36 @@
 import json, asyncio
-from typing import Optional
+from typing import Optional, AsyncGenerator
 from .chatclient import BaseChatClient, OpenAIChatClient
 from .base_agent import function_tool, FunctionTool
+from .tools import ToolProgress
+from .tool_cache import ToolCacheOptions
 from .search_engine import BingSearch
+from .utils.calculator import evaluate_expression, format_value, CalculatorError
 
 def calculator() -> str:
-    @function_tool
+    @function_tool(execution="inline") # bounded by the limits of the evaluator, no need of a thread
     def calculator(expression: str)->str:
-        """Securely evaluates an arithmetic expression in python __builtins__ runtime.
+        """Securely evaluates an arithmetic expression in python syntax, e.g. "sqrt(2)*3**2", "mean([1, 2, 3])".
+        Supports numbers, + - * / // % **, the constants pi, e, tau, inf, and the functions:
+        abs, round, floor, ceil, trunc, sqrt, cbrt, exp, log, log10, log2, sin, cos, tan, asin, acos, atan, atan2,
+        sinh, cosh, tanh, degrees, radians, hypot, gcd, lcm, factorial, comb, perm, pow,
+        sum, prod, min, max, len, mean, median, stdev, variance.
+        Lists are computed elementwise, e.g. "[1, 2, 3] * 2 + 1" or "sqrt([4, 9])".
         Parameters:
-            expression (str): A string containing a single arithmetic expression valid in python.
+            expression (str): A string containing a single arithmetic expression.
         Returns:
-            str: The the eval(...) result of the arithmetic expression or an error message.
+            str: The result of the arithmetic expression or an error message.
         """
         try:
-            # Evaluate with restricted built-ins for basic arithmetic.
-            result = eval(expression, {"__builtins__": {}}, {})
-            return str(result)
-        except Exception as e:
+            return format_value(evaluate_expression(expression))
+        except CalculatorError as e:
             return f"Error: {str(e)}"
     return calculator
     
 def search_from_web(llm_client:Optional[BaseChatClient]= None, top_k:Optional[int]=None)->FunctionTool:
     search_engine = BingSearch(llm_client= llm_client, top_k=top_k)
-    @function_tool
-    async def search_from_web(query: str)->str:
+    @function_tool(cache=ToolCacheOptions(scope="run")) # the same query is often repeated in the steps of a run
+    async def search_from_web(query: str)->AsyncGenerator[ToolProgress|str, None]:
         """Search up-to-date or additional information from web.
         Parameters:
             - query (type:str, required): search term
@@ -32,16 +38,17 @@ def search_from_web(llm_client:Optional[BaseChatClient]= None, top_k:Optional[in
             str: string of a list of search result pages, or an error message.
         """
         try:
+            yield ToolProgress(f'searching from web: "{query}"')
             search_result = await search_engine.search(query)
             search_result = [page.model_dump() for page in search_result]
-            return json.dumps(search_result, ensure_ascii=False)
+            yield json.dumps(search_result, ensure_ascii=False)
         except Exception as e:
-            return f'Failed to search from web. query:"{str(query)}", reason:"{str(e)}"'
+            yield f'Failed to search from web. query:"{str(query)}", reason:"{str(e)}"'
     return search_from_web
 
 def search_from_web_batch(llm_client:BaseChatClient|None = None, top_k:Optional[int]=None)->FunctionTool:
     search_engine = BingSearch(llm_client= llm_client, top_k=top_k)
-    @function_tool
+    @function_tool(cache=ToolCacheOptions(scope="run"))
     async def search_from_web_batch(queries: list[str])->str:
         """Search up-to-date or additional information from web with a list of search queries in a batch.
         Parameters:
@@ -0,0 +1,111 @@
+"""
+Background compaction of the conversation history by summarization.
+When the history in memory approaches the token budget, the older turns are replaced by a running summary produced
+by a (cheaper) LLM. The summary is computed in a background task after the message is added, not inline before
+the next LLM call; the hard eviction of the memory stays the backstop while the summary is in progress.
+Usage:
+compactor = Compactor(llm_client=OpenAIChatClient(model="gpt-4o-mini", ...), options=CompactionOptions(max_tokens=8000))
+agent = AssistantAgent(llm_client=client, memory_compactor=compactor)
+"""
+import asyncio, threading, weakref
+from typing import Optional, List, TYPE_CHECKING
+from pydantic import BaseModel
+from .chatclient import BaseChatClient, ChatContext
+from .utils.logger import get_global_logger
+from .utils.tokens import estimate_message_tokens
+if TYPE_CHECKING:
+    from .memory import Memory
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and an AI agent, to be used as the memory of the agent for the rest of the conversation.
+- Merge the previous summary (if any) with the new messages into one summary.
+- Keep the facts, user preferences, decisions, names, numbers, tool results and open tasks that may be needed later. Drop the chit-chat.
+- Write in the language of the conversation, in at most {max_tokens} tokens.
+{previous_summary}
+# Conversation
+{conversation}"""
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+class CompactionOptions(BaseModel):
+    max_tokens: Optional[int] = None # the token budget of the history, the max_tokens of the memory if None
+    trigger_ratio: Optional[float] = 0.8 # compact when the history reaches this ratio of the budget
+    keep_ratio: Optional[float] = 0.4 # the latest turns kept verbatim, in ratio of the budget
+    max_summary_tokens: Optional[int] = 512
+
+class CompactionStats(BaseModel):
+    compactions: Optional[int] = 0
+    failures: Optional[int] = 0
+    messages_compacted: Optional[int] = 0
+    tokens_compacted: Optional[int] = 0 # estimated tokens of the compacted messages (and the previous summaries)
+    summary_tokens: Optional[int] = 0 # estimated tokens of the summaries replacing them
+    tokens_saved: Optional[int] = 0 # tokens_compacted - summary_tokens
+
+# the compactors of the process, for the stats
+_compactors:"weakref.WeakSet[Compactor]" = weakref.WeakSet()
+_compactors_lock = threading.Lock()
+
+class Compactor:
+    """Summarize the older turns of memories in the background. A compactor can be shared by the memories of several agents."""
+    def __init__(self, llm_client:BaseChatClient, options:Optional[CompactionOptions] = None) -> None:
+        self.llm_client = llm_client.clone(with_tools=False) # summarize without tools
+        self.options = options or CompactionOptions()
+        self.stats = CompactionStats()
+        with _compactors_lock:
+            _compactors.add(self)
+
+    def get_budget(self, memory:"Memory")->Optional[int]:
+        return self.options.max_tokens or memory.max_tokens
+
+    def schedule(self, memory:"Memory")->None:
+        """Start compacting the memory in background if it reaches the trigger, and is not being compacted."""
+        budget = self.get_budget(memory)
+        if not budget or memory.tokens < budget*self.options.trigger_ratio:
+            return
+        if memory.compaction_task is not None and not memory.compaction_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError: # no event loop, e.g. the memory is built before the run
+            return
+        memory.compaction_task = loop.create_task(self._compact(memory, budget))
+
+    async def _compact(self, memory:"Memory", budget:int)->None:
+        messages = memory.get_compactable_messages(int(budget*self.options.keep_ratio))
+        if not messages:
+            return
+        from .memory import message_to_text
+        previous = memory.summary
+        conversation = '\n'.join(message_to_text(message) for message in messages)
+        prompt = SUMMARY_PROMPT.format(max_tokens=self.options.max_summary_tokens,
+                                       previous_summary=f"# Previous summary\n{previous['content']}\n" if previous else "",
+                                       conversation=conversation)
+        try:
+            response = await self.llm_client.send(prompt=prompt, system="You summarize conversations accurately and concisely.",
+                                                  context=ChatContext()) # not the context of a run
+            summary = (response.text or "").strip()
+            if not summary:
+                raise ValueError("empty summary")
+        except Exception as e:
+            self.stats.failures += 1
+            get_global_logger().warning(f"failed to compact memory: {str(e)}")
+            return
+        compacted, compacted_tokens = memory.compact(messages, SUMMARY_HEADER + summary)
+        if not compacted:
+            return
+        try:
+            await memory.save_summary() # resumed sessions load the summary with the tail
+        except Exception as e:
+            get_global_logger().warning(f"failed to save the summary of memory: {str(e)}")
+        summary_tokens = estimate_message_tokens(memory.summary)
+        self.stats.compactions += 1
+        self.stats.messages_compacted += compacted
+        self.stats.tokens_compacted += compacted_tokens
+        self.stats.summary_tokens += summary_tokens
+        self.stats.tokens_saved += compacted_tokens - summary_tokens
+
+    def get_stats(self)->CompactionStats:
+        return self.stats.model_copy()
+
+def get_compaction_stats()->List[CompactionStats]:
+    with _compactors_lock:
+        compactors = list(_compactors)
+    return [compactor.get_stats() for compactor in compactors]
@@ -0,0 +1,219 @@
+"""
+Recovery from context-length overflow of LLM requests, instead of rejecting the whole run.
+- Predict: the estimated tokens of the request are checked against the context window of the model (configured, or learned
+  from a previous context-length error of the deployment), and the messages are fitted before the request is sent.
+- Recover: on a context-length error of the endpoint, the messages are fitted to the window reported by the error (or to
+  a ratio of the failed request if the error reports no window) and the request is retried once.
+The messages are fitted by the policy, step by step until they fit:
+- truncate_tool_results: truncate the large tool results, the oldest first.
+- drop_oldest: drop the oldest messages, a tool call and its results together. The system prompt, the latest user message
+  and the latest message (or tool call) are kept.
+Only the request is fitted, the messages of the run (and the memory of agents) are untouched.
+"""
+import re, threading
+from typing import Optional, List, Dict, Tuple, Literal, Any
+from pydantic import BaseModel
+from openai import BadRequestError
+from .utils.tokens import estimate_message_tokens, estimate_json_tokens, CHARS_PER_TOKEN
+
+class ContextWindowOptions(BaseModel):
+    max_context_tokens: Optional[int] = None # the context window of the model, learned from the context-length errors if None
+    reserve_tokens: Optional[int] = 1024 # tokens reserved for the completion
+    margin: Optional[float] = 0.1 # ratio of the window kept free for the error of the token estimation
+    policy: Optional[List[Literal["truncate_tool_results", "drop_oldest"]]] = ["truncate_tool_results", "drop_oldest"]
+    tool_result_tokens: Optional[int] = 1024 # the tokens a tool result is truncated to by "truncate_tool_results"
+    recover: Optional[bool] = True # fit and retry once on a context-length error of the endpoint
+
+class ContextFitReport(BaseModel):
+    """What was dropped to fit a request in the context window."""
+    tokens_before: Optional[int] = 0 # estimated tokens of the messages
+    tokens_after: Optional[int] = 0
+    messages_dropped: Optional[int] = 0
+    tool_results_truncated: Optional[int] = 0
+    fitted: Optional[bool] = True # whether the messages fit the budget
+
+class ContextWindowStats(BaseModel):
+    end_point: Optional[str] = None
+    model: Optional[str] = None
+    window: Optional[int] = None # the context window in estimated tokens, learned from the errors
+    predicted: Optional[int] = 0 # requests fitted before sending, by the estimation
+    overflows: Optional[int] = 0 # context-length errors of the endpoint
+    recovered: Optional[int] = 0 # overflowed requests succeeded after fitted
+    failed: Optional[int] = 0 # overflowed requests failed to recover
+    messages_dropped: Optional[int] = 0
+    tool_results_truncated: Optional[int] = 0
+    tokens_dropped: Optional[int] = 0 # estimated tokens dropped or truncated
+
+# the context-length errors of the providers, by the error code or the message. Only specific phrases about the context
+## or the prompt tokens, as a generic "exceeds the maximum" also matches other limits (e.g. the number of tools, image size)
+_CONTEXT_LENGTH_CODES = frozenset(["context_length_exceeded", # OpenAI, Azure OpenAI
+                                   "exceed_context_size_error"]) # llama.cpp server
+_CONTEXT_LENGTH_ERRORS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"maximum context length", # OpenAI, Azure OpenAI, vLLM, Mistral
+    r"prompt is too long: \d+ tokens", # Anthropic
+    r"is too long to fit into the model \(context length", # vLLM
+    r"exceeds the available context size", # llama.cpp server
+    r"input token count \(\d+\) exceeds the maximum number of tokens", # Gemini
+    r"`inputs` tokens \+ `max_new_tokens` must be <=", # text-generation-inference
+    )]
+_MAX_CONTEXT = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"maximum context length is (\d+)", r"(\d+) maximum context length", r"\(context length (\d+)\)",
+    r"tokens > (\d+) maximum", r"maximum number of tokens allowed \((\d+)\)", r"must be <= (\d+)")]
+_PROMPT_TOKENS = [re.compile(pattern, re.IGNORECASE) for pattern in ( # by priority, the prompt tokens before the total
+    r"(\d+) in the messages", r"resulted in (\d+) tokens", r"prompt is too long: (\d+) tokens", r"prompt contains (\d+) tokens",
+    r"total length (\d+)\)", r"input token count \((\d+)\)", r"given: (\d+) `inputs` tokens", r"requested (\d+) tokens")]
+
+def _search(patterns:List[re.Pattern], text:str)->Optional[int]:
+    match = next((match for match in (pattern.search(text) for pattern in patterns) if match), None)
+    return int(match.group(1)) if match else None
+
+UNKNOWN_WINDOW_RATIO = 0.75 # fit the retry to this ratio of the failed request, if the error reports no window
+
+def is_context_length_error(e:BaseException)->bool:
+    """Whether the request is rejected as it exceeds the context window of the model."""
+    if not isinstance(e, BadRequestError):
+        return False
+    body = e.body if isinstance(e.body, dict) else {}
+    error = body.get("error") if isinstance(body.get("error"), dict) else body
+    if error.get("code") in _CONTEXT_LENGTH_CODES:
+        return True
+    message = str(error.get("message") or e.message or "")
+    return any(pattern.search(message) for pattern in _CONTEXT_LENGTH_ERRORS)
+
+def parse_context_length_error(e:BaseException)->Tuple[Optional[int], Optional[int]]:
+    """Return the (context window, prompt tokens) reported by the error, None if not reported."""
+    message = str(getattr(e, "message", None) or e)
+    return _search(_MAX_CONTEXT, message), _search(_PROMPT_TOKENS, message)
+
+def _truncate(message:Dict[str, Any], max_tokens:int, tokens:int)->Dict[str, Any]:
+    content = str(message.get("content") or "")
+    keep = max(0, len(content)*max_tokens//max(tokens, 1))
+    return {**message, "content": f"{content[:keep]}\n...[truncated {len(content) - keep} characters to fit the context window]"}
+
+def _groups(messages:List[Dict[str, Any]])->List[List[int]]:
+    """The indexes of the messages by groups, a tool call and its results are one group. The system messages are skipped."""
+    groups:List[List[int]] = []
+    for i, message in enumerate(messages):
+        if message.get("role") == "system":
+            continue
+        if message.get("tool_call_id") and groups and messages[groups[-1][0]].get("tool_calls"):
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    return groups
+
+def fit_messages(messages:List[Dict[str, Any]],
+                 budget:int,
+                 options:Optional[ContextWindowOptions] = None)->Tuple[List[Dict[str, Any]], ContextFitReport]:
+    """Return the messages fitted to the budget of estimated tokens by the policy, and the report of what was dropped."""
+    options = options or ContextWindowOptions()
+    tokens = [estimate_message_tokens(message) for message in messages]
+    report = ContextFitReport(tokens_before=sum(tokens), tokens_after=sum(tokens))
+    if report.tokens_before <= budget:
+        return messages, report
+    messages = list(messages)
+    total = report.tokens_before
+    for step in options.policy:
+        if total <= budget:
+            break
+        if step == "truncate_tool_results":
+            limit = options.tool_result_tokens
+            for i, message in enumerate(messages):
+                if total <= budget:
+                    break
+                if message is not None and message.get("tool_call_id") and isinstance(message.get("content"), str) and tokens[i] > limit + CHARS_PER_TOKEN:
+                    messages[i] = _truncate(message, limit, tokens[i])
+                    new_tokens = estimate_message_tokens(messages[i])
+                    total -= tokens[i] - new_tokens
+                    tokens[i] = new_tokens
+                    report.tool_results_truncated += 1
+        elif step == "drop_oldest":
+            groups = _groups(messages)
+            last_user = max((group[0] for group in groups if messages[group[0]].get("role") == "user"), default=None)
+            for group in groups[:-1]: # keep the latest message or tool call
+                if total <= budget:
+                    break
+                if group[0] == last_user: # keep the task of the turn
+                    continue
+                for i in group:
+                    total -= tokens[i]
+                    messages[i] = None
+                    report.messages_dropped += 1
+            messages = [message for message in messages if message is not None]
+            tokens = [estimate_message_tokens(message) for message in messages]
+    report.tokens_after = total
+    report.fitted = total <= budget
+    return messages, report
+
+class ContextWindowTracker:
+    """The context window of one deployment (end_point, model), and the stats of fitted requests."""
+    def __init__(self, end_point:str, model:str) -> None:
+        self._lock = threading.Lock()
+        self.stats = ContextWindowStats(end_point=end_point, model=model)
+        self.window:Optional[int] = None # learned from the errors, in estimated tokens
+
+    def get_budget(self, options:ContextWindowOptions, tools:Optional[List[Any]] = None)->Optional[int]:
+        """The budget of the estimated tokens of the messages, None if the window is unknown."""
+        window = min((w for w in (options.max_context_tokens, self.window) if w), default=None)
+        if not window:
+            return None
+        return int(window*(1 - options.margin)) - options.reserve_tokens - (estimate_json_tokens(tools) if tools else 0)
+
+    def learn(self, e:BaseException, estimated_tokens:int)->None:
+        """
+        Learn the window from the context-length error of a request of the estimated tokens.
+        The window is kept if the error doesn't report it, as the request size tells little of the window.
+        """
+        window, tokens = parse_context_length_error(e)
+        learned = None
+        if window and tokens:
+            learned = window*estimated_tokens//tokens # calibrate the estimation by the tokens counted by the endpoint
+        elif window:
+            learned = window
+        with self._lock:
+            if learned:
+                self.window = min(self.window or learned, learned)
+            self.stats.overflows += 1
+
+    def record(self, report:ContextFitReport, predicted:bool = False, recovered:Optional[bool] = None)->None:
+        with self._lock:
+            if predicted:
+                self.stats.predicted += 1
+            if recovered is True:
+                self.stats.recovered += 1
+            elif recovered is False:
+                self.stats.failed += 1
+            self.stats.messages_dropped += report.messages_dropped
+            self.stats.tool_results_truncated += report.tool_results_truncated
+            self.stats.tokens_dropped += report.tokens_before - report.tokens_after
+
+    def get_stats(self)->ContextWindowStats:
+        with self._lock:
+            stats = self.stats.model_copy()
+            stats.window = self.window
+        return stats
+
+class ContextWindowRegistry:
+    """Hands out one ContextWindowTracker per deployment (end_point, model)."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._trackers:Dict[Tuple[str, str], ContextWindowTracker] = {}
+
+    def get(self, end_point:str, model:str) -> ContextWindowTracker:
+        key = (end_point or "", model or "")
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = ContextWindowTracker(end_point, model)
+            return tracker
+
+    def get_stats(self) -> List[ContextWindowStats]:
+        with self._lock:
+            trackers = list(self._trackers.values())
+        return [tracker.get_stats() for tracker in trackers]
+
+# the process-wide registry
+context_window_registry = ContextWindowRegistry()
+
+def get_context_window_stats() -> List[ContextWindowStats]:
+    return context_window_registry.get_stats()
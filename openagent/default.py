@@ -8,4 +8,9 @@ OPENAGENT_LLM_TEMPERATURE = env.get("OPENAGENT_OPENAI_LLM_TEMPERATURE", None)
 OPENAGENT_LLM_TOP_P = env.get("OPENAGENT_OPENAI_LLM_TOP_P", None)
 OPENAGENT_LLM_IS_REASONING = bool(env.get("OPENAGENT_OPENAI_LLM_IS_REASONING", "false").lower() == "true")
 OPENAGENT_LLM_REASONING_EFFORT = env.get("OPENAGENT_OPENAI_LLM_REASONING_EFFORT", None)
+OPENAGENT_LLM_CONTEXT_TOKENS = int(env.get("OPENAGENT_OPENAI_LLM_CONTEXT_TOKENS", "0")) # context window of the model to fit the messages ahead, 0 to learn it from the context-length errors
 OPENAGENT_MAX_STEPS = 30
+OPENAGENT_MAX_TOOL_CONCURRENCY = int(env.get("OPENAGENT_MAX_TOOL_CONCURRENCY", "0")) # global limit of concurrent tool calls, 0 for unlimited
+OPENAGENT_MAX_TOOL_RESULT_TOKENS = int(env.get("OPENAGENT_MAX_TOOL_RESULT_TOKENS", "0")) # store larger tool results out of the messages, 0 to disable
+OPENAGENT_MEMORY_MAX_TOKENS = int(env.get("OPENAGENT_MEMORY_MAX_TOKENS", "0")) # token budget of the conversation history of agents, 0 for unlimited
+OPENAGENT_STABLE_PROMPT = bool(env.get("OPENAGENT_STABLE_PROMPT", "false").lower() == "true") # byte-stable system prompt prefix for prompt caching
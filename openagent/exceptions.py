@@ -28,3 +28,9 @@ class AgentException(Exception):
         super().__init__(details)
         self.module:Optional[str] = module
         self.error_code:Optional[ErrorCode] = error_code # for seraiable
+
+class CircuitOpenError(AgentException):
+    """Raised without calling the endpoint when its circuit breaker is open (the endpoint is considered down)."""
+    def __init__(self, details:Optional[str]=None, error_code:Optional[ErrorCode]=ErrorCode.LlmAccessError, module:Optional[str]=None, retry_after:Optional[float]=None) -> None:
+        super().__init__(details=details, error_code=error_code, module=module)
+        self.retry_after:Optional[float] = retry_after # seconds until the breaker allows a probe request
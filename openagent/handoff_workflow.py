@@ -1,5 +1,8 @@
 from typing import Optional, override, Any, Dict, List
-from .base_agent import BaseAgent, Prompt, AgentContext, AgentStream, Chunk, function_tool, MAX_STEPS
+from .base_agent import BaseAgent, Prompt, AgentContext, AgentStream, Chunk, function_tool, MAX_STEPS, OPENAGENT_MEMORY_MAX_TOKENS
+from .compaction import Compactor
+from .tool_router import EmbedFunction
+from .memory_store import BaseMemoryStore
 from .assistant_agent import AssistantAgent
 
 def _normalize_agent_name(agent_name:str):
@@ -15,6 +18,12 @@ class HandoffWorkflow(BaseAgent):
                  description:Optional[str] = "Handoff to sub-agents according to user query",
                  triage_agent:Optional[AssistantAgent] = None,
                  max_steps:Optional[int] = MAX_STEPS, # max hanoffs
+                 memory_max_tokens:Optional[int] = OPENAGENT_MEMORY_MAX_TOKENS, # the conversation history shared by the sub-agents
+                 memory_recall:Optional[int] = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 memory_compactor:Optional[Compactor] = None,
                  logger = None,
                  verbose:Optional[bool] = False) -> None:
         super().__init__(llm_client = None,
@@ -22,6 +31,12 @@ class HandoffWorkflow(BaseAgent):
                          description = description,
                          instructions = None, # no instructions needed for worflow
                          max_steps=max_steps,
+                         memory_max_tokens = memory_max_tokens,
+                         memory_recall = memory_recall,
+                         memory_embed = memory_embed,
+                         memory_store = memory_store,
+                         session_id = session_id,
+                         memory_compactor = memory_compactor,
                          logger = logger,
                          verbose = verbose)
         
@@ -57,11 +72,11 @@ class HandoffWorkflow(BaseAgent):
     
     def register_handoff(self, agent:AssistantAgent):
         if _normalize_agent_name(agent.name) not in self.agent_map.keys():
-            agent.register_tools([self.handoff_to_agent])
+            agent.register_tools([self.handoff_to_agent], pinned=True) # handoff is always available to the agent
             self.agent_map[_normalize_agent_name(agent.name)] = agent # add to agent map
 
     #TO-DO: use agent_name="TriageAgent" as default triage agent
-    @function_tool
+    @function_tool(execution="inline") # switches the active agent of the workflow, run on the event loop
     def handoff_to_agent(self, agent_name:str, message:str, context:AgentContext)->str:
         """Handoff the conversation to the agent who will take over the conversation and further handle user request.
         Parameters:
@@ -0,0 +1,147 @@
+"""
+Hedged requests to cut the tail latency of LLM calls.
+If the response (or the first token of a stream) hasn't arrived within the latency budget, i.e. a percentile of the
+recently observed latencies, a duplicate request is sent to the same or an alternate endpoint. The first successful
+response wins and the other request is cancelled.
+"""
+import asyncio, math, threading, time
+from collections import deque
+from typing import Optional, Dict, Tuple, List, Callable, Awaitable, TypeVar
+from pydantic import BaseModel
+
+class HedgingOptions(BaseModel):
+    percentile: Optional[float] = 95.0 # hedge requests slower than the percentile of observed latencies
+    initial_delay: Optional[float] = 5.0 # seconds, the budget before min_samples latencies are observed
+    min_delay: Optional[float] = 0.2 # lower bound of the budget, avoid doubling the load when the endpoint is fast
+    max_delay: Optional[float] = 30.0 # upper bound of the budget
+    min_samples: Optional[int] = 20
+    window_size: Optional[int] = 200 # latencies of the recent requests to compute the percentile
+    # the alternate endpoint of the duplicate request, same as the client if None
+    end_point: Optional[str] = None
+    api_key: Optional[str] = None
+    api_version: Optional[str] = None
+    model: Optional[str] = None
+
+class HedgingStats(BaseModel):
+    end_point: Optional[str] = None
+    model: Optional[str] = None
+    requests: Optional[int] = 0
+    hedged: Optional[int] = 0 # duplicate requests sent
+    hedge_wins: Optional[int] = 0 # duplicate requests finished first
+    budget: Optional[float] = 0.0 # current latency budget of non-streamed requests (seconds)
+    stream_budget: Optional[float] = 0.0 # current latency budget of the first token of streams (seconds)
+
+class LatencyTracker:
+    """Sliding window of observed latencies."""
+    def __init__(self, window_size:int) -> None:
+        self._latencies:deque[float] = deque(maxlen=window_size)
+
+    def record(self, latency:float) -> None:
+        self._latencies.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, p:float) -> float:
+        latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, max(0, math.ceil(p/100*len(latencies)) - 1))]
+
+T = TypeVar("T")
+class Hedger:
+    """Hedging state of one deployment, shared by the clients of it."""
+    def __init__(self, end_point:str, model:str, options:HedgingOptions) -> None:
+        self.options = options
+        self.stats = HedgingStats(end_point=end_point, model=model)
+        self._trackers = {False: LatencyTracker(options.window_size), True: LatencyTracker(options.window_size)}
+
+    def get_budget(self, stream:bool) -> float:
+        tracker = self._trackers[stream]
+        if len(tracker) < self.options.min_samples:
+            budget = self.options.initial_delay
+        else:
+            budget = tracker.percentile(self.options.percentile)
+        return min(self.options.max_delay, max(self.options.min_delay, budget))
+
+    async def run(self,
+                  primary:Callable[[], Awaitable[T]],
+                  hedge:Callable[[], Awaitable[T]],
+                  stream:bool = False,
+                  discard:Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+        """
+        Make the primary call, and the hedge call if the primary is slower than the budget. Return the first successful result.
+        - discard: release the result of the loser (e.g. close the stream) if both calls succeeded
+        """
+        self.stats.requests += 1
+        started_at = time.monotonic()
+        primary_task = asyncio.ensure_future(primary())
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.get_budget(stream))
+        except BaseException:
+            primary_task.cancel()
+            raise
+        if done:
+            if primary_task.exception() is None:
+                self._trackers[stream].record(time.monotonic() - started_at)
+            return primary_task.result()
+
+        self.stats.hedged += 1
+        hedged_at = time.monotonic()
+        hedge_task = asyncio.ensure_future(hedge())
+        pending = {primary_task, hedge_task}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary_task, hedge_task): # prefer the primary if both are done
+                    if task in done and task.exception() is None:
+                        winner = task
+                        break
+        finally:
+            for task in pending:
+                task.cancel()
+            losers = [task for task in (primary_task, hedge_task) if task is not winner]
+            for task in losers:
+                if task in pending:
+                    continue
+                if task.exception() is None and discard: # both succeeded
+                    await discard(task.result())
+        if winner is None: # both failed, raise the error of the primary
+            return primary_task.result()
+        if winner is hedge_task:
+            self.stats.hedge_wins += 1
+            self._trackers[stream].record(time.monotonic() - hedged_at)
+        else:
+            self._trackers[stream].record(time.monotonic() - started_at)
+        return winner.result()
+
+    def get_stats(self) -> HedgingStats:
+        self.stats.budget = round(self.get_budget(False), 3)
+        self.stats.stream_budget = round(self.get_budget(True), 3)
+        return self.stats.model_copy()
+
+class HedgerRegistry:
+    """Hands out one Hedger per deployment (end_point, model), the options of the first client win."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hedgers:Dict[Tuple[str, str], Hedger] = {}
+
+    def get(self, end_point:str, model:str, options:HedgingOptions) -> Hedger:
+        key = (end_point or "", model or "")
+        with self._lock:
+            hedger = self._hedgers.get(key)
+            if hedger is None:
+                hedger = self._hedgers[key] = Hedger(end_point, model, options)
+            return hedger
+
+    def get_stats(self) -> List[HedgingStats]:
+        with self._lock:
+            hedgers = list(self._hedgers.values())
+        return [hedger.get_stats() for hedger in hedgers]
+
+# the process-wide registry
+hedger_registry = HedgerRegistry()
+
+def get_hedging_stats() -> List[HedgingStats]:
+    return hedger_registry.get_stats()
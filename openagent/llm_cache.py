@@ -0,0 +1,151 @@
+"""
+Exact-match cache of LLM responses.
+The cache key is a canonical hash of the request (model, messages, tools, sampling params, response_format).
+Identical concurrent requests share one in-flight call to the endpoint.
+"""
+import asyncio, hashlib, json, sqlite3, threading, time
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, Callable, Awaitable
+from pydantic import BaseModel
+from .utils.cache import TTLCache
+from .utils.multitask import run_in_thread_pool
+
+CacheValue = Dict[str, Any] # json serializable response
+
+# canonical hash of the request parameters
+def make_cache_key(params:Dict[str, Any]) -> str:
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class LLMCacheStats(BaseModel):
+    hits: Optional[int] = 0 # served from cache
+    misses: Optional[int] = 0 # called the endpoint
+    coalesced: Optional[int] = 0 # waited for an identical in-flight call
+
+class BaseLLMCache(ABC):
+    """Base class of LLM response cache. Subclass implements storage by `load` and `save`."""
+    def __init__(self, ttl:Optional[float] = None) -> None:
+        self.ttl = ttl # seconds, never expire if None
+        self.stats = LLMCacheStats()
+        self._in_flight:Dict[str, asyncio.Future] = {}
+
+    @abstractmethod
+    async def load(self, key:str) -> Optional[CacheValue]:
+        pass
+
+    @abstractmethod
+    async def save(self, key:str, value:CacheValue) -> None:
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        pass
+
+    async def get_or_call(self, key:str, call:Callable[[], Awaitable[CacheValue]]) -> CacheValue:
+        """Return cached value of the key, otherwise make the call (shared by identical concurrent requests) and cache the result."""
+        value = await self.load(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+        in_flight = self._in_flight.get(key)
+        while in_flight is not None:
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                    raise # this request is cancelled
+                in_flight = self._in_flight.get(key) # the shared call is cancelled by its owner, take over the call
+
+        self.stats.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await call()
+            await self.save(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception() # mark retrieved, the waiters (if any) will re-raise it
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+class InMemoryLLMCache(BaseLLMCache):
+    """In-process LRU cache of LLM responses."""
+    def __init__(self, max_size:Optional[int] = 1024, ttl:Optional[float] = None) -> None:
+        super().__init__(ttl = ttl)
+        self._cache = TTLCache(max_size = max_size, ttl = ttl)
+
+    async def load(self, key:str) -> Optional[CacheValue]:
+        return self._cache.get(key)
+
+    async def save(self, key:str, value:CacheValue) -> None:
+        self._cache.set(key, value)
+
+    async def clear(self) -> None:
+        self._cache.clear()
+
+EVICTION_INTERVAL = 64 # check size bound of SQLite cache every N writes
+class SQLiteLLMCache(BaseLLMCache):
+    """On-disk cache of LLM responses in a SQLite database, survives process restarts."""
+    def __init__(self, path:Optional[str] = "openagent_llm_cache.db", max_size:Optional[int] = 100000, ttl:Optional[float] = None) -> None:
+        super().__init__(ttl = ttl)
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache(accessed_at)")
+            self._conn.commit()
+
+    def _load(self, key:str) -> Optional[CacheValue]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now: # expired
+                self._conn.execute("DELETE FROM llm_cache WHERE key=?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at=? WHERE key=?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _save(self, key:str, value:CacheValue) -> None:
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(value, ensure_ascii=False), expires_at, now))
+            self._writes += 1
+            if self.max_size is not None and self._writes % EVICTION_INTERVAL == 0: # evict the least recently used
+                self._conn.execute("DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                                   (self.max_size,))
+            self._conn.commit()
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    # sqlite access is blocking, run in thread pool
+    async def load(self, key:str) -> Optional[CacheValue]:
+        return await run_in_thread_pool(self._load, key)
+
+    async def save(self, key:str, value:CacheValue) -> None:
+        await run_in_thread_pool(self._save, key, value)
+
+    async def clear(self) -> None:
+        await run_in_thread_pool(self._clear)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
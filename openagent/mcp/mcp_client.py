@@ -13,6 +13,7 @@ from mcp.types import CallToolResult, JSONRPCMessage
 from typing_extensions import NotRequired, TypedDict
 
 from ..exceptions import *
+from ..tool_cache import ToolCacheOptions
 from ..utils.logger import Logger, get_global_logger, logging
 
 # abstract class for MCP access
@@ -61,6 +62,11 @@ class MCPClient(abc.ABC):
         """return the logger for mcp"""
         pass
 
+    # limits of the tool calls to the server, applied to the function tools of the server
+    tool_timeout: float | None = None # seconds of each tool call
+    max_concurrency: int | None = None # concurrent tool calls to the server
+    tool_cache: ToolCacheOptions | None = None # cache the results of identical tool calls
+
 # MCP access base class with context management
 class _MCPWithClientSession(MCPClient, abc.ABC):
     """Base class for MCP servers that use a `ClientSession` to communicate with the server."""
@@ -224,7 +230,10 @@ class MCPClientStdio(_MCPWithClientSession):
         cache_tools_list: bool = False,
         name: str | None = None,
         mcp_tool_prefix:str | None = "mcp_",
-        logger: Logger | None = None
+        logger: Logger | None = None,
+        tool_timeout: float | None = None,
+        max_concurrency: int | None = None,
+        tool_cache: ToolCacheOptions | None = None
     ):
         """Create a new MCP server based on the stdio transport.
 
@@ -241,6 +250,10 @@ class MCPClientStdio(_MCPWithClientSession):
                 improve latency (by avoiding a round-trip to the server every time).
             name: A readable name for the server. If not provided, we'll create one from the
                 command.
+            tool_timeout: The timeout in seconds of each tool call, the call is cancelled and
+                reported to the LLM as a timeout error.
+            max_concurrency: The max concurrent tool calls to the server.
+            tool_cache: Cache the results of identical tool calls (scope, ttl and size), no cache if None.
         """
         super().__init__(cache_tools_list, logger = logger)
 
@@ -255,6 +268,9 @@ class MCPClientStdio(_MCPWithClientSession):
 
         self._name = name or f"stdio: {self.params.command}"
         self._mcp_tool_prefix = mcp_tool_prefix
+        self.tool_timeout = tool_timeout
+        self.max_concurrency = max_concurrency
+        self.tool_cache = tool_cache
 
     def create_streams(
         self,
@@ -306,7 +322,10 @@ class MCPClientSse(_MCPWithClientSession):
         cache_tools_list: bool = False,
         name: str | None = None,
         mcp_tool_prefix:str | None = "mcp_",
-        logger: Logger | None = None
+        logger: Logger | None = None,
+        tool_timeout: float | None = None,
+        max_concurrency: int | None = None,
+        tool_cache: ToolCacheOptions | None = None
     ):
         """Create a new MCP server based on the HTTP with SSE transport.
 
@@ -324,12 +343,19 @@ class MCPClientSse(_MCPWithClientSession):
 
             name: A readable name for the server. If not provided, we'll create one from the
                 URL.
+            tool_timeout: The timeout in seconds of each tool call, the call is cancelled and
+                reported to the LLM as a timeout error.
+            max_concurrency: The max concurrent tool calls to the server.
+            tool_cache: Cache the results of identical tool calls (scope, ttl and size), no cache if None.
         """
         super().__init__(cache_tools_list, logger=logger)
 
         self.params = params
         self._name = name or f"sse: {self.params['url']}"
         self._mcp_tool_prefix = mcp_tool_prefix
+        self.tool_timeout = tool_timeout
+        self.max_concurrency = max_concurrency
+        self.tool_cache = tool_cache
 
     def create_streams(
         self,
@@ -72,13 +72,20 @@ class MCPAccessUtil:
                 "parameters": input_schema,
             },
         }
+        if is_strict:
+            json_schema["function"]["strict"] = True
         
         function_tool = FunctionTool(
             name = tool_name,
             description = mcp_tool.description or "",
             json_schema = json_schema,
             callback = invoke_func,
-            is_async = True # it's async function
+            is_async = True, # it's async function
+            timeout = mcp_client.tool_timeout,
+            max_concurrency = mcp_client.max_concurrency,
+            concurrency_group = f"mcp:{mcp_client.name}", # the tools of the server share the limit and the caches
+            strict = is_strict,
+            cache = mcp_client.tool_cache
             )
 
         function_tool.input_arguments = {}
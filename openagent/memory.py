@@ -0,0 +1,302 @@
+"""
+In-memory conversation history of agents, bounded by the number of messages and by the estimated tokens.
+The oldest messages are evicted first. An assistant message with tool calls and its tool results are a group,
+evicted together, so the history never starts with tool results whose tool call is gone.
+With a memory store, the added messages are persisted to the session, and the tail of the session is loaded on resume.
+With an archive, the evicted messages are indexed by embeddings, `search_context` recalls the relevant older turns.
+With a compactor, the older turns are replaced by a running summary in background when the history approaches the budget,
+the summary is saved to the session in the store and loaded with the tail on resume.
+"""
+import asyncio, zlib
+import numpy as np
+from collections import deque
+from typing import Optional, List, Deque, Tuple, TYPE_CHECKING
+from .chatclient import MessageType
+from .utils.tokens import estimate_message_tokens
+from .utils.vector_index import VectorIndex, VectorIndexOptions
+from .memory_store import BaseMemoryStore
+from .tool_router import EmbedFunction, tokenize
+if TYPE_CHECKING:
+    from .compaction import Compactor
+
+MAX_IN_MEMORY_MESSAGES = 50
+
+class _MessageGroup:
+    __slots__ = ("messages", "tokens")
+    def __init__(self) -> None:
+        self.messages:List[MessageType] = []
+        self.tokens = 0
+
+    def is_tool_call(self)->bool:
+        return bool(self.messages[0].get("tool_calls")) if self.messages else False
+
+HASHING_DIM = 512
+async def hashing_embed(texts:List[str])->List[List[float]]:
+    """Local embeddings by feature hashing of the words (bag of words), the default if no embedding model is set."""
+    vectors = np.zeros((len(texts), HASHING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            hash = zlib.crc32(token.encode('utf-8'))
+            vectors[row, hash % HASHING_DIM] += 1.0 if (hash >> 16) & 1 else -1.0
+    return vectors.tolist()
+
+def message_to_text(message:MessageType)->str:
+    content = message.get("content")
+    if isinstance(content, list): # multi-modal content parts
+        content = ' '.join(part.get("text") or "" for part in content if isinstance(part, dict))
+    parts = [str(content)] if content else []
+    for tool_call in message.get("tool_calls") or []:
+        function = (tool_call.get("function") or {}) if isinstance(tool_call, dict) else {}
+        parts.append(f"{function.get('name')} {function.get('arguments')}")
+    return f"[{message.get('role')}]: {' '.join(parts)}"
+
+class MemoryArchive:
+    """
+    Searchable archive of the messages evicted from memory, by the cosine similarity of the embeddings.
+    The evicted messages are archived by turns (a user message and the following messages), queued and embedded
+    in a batch on the next search (or `index`), so eviction stays O(1).
+    - embed: embed a batch of texts, e.g. by an embedding model. Local feature hashing if None.
+    """
+    def __init__(self, embed:Optional[EmbedFunction] = None, options:Optional[VectorIndexOptions] = None) -> None:
+        self.embed = embed or hashing_embed
+        self.options = options
+        self.entries:List[List[MessageType]] = [] # the turns, by the ids of the index
+        self._pending:List[List[MessageType]] = []
+        self._turn:List[MessageType] = [] # the turn being evicted
+        self._index:Optional[VectorIndex] = None
+        self._lock:Optional[asyncio.Lock] = None
+
+    def __len__(self)->int:
+        return len(self.entries) + len(self._pending) + (1 if self._turn else 0)
+
+    def add(self, messages:List[MessageType])->None:
+        if messages and messages[0].get("role") == "user" and self._turn:
+            self._pending.append(self._turn)
+            self._turn = []
+        self._turn.extend(messages)
+
+    async def index(self)->None:
+        """Embed and index the queued groups."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._turn:
+                self._pending.append(self._turn)
+                self._turn = []
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                vectors = await self.embed(['\n'.join(message_to_text(message) for message in messages) for messages in pending])
+            except BaseException:
+                self._pending = pending + self._pending # retry on the next search
+                raise
+            if self._index is None:
+                self._index = VectorIndex(len(vectors[0]), self.options)
+            self._index.add(vectors)
+            self.entries.extend(pending)
+
+    async def search(self, term:str, top_k:int = 5)->List[List[MessageType]]:
+        """Return the groups of messages most relevant to the term, in the order of the conversation."""
+        await self.index()
+        if self._index is None or not term:
+            return []
+        query = (await self.embed([term]))[0]
+        ids = sorted(id for id, score in self._index.search(query, top_k) if score > 0)
+        return [self.entries[id] for id in ids]
+
+class Memory:
+    """
+    Implements a In-cahe memory for agents.
+    - max_tokens: the budget of the estimated tokens of the messages, unlimited if None or 0
+    - max_messages: the max number of messages, unlimited if 0. If None, MAX_IN_MEMORY_MESSAGES without `max_tokens`, unlimited with it
+    - store, session_id: persist the messages to the session in the store, and `load` the tail of the session
+    - archive: index the evicted messages for `search_context`
+    - compactor: summarize the older turns in background when the history approaches the budget, the summary is the first message
+    The latest group of messages is always kept, even if it exceeds the budget alone.
+    """
+    def __init__(self,
+                 messages:Optional[List[MessageType]] = None,
+                 max_tokens:Optional[int] = None,
+                 max_messages:Optional[int] = None,
+                 store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 archive:Optional[MemoryArchive] = None,
+                 compactor:Optional["Compactor"] = None) -> None:
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages if max_messages is not None else (None if max_tokens else MAX_IN_MEMORY_MESSAGES)
+        self.store = store if session_id else None
+        self.session_id = session_id
+        self._loaded = self.store is None
+        self.archive = archive
+        self._groups:Deque[_MessageGroup] = deque()
+        self._count = 0 # messages
+        self._tokens = 0 # estimated tokens of the messages
+        self._snapshot:Optional[Tuple[MessageType, ...]] = None # the messages until the next change
+        self.evicted = 0 # messages evicted
+        self.compactor = compactor
+        self.compaction_task:Optional[asyncio.Task] = None # the compaction in progress
+        self.summary:Optional[MessageType] = None # the summary of the compacted turns
+        self._summary_tokens = 0
+        self._offset = 0 # the messages of the session before the messages in memory (evicted, compacted or not loaded)
+        for message in messages or []:
+            self.add(message)
+
+    @property
+    def tokens(self)->int:
+        return self._tokens
+
+    def __len__(self)->int:
+        return self._count
+
+    def add(self, message: MessageType) -> None:
+        """
+        Add a new message to memory, and evict the oldest groups of messages beyond the budget.
+        """
+        tokens = self._add(message)
+        if self.store is not None:
+            self.store.append(self.session_id, message, tokens) # written behind by the store
+        self._evict()
+        if self.compactor is not None:
+            self.compactor.schedule(self) # in background, not awaited
+
+    def _add(self, message: MessageType) -> int:
+        if message.get("role") == "tool" and self._groups and self._groups[-1].is_tool_call():
+            group = self._groups[-1] # the result of the tool call
+        else:
+            group = _MessageGroup()
+            self._groups.append(group)
+        tokens = estimate_message_tokens(message)
+        group.messages.append(message)
+        group.tokens += tokens
+        self._count += 1
+        self._tokens += tokens
+        self._snapshot = None
+        return tokens
+
+    async def load(self) -> None:
+        """
+        Load the tail of the session from the store once, the messages added in process are the end of the tail.
+        The saved summary is loaded with the messages after it.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        tail = await self.store.load(self.session_id, self.max_messages, self.max_tokens)
+        saved = await self.store.load_summary(self.session_id)
+        self.clear()
+        self._offset = await self.store.count(self.session_id) - len(tail)
+        if saved is not None:
+            summary, covered = saved
+            skip = max(0, covered - self._offset) # the messages of the tail covered by the summary
+            while skip < len(tail) and tail[skip].get("role") == "tool": # whose tool call is covered
+                skip += 1
+            tail = tail[skip:]
+            self._offset += skip
+            self._set_summary(summary)
+        for message in tail:
+            self._add(message)
+        self._evict()
+
+    def _is_over_budget(self)->bool:
+        return bool((self.max_tokens and self._tokens > self.max_tokens) or
+                    (self.max_messages and self._count > self.max_messages))
+
+    def _pop_group(self)->_MessageGroup:
+        group = self._groups.popleft()
+        self._offset += len(group.messages)
+        self._count -= len(group.messages)
+        self._tokens -= group.tokens
+        self._snapshot = None
+        return group
+
+    def _evict(self)->None:
+        while len(self._groups) > 1 and self._is_over_budget():
+            group = self._pop_group()
+            self.evicted += len(group.messages)
+            if self.archive is not None:
+                self.archive.add(group.messages)
+
+    def clear(self)->None:
+        self._groups.clear()
+        self._count = 0
+        self._tokens = self._summary_tokens
+        self._snapshot = None
+
+    # Compaction of the older turns into the summary
+    def get_compactable_messages(self, keep_tokens:int)->List[MessageType]:
+        """Return the messages of the older groups to compact, keeping the latest groups within `keep_tokens` verbatim."""
+        kept = 0
+        keep = 0 # the latest groups kept
+        for group in reversed(self._groups):
+            if keep and kept + group.tokens > keep_tokens:
+                break
+            kept += group.tokens
+            keep += 1
+        groups = list(self._groups)
+        cut = len(groups) - keep
+        while cut > 0 and groups[cut].messages[0].get("role") != "user": # keep the turn whole, from the user message
+            cut -= 1
+        return [message for group in groups[:cut] for message in group.messages]
+
+    def compact(self, messages:List[MessageType], summary:str)->Tuple[int, int]:
+        """
+        Replace the leading groups of the messages by the summary (which covers the previous summary),
+        return the (messages, estimated tokens) compacted. The groups evicted meanwhile are skipped.
+        """
+        compacted = {id(message) for message in messages}
+        count, tokens = 0, self._summary_tokens
+        while len(self._groups) > 1 and all(id(message) in compacted for message in self._groups[0].messages):
+            group = self._pop_group()
+            count += len(group.messages)
+            tokens += group.tokens
+            if self.archive is not None: # the compacted turns are still searchable
+                self.archive.add(group.messages)
+        if not count:
+            return 0, 0
+        self._set_summary({"role":"user", "content":summary})
+        return count, tokens
+
+    def _set_summary(self, summary:MessageType)->None:
+        self.summary = summary
+        self._tokens -= self._summary_tokens
+        self._summary_tokens = estimate_message_tokens(summary)
+        self._tokens += self._summary_tokens
+        self._snapshot = None
+
+    async def save_summary(self)->None:
+        """Save the summary to the session in the store, with the number of the messages of the session it covers."""
+        if self.store is not None and self.summary is not None:
+            await self.store.save_summary(self.session_id, self.summary, self._offset)
+
+    def get_messages(self) -> Tuple[MessageType, ...]:
+        """
+        Returns the full conversation context as an immutable snapshot, cached until the next change:
+        (
+            {
+                "role": ...
+                "content":...
+            }
+        )
+        """
+        if self._snapshot is None:
+            self._snapshot = ((self.summary,) if self.summary else ()) + \
+                tuple(message for group in self._groups for message in group.messages)
+        return self._snapshot
+
+    def get_messages_str(self) -> str:
+        """
+        Returns the full conversation context as a formatted string as:
+        '''
+        [user]:%content%,
+        [assistant]:%content%
+        '''
+        """
+        return "\n".join([f"[{msg['role']}]: {msg.get('content')}" for msg in self.get_messages()])
+
+    # Search context from the archive of the evicted messages
+    async def search_context(self, term:str, top_k:Optional[int]=5)->List[MessageType]:
+        """Return the messages of the `top_k` archived turns most relevant to the term, in the order of the conversation."""
+        if self.archive is None:
+            return []
+        return [message for messages in await self.archive.search(term, top_k) for message in messages]
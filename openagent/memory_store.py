@@ -0,0 +1,279 @@
+"""
+Persistent store of the conversation history of agents, so a session survives process restarts and moves between workers.
+- Append-only per session: the messages added to the memory of an agent are appended to its session.
+- Write-behind: appends are queued in process and written in batches by a background thread,
+  so the persistence is never on the path of the LLM calls. `flush` waits until the queued messages are written.
+- Lazy hydration: the memory of a resumed session loads only the tail window (the budget of the memory) on the first run.
+- Summary: the running summary of the compacted turns (if compacted) is saved with the number of messages it covers,
+  and loaded with the tail.
+Usage:
+store = SQLiteMemoryStore("sessions.db")
+agent = AssistantAgent(llm_client=client, memory_store=store, session_id="user-42")
+"""
+import json, sqlite3, threading, time
+from abc import ABC, abstractmethod
+from typing import Optional, List, Dict, Tuple
+from pydantic import BaseModel
+from .chatclient import MessageType
+from .utils.tokens import estimate_message_tokens
+from .utils.multitask import run_in_thread_pool
+from .utils.logger import get_global_logger
+
+class MemoryStoreStats(BaseModel):
+    appended: Optional[int] = 0 # messages queued
+    written: Optional[int] = 0 # messages written to the store
+    batches: Optional[int] = 0 # write transactions
+    pending: Optional[int] = 0 # messages queued, not written yet
+    dropped: Optional[int] = 0 # messages failed to write
+    hydrated_sessions: Optional[int] = 0
+    hydrated_messages: Optional[int] = 0
+
+def select_tail(rows:List[Tuple[MessageType, int]], max_messages:Optional[int], max_tokens:Optional[int])->List[MessageType]:
+    """
+    Return the latest messages within the budget, from the rows of (message, tokens) in the order of the conversation.
+    The window doesn't start with tool results, as their tool call is out of the window.
+    """
+    tail:List[MessageType] = []
+    tokens = 0
+    for message, message_tokens in reversed(rows):
+        if (max_messages and len(tail) >= max_messages) or (max_tokens and tail and tokens + message_tokens > max_tokens):
+            break
+        tail.append(message)
+        tokens += message_tokens
+    tail.reverse()
+    while tail and tail[0].get("role") == "tool":
+        tail.pop(0)
+    return tail
+
+class BaseMemoryStore(ABC):
+    """
+    Base class of memory store. Subclass implements the storage by `_write` (a batch of appends, in the writer thread)
+    and `_load` (the tail of a session).
+    """
+    def __init__(self, batch_size:Optional[int] = 256, flush_interval:Optional[float] = 0.05) -> None:
+        self.batch_size = batch_size # messages written in one transaction at most
+        self.flush_interval = flush_interval # seconds to wait for more appends before writing
+        self.stats = MemoryStoreStats()
+        self._queue:List[Tuple[str, MessageType, int, float]] = [] # (session_id, message, tokens, created_at)
+        self._condition = threading.Condition()
+        self._writing = 0 # messages taken by the writer, not written yet
+        self._closed = False
+        self._writer:Optional[threading.Thread] = None
+
+    @abstractmethod
+    def _write(self, rows:List[Tuple[str, str, int, float]]) -> None:
+        pass
+
+    @abstractmethod
+    def _load(self, session_id:str, max_messages:Optional[int], max_tokens:Optional[int]) -> List[MessageType]:
+        pass
+
+    @abstractmethod
+    def _delete(self, session_id:str) -> None:
+        pass
+
+    @abstractmethod
+    def _count(self, session_id:str) -> int:
+        pass
+
+    @abstractmethod
+    def _save_summary(self, session_id:str, summary:str, covered:int) -> None:
+        pass
+
+    @abstractmethod
+    def _load_summary(self, session_id:str) -> Optional[Tuple[str, int]]:
+        pass
+
+    def append(self, session_id:str, message:MessageType, tokens:Optional[int] = None) -> None:
+        """Queue the message to append to the session, non-blocking. The message is serialized by the writer."""
+        row = (session_id, message, estimate_message_tokens(message) if tokens is None else tokens, time.time())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("memory store is closed")
+            if self._writer is None: # start the writer on first use
+                self._writer = threading.Thread(target=self._write_loop, name=f"{type(self).__name__}-writer", daemon=True)
+                self._writer.start()
+            self._queue.append(row)
+            self.stats.appended += 1
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue and self._closed:
+                    return
+                if len(self._queue) < self.batch_size and not self._closed: # wait for more appends to batch
+                    self._condition.wait(self.flush_interval)
+                rows = self._queue[:self.batch_size]
+                del self._queue[:self.batch_size]
+                self._writing = len(rows)
+            try:
+                self._write([(session_id, json.dumps(message, ensure_ascii=False, default=str), tokens, created_at)
+                             for session_id, message, tokens, created_at in rows])
+                written, dropped = len(rows), 0
+            except Exception as e:
+                written, dropped = 0, len(rows)
+                get_global_logger().error(f"failed to write {len(rows)} messages to memory store: {str(e)}")
+            with self._condition:
+                self._writing = 0
+                self.stats.batches += 1
+                self.stats.written += written
+                self.stats.dropped += dropped
+                self._condition.notify_all()
+
+    def _flush(self, timeout:Optional[float] = None) -> bool:
+        with self._condition:
+            self._condition.notify_all() # write the queued messages without waiting for more
+            return self._condition.wait_for(lambda: not self._queue and not self._writing, timeout)
+
+    async def flush(self, timeout:Optional[float] = None) -> bool:
+        """Wait until the queued messages are written, return False on timeout."""
+        return await run_in_thread_pool(self._flush, timeout)
+
+    async def load(self, session_id:str, max_messages:Optional[int] = None, max_tokens:Optional[int] = None) -> List[MessageType]:
+        """Return the tail of the session within the budget, including the messages queued but not written yet."""
+        await self.flush()
+        messages = await run_in_thread_pool(self._load, session_id, max_messages, max_tokens)
+        with self._condition:
+            self.stats.hydrated_sessions += 1
+            self.stats.hydrated_messages += len(messages)
+        return messages
+
+    async def count(self, session_id:str) -> int:
+        """Return the number of messages of the session, including the messages queued."""
+        await self.flush()
+        return await run_in_thread_pool(self._count, session_id)
+
+    async def save_summary(self, session_id:str, summary:MessageType, covered:int) -> None:
+        """Save the summary of the session, which covers the first `covered` messages of the session."""
+        await run_in_thread_pool(self._save_summary, session_id, json.dumps(summary, ensure_ascii=False, default=str), covered)
+
+    async def load_summary(self, session_id:str) -> Optional[Tuple[MessageType, int]]:
+        """Return the (summary, covered messages) of the session, None if the session is not compacted."""
+        saved = await run_in_thread_pool(self._load_summary, session_id)
+        return (json.loads(saved[0]), saved[1]) if saved else None
+
+    async def delete(self, session_id:str) -> None:
+        await self.flush()
+        await run_in_thread_pool(self._delete, session_id)
+
+    def get_stats(self) -> MemoryStoreStats:
+        with self._condition:
+            stats = self.stats.model_copy()
+            stats.pending = len(self._queue) + self._writing
+        return stats
+
+    def close(self) -> None:
+        """Write the queued messages and stop the writer."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+
+class InMemoryMemoryStore(BaseMemoryStore):
+    """In-process memory store, e.g. for tests. The sessions don't survive process restarts."""
+    def __init__(self, batch_size:Optional[int] = 256, flush_interval:Optional[float] = 0.05) -> None:
+        super().__init__(batch_size = batch_size, flush_interval = flush_interval)
+        self._lock = threading.Lock()
+        self._sessions:Dict[str, List[Tuple[str, int]]] = {}
+        self._summaries:Dict[str, Tuple[str, int]] = {}
+
+    def _write(self, rows:List[Tuple[str, str, int, float]]) -> None:
+        with self._lock:
+            for session_id, message, tokens, _ in rows:
+                self._sessions.setdefault(session_id, []).append((message, tokens))
+
+    def _load(self, session_id:str, max_messages:Optional[int], max_tokens:Optional[int]) -> List[MessageType]:
+        with self._lock:
+            rows = list(self._sessions.get(session_id) or [])
+        return select_tail([(json.loads(message), tokens) for message, tokens in rows], max_messages, max_tokens)
+
+    def _delete(self, session_id:str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._summaries.pop(session_id, None)
+
+    def _count(self, session_id:str) -> int:
+        with self._lock:
+            return len(self._sessions.get(session_id) or [])
+
+    def _save_summary(self, session_id:str, summary:str, covered:int) -> None:
+        with self._lock:
+            self._summaries[session_id] = (summary, covered)
+
+    def _load_summary(self, session_id:str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            return self._summaries.get(session_id)
+
+LOAD_PAGE_SIZE = 64 # rows read at a time when loading the tail by the token budget
+class SQLiteMemoryStore(BaseMemoryStore):
+    """Memory store in a SQLite database (WAL mode), one append-only table of the messages of all sessions."""
+    def __init__(self, path:Optional[str] = "openagent_memory.db", batch_size:Optional[int] = 256, flush_interval:Optional[float] = 0.05) -> None:
+        super().__init__(batch_size = batch_size, flush_interval = flush_interval)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL") # readers don't block the writer
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS memory_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, message TEXT NOT NULL, tokens INTEGER, created_at REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS memory_messages_session ON memory_messages(session_id, id)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS memory_summaries (session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, covered INTEGER NOT NULL, updated_at REAL)")
+            self._conn.commit()
+
+    def _write(self, rows:List[Tuple[str, str, int, float]]) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT INTO memory_messages (session_id, message, tokens, created_at) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def _load(self, session_id:str, max_messages:Optional[int], max_tokens:Optional[int]) -> List[MessageType]:
+        # read the tail backwards by pages until the budget is filled
+        rows:List[Tuple[str, int]] = []
+        tokens = 0
+        last_id = None
+        with self._lock:
+            while True:
+                limit = min(max_messages - len(rows), LOAD_PAGE_SIZE) if max_messages else LOAD_PAGE_SIZE
+                if limit <= 0:
+                    break
+                page = self._conn.execute("SELECT id, message, tokens FROM memory_messages WHERE session_id=? AND id<? ORDER BY id DESC LIMIT ?",
+                                          (session_id, last_id if last_id is not None else 2**63 - 1, limit)).fetchall()
+                for _, message, message_tokens in page:
+                    rows.append((message, message_tokens or 0))
+                    tokens += message_tokens or 0
+                if len(page) < limit or (max_tokens and tokens > max_tokens):
+                    break
+                last_id = page[-1][0]
+        rows.reverse()
+        return select_tail([(json.loads(message), message_tokens) for message, message_tokens in rows], max_messages, max_tokens)
+
+    def _delete(self, session_id:str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM memory_messages WHERE session_id=?", (session_id,))
+            self._conn.execute("DELETE FROM memory_summaries WHERE session_id=?", (session_id,))
+            self._conn.commit()
+
+    def _count(self, session_id:str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memory_messages WHERE session_id=?", (session_id,)).fetchone()[0]
+
+    def _save_summary(self, session_id:str, summary:str, covered:int) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO memory_summaries (session_id, summary, covered, updated_at) VALUES (?, ?, ?, ?)",
+                               (session_id, summary, covered, time.time()))
+            self._conn.commit()
+
+    def _load_summary(self, session_id:str) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            row = self._conn.execute("SELECT summary, covered FROM memory_summaries WHERE session_id=?", (session_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._conn.close()
@@ -7,8 +7,12 @@ from .base_agent import (
     AgentStream, 
     AgentResponse, 
     Chunk,
-    prompt_to_message
+    prompt_to_message,
+    OPENAGENT_MEMORY_MAX_TOKENS
     ) 
+from .compaction import Compactor
+from .tool_router import EmbedFunction
+from .memory_store import BaseMemoryStore
 
 # ParallelWorkflow execute sub agents in pararrel and provided aggregated answer
 # ParallelWorkflow itself is a agent
@@ -20,12 +24,24 @@ class ParallelWorkflow(BaseAgent):
                  name:Optional[str] = "ParallelWorkflowAgent",
                  description:Optional[str] = "Execute sub-agent in parallel",
                  agents:Optional[List[BaseAgent]] = None, # a list of sub agents
+                 memory_max_tokens:Optional[int] = OPENAGENT_MEMORY_MAX_TOKENS, # the conversation history of the workflow
+                 memory_recall:Optional[int] = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 memory_compactor:Optional[Compactor] = None,
                  logger = None,
                  verbose:Optional[bool] = False) -> None:
         super().__init__(llm_client = None,
                          name = name,
                          description = description,
                          instructions = None, # no instructions needed for worflow
+                         memory_max_tokens = memory_max_tokens,
+                         memory_recall = memory_recall,
+                         memory_embed = memory_embed,
+                         memory_store = memory_store,
+                         session_id = session_id,
+                         memory_compactor = memory_compactor,
                          logger = logger,
                          verbose = verbose)
         self.agents = agents or []
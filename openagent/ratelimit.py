@@ -0,0 +1,188 @@
+"""
+Client-side rate limiting of LLM endpoints.
+- Token buckets for requests/min and tokens/min quota of a deployment.
+- AIMD adaptive concurrency: shrink the in-flight requests on 429 (multiplicative decrease), grow on success (additive increase).
+One RateLimiter is shared by all chat clients targeting the same deployment (end_point, model).
+"""
+import asyncio, threading, time
+from collections import deque
+from typing import Optional, Dict, Tuple, List
+from pydantic import BaseModel
+
+class RateLimitOptions(BaseModel):
+    requests_per_minute: Optional[float] = None # quota of requests per minute, no limit if None
+    tokens_per_minute: Optional[float] = None # quota of tokens per minute, no limit if None
+    max_concurrency: Optional[int] = 64 # upper bound of in-flight requests
+    min_concurrency: Optional[int] = 1 # lower bound of in-flight requests
+    initial_concurrency: Optional[int] = None # start with max_concurrency if None
+    decrease_factor: Optional[float] = 0.5 # multiply concurrency limit by the factor on 429
+    decrease_interval: Optional[float] = 1.0 # seconds, decrease at most once per interval for a burst of 429s
+
+class RateLimitStats(BaseModel):
+    end_point: Optional[str] = None
+    model: Optional[str] = None
+    requests: Optional[int] = 0 # requests sent
+    rate_limited: Optional[int] = 0 # requests rejected by endpoint with 429
+    throttled: Optional[int] = 0 # requests delayed by the client-side limiter
+    wait_seconds: Optional[float] = 0.0 # total delayed time
+    concurrency_limit: Optional[float] = 0 # current adaptive concurrency limit
+    in_flight: Optional[int] = 0 # requests in flight
+
+class TokenBucket:
+    """Token bucket refilled at `rate_per_minute`, holding at most one minute of quota."""
+    def __init__(self, rate_per_minute:float) -> None:
+        self.rate = rate_per_minute/60.0 # per second
+        self.capacity = rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at)*self.rate)
+        self.updated_at = now
+
+    def delay(self, amount:float) -> float:
+        """Take `amount` tokens if available and return 0, otherwise return the seconds to wait."""
+        self._refill()
+        amount = min(amount, self.capacity) # a request larger than the bucket waits for a full bucket
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens)/self.rate
+
+    def consume(self, amount:float) -> None:
+        """Charge tokens without waiting (the balance can be negative), e.g. for the actual usage known after the call."""
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the endpoint reported the quota is exceeded."""
+        self._refill()
+        self.tokens = min(self.tokens, 0)
+
+class AdaptiveConcurrencyLimiter:
+    """Limit in-flight requests with AIMD: +1/limit on each success, *decrease_factor on overload."""
+    def __init__(self, options:RateLimitOptions) -> None:
+        self.options = options
+        self.limit:float = float(options.initial_concurrency or options.max_concurrency)
+        self.in_flight = 0
+        self._waiters:deque[asyncio.Future] = deque()
+        self._decreased_at = 0.0
+
+    async def acquire(self) -> bool:
+        """Wait for a free slot, return True if the request was delayed."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter # the slot is handed over by release
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled(): # the slot was handed over, give it back
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def on_success(self) -> None:
+        self.limit = min(float(self.options.max_concurrency), self.limit + 1.0/max(self.limit, 1.0))
+        self._wake_up()
+
+    def on_overload(self) -> None:
+        now = time.monotonic()
+        if now - self._decreased_at < self.options.decrease_interval: # the same burst of 429s
+            return
+        self._decreased_at = now
+        self.limit = max(float(self.options.min_concurrency), self.limit*self.options.decrease_factor)
+
+class RateLimiter:
+    """Rate limiter of one deployment, combining request/token buckets and adaptive concurrency."""
+    def __init__(self, end_point:str, model:str, options:RateLimitOptions) -> None:
+        self.options = options
+        self.request_bucket = TokenBucket(options.requests_per_minute) if options.requests_per_minute else None
+        self.token_bucket = TokenBucket(options.tokens_per_minute) if options.tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(options)
+        self.stats = RateLimitStats(end_point=end_point, model=model)
+
+    async def acquire(self, tokens:int) -> None:
+        """Wait until the request with estimated `tokens` is allowed. Must be paired with `release`."""
+        started_at = time.monotonic()
+        throttled = await self.concurrency.acquire()
+        try:
+            while True:
+                delay = self.request_bucket.delay(1) if self.request_bucket else 0.0
+                if delay == 0.0 and self.token_bucket:
+                    delay = self.token_bucket.delay(tokens)
+                    if delay > 0 and self.request_bucket: # give back the request quota taken above
+                        self.request_bucket.consume(-1)
+                if delay == 0.0:
+                    break
+                throttled = True
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.concurrency.release()
+            raise
+        self.stats.requests += 1
+        if throttled:
+            self.stats.throttled += 1
+            self.stats.wait_seconds += time.monotonic() - started_at
+
+    def release(self, success:bool|None = True, rate_limited:bool|None = False, extra_tokens:int|None = 0) -> None:
+        """
+        Release the in-flight slot and adjust the concurrency.
+        - extra_tokens: the actual usage beyond the estimation, charged to the token bucket
+        """
+        self.concurrency.release()
+        if rate_limited:
+            self.stats.rate_limited += 1
+            self.concurrency.on_overload()
+            if self.token_bucket:
+                self.token_bucket.drain()
+        elif success:
+            self.concurrency.on_success()
+        if extra_tokens and self.token_bucket:
+            self.token_bucket.consume(extra_tokens)
+
+    def get_stats(self) -> RateLimitStats:
+        self.stats.concurrency_limit = round(self.concurrency.limit, 2)
+        self.stats.in_flight = self.concurrency.in_flight
+        return self.stats.model_copy()
+
+class RateLimiterRegistry:
+    """Hands out one RateLimiter per deployment (end_point, model), the options of the first client win."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._limiters:Dict[Tuple[str, str], RateLimiter] = {}
+
+    def get(self, end_point:str, model:str, options:RateLimitOptions) -> RateLimiter:
+        key = (end_point or "", model or "")
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = RateLimiter(end_point, model, options)
+            return limiter
+
+    def get_stats(self) -> List[RateLimitStats]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.get_stats() for limiter in limiters]
+
+# the process-wide registry
+rate_limiter_registry = RateLimiterRegistry()
+
+def get_rate_limit_stats() -> List[RateLimitStats]:
+    return rate_limiter_registry.get_stats()
@@ -1,5 +1,5 @@
 from .utils import env
-import json
+import asyncio, json
 from typing import Optional, override
 from pydantic import BaseModel, ValidationError
 from datetime import datetime
@@ -9,6 +9,9 @@ from .base_agent import (
     FunctionTool,
     AgentContext,
     MAX_STEPS,
+    OPENAGENT_STABLE_PROMPT,
+    OPENAGENT_MAX_TOOL_RESULT_TOKENS,
+    OPENAGENT_MEMORY_MAX_TOKENS,
     BaseChatClient,
     Prompt,
     OpenAIChatClient,
@@ -19,6 +22,10 @@ from .base_agent import (
 )
 
 from .exceptions import *
+from .tools import ToolProgress, iter_tool_progress
+from .tool_router import ToolRouter, EmbedFunction
+from .memory_store import BaseMemoryStore
+from .compaction import Compactor
 from .utils import format_template_with_json
 from .mcp import *
 
@@ -130,6 +137,15 @@ class ReactAgent(BaseAgent):
                  tools: list[FunctionTool]|None = [],
                  mcps: Optional[list[MCPClient]] = [],
                  max_steps:int|None=MAX_STEPS,
+                 stable_prompt:bool|None=OPENAGENT_STABLE_PROMPT,
+                 max_tool_result_tokens:int|None=OPENAGENT_MAX_TOOL_RESULT_TOKENS,
+                 memory_max_tokens:int|None=OPENAGENT_MEMORY_MAX_TOKENS,
+                 memory_recall:int|None = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:str|None = None,
+                 memory_compactor:Optional[Compactor] = None,
+                 tool_router:Optional[ToolRouter] = None,
                  logger = None,
                  verbose:bool|None=False) -> None:
         llm_client = llm_client.clone(with_tools=False) if llm_client else OpenAIChatClient(verbose=verbose)
@@ -140,6 +156,15 @@ class ReactAgent(BaseAgent):
                          tools = tools,
                          mcps = mcps,
                          max_steps = max_steps,
+                         stable_prompt = stable_prompt,
+                         max_tool_result_tokens = max_tool_result_tokens,
+                         memory_max_tokens = memory_max_tokens,
+                         memory_recall = memory_recall,
+                         memory_embed = memory_embed,
+                         memory_store = memory_store,
+                         session_id = session_id,
+                         memory_compactor = memory_compactor,
+                         tool_router = tool_router,
                          logger = logger,
                          verbose = verbose)
     
@@ -150,10 +175,10 @@ class ReactAgent(BaseAgent):
         prompt = str(SYSTEM_PROMPT_TEMPLATE.replace("{{instructions}}", self.instructions))
         variables = {
             "agent_name" : self.name or '',
-            "time_now": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "time_now": self.get_time_now(),
             "tools": self.get_tool_list_str(),
         }
-        return format_template_with_json(prompt, variables)
+        return self.format_system_prompt(prompt, variables)
     
     
     # override abstract method from BaseAgent
@@ -184,7 +209,7 @@ class ReactAgent(BaseAgent):
 
             self.log(f"iteration #{i+1}", logging.DEBUG)
             #user_prompt = "Agent:"
-            messages = self.memory.get_messages()
+            messages = self.get_messages()
             response = await self.call_llm(
                 messages = messages, # send all messages as a list
                 system =self.system_prompt,
@@ -207,7 +232,15 @@ class ReactAgent(BaseAgent):
                 tool_name = react_response.action["name"] or {}
                 tool_args = react_response.action.get("arguments") or {}
                 yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**take action**: {tool_name}, arguments: {tool_args}\n'))
-                call_result  = await self.call_function(tool_name, tool_args, context=context)
+                # relay the progress of streaming tool as steps while the tool runs
+                progress_queue:asyncio.Queue[ToolProgress] = asyncio.Queue()
+                call = asyncio.ensure_future(self.call_function(tool_name, tool_args, context=context, on_progress=progress_queue.put_nowait))
+                try:
+                    async for progress in iter_tool_progress([call], progress_queue):
+                        yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**progress**: {progress.text}\n'))
+                    call_result = await call
+                finally:
+                    call.cancel() # no-op if done, cancel the call if the stream is closed
                 react_response.observation = str(call_result)
                 yield(Chunk(type=Chunk.Type.Step, done=False, text = f'**observation**:\n{react_response.observation}\n'))
                 self.add_agent_message(json.dumps({"observation" : react_response.observation}, ensure_ascii=False))
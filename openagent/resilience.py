@@ -0,0 +1,223 @@
+"""
+Retry policy and circuit breaker for calls to LLM endpoints (or any other async calls such as tools).
+- RetryPolicy: exponential backoff with jitter, honoring `Retry-After` of the endpoint.
+- CircuitBreaker: fail fast when an endpoint is down instead of waiting out a timeout in every agent step.
+Errors are classified by ErrorCode, so the policy and agents use the same vocabulary to decide between retry and rejection.
+"""
+import asyncio, random, threading, time
+from email.utils import parsedate_to_datetime
+from enum import Enum
+from typing import Optional, Dict, List, Callable, Awaitable, TypeVar
+from pydantic import BaseModel
+from openai import APIConnectionError, APIStatusError, BadRequestError, RateLimitError, OpenAIError
+from .exceptions import ErrorCode, AgentException, CircuitOpenError
+
+# convert exception to ErrorCode of agents sdk
+def error_code_from_exception(e:BaseException)->ErrorCode:
+    if isinstance(e, AgentException):
+        return e.error_code
+    if isinstance(e, (APIConnectionError, RateLimitError)):
+        return ErrorCode.LlmAccessError
+    if isinstance(e, BadRequestError):
+        return ErrorCode.InvalidInput
+    if isinstance(e, OpenAIError):
+        return ErrorCode.LlmAccessError
+    return ErrorCode.Unknown
+
+# whether the error is transient, i.e., the same request may succeed later
+def is_transient_error(e:BaseException)->bool:
+    if isinstance(e, CircuitOpenError): # fail fast, don't retry
+        return False
+    if isinstance(e, (APIConnectionError, RateLimitError)): # including timeout
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code in (408, 409) or e.status_code >= 500
+    return False
+
+# whether the endpoint failed to serve (counted by circuit breaker). 429 means the endpoint is up but busy.
+def is_endpoint_failure(e:BaseException)->bool:
+    return is_transient_error(e) and not isinstance(e, RateLimitError)
+
+# seconds to wait suggested by the endpoint in `retry-after-ms` or `retry-after` header
+def get_retry_after(e:BaseException)->Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms)/1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError: # http date
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy(BaseModel):
+    max_retries: Optional[int] = 3 # retries after the first attempt
+    initial_delay: Optional[float] = 0.5 # seconds before the first retry
+    max_delay: Optional[float] = 20.0 # upper bound of backoff delay
+    multiplier: Optional[float] = 2.0 # exponential backoff factor
+    jitter: Optional[float] = 1.0 # randomize [delay*(1-jitter), delay], 1.0 means full jitter
+    respect_retry_after: Optional[bool] = True # wait as long as `Retry-After` of the endpoint
+    max_retry_after: Optional[float] = 60.0 # give up if the endpoint asks to wait longer
+    retry_on: Optional[List[ErrorCode]] = [ErrorCode.LlmAccessError] # retry transient errors of these codes
+
+    def get_delay(self, e:BaseException, attempt:int)->Optional[float]:
+        """Return seconds to wait before retry `attempt` (0-based), or None if the error should not be retried."""
+        if attempt >= self.max_retries:
+            return None
+        if not is_transient_error(e) or error_code_from_exception(e) not in self.retry_on:
+            return None
+        delay = min(self.max_delay, self.initial_delay*(self.multiplier**attempt))
+        delay = delay*(1 - self.jitter*random.random())
+        retry_after = get_retry_after(e) if self.respect_retry_after else None
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+class CircuitState(Enum):
+    Closed = "closed" # requests go through
+    Open = "open" # requests fail fast
+    HalfOpen = "half_open" # limited probe requests go through to test recovery
+
+class CircuitBreakerOptions(BaseModel):
+    failure_threshold: Optional[int] = 5 # consecutive failures to open the circuit
+    recovery_timeout: Optional[float] = 30.0 # seconds in open state before probing
+    half_open_max_calls: Optional[int] = 1 # concurrent probe requests in half open state
+
+class ResilienceStats(BaseModel):
+    end_point: Optional[str] = None
+    state: Optional[str] = CircuitState.Closed.value
+    calls: Optional[int] = 0 # attempts sent to the endpoint
+    failures: Optional[int] = 0 # endpoint failures (connection, timeout, 5xx)
+    consecutive_failures: Optional[int] = 0
+    retries: Optional[int] = 0 # retried attempts
+    retries_exhausted: Optional[int] = 0 # calls failed after all retries
+    opened: Optional[int] = 0 # times the circuit opened
+    rejected: Optional[int] = 0 # calls failed fast by open circuit
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker. Without options it never opens, but still records the stats of the endpoint.
+    """
+    def __init__(self, end_point:str, options:Optional[CircuitBreakerOptions] = None) -> None:
+        self.options = options
+        self.state = CircuitState.Closed
+        self.stats = ResilienceStats(end_point=end_point)
+        self._opened_at = 0.0
+        self._probes = 0
+
+    def before_call(self)->None:
+        """Raise CircuitOpenError if the call is not allowed."""
+        if self.state == CircuitState.Open:
+            remaining = self._opened_at + self.options.recovery_timeout - time.monotonic()
+            if remaining > 0:
+                self.stats.rejected += 1
+                raise CircuitOpenError(details=f"Circuit breaker is open for endpoint {self.stats.end_point}, retry after {remaining:.1f}s",
+                                       module="llm", retry_after=remaining)
+            self.state = CircuitState.HalfOpen
+            self._probes = 0
+        if self.state == CircuitState.HalfOpen:
+            if self._probes >= self.options.half_open_max_calls:
+                self.stats.rejected += 1
+                raise CircuitOpenError(details=f"Circuit breaker is half open for endpoint {self.stats.end_point}, waiting for probe requests",
+                                       module="llm", retry_after=self.options.recovery_timeout)
+            self._probes += 1
+        self.stats.calls += 1
+
+    def ready_to_probe(self)->bool:
+        """Whether the open circuit has waited out the recovery timeout, so the next call probes the endpoint."""
+        return self.state == CircuitState.Open and time.monotonic() - self._opened_at >= self.options.recovery_timeout
+
+    def on_success(self)->None:
+        self.stats.consecutive_failures = 0
+        if self.state == CircuitState.HalfOpen: # recovered
+            self.state = CircuitState.Closed
+
+    def on_cancel(self)->None:
+        if self.state == CircuitState.HalfOpen: # give back the probe
+            self._probes = max(0, self._probes - 1)
+
+    def on_error(self, e:BaseException)->None:
+        if not is_endpoint_failure(e):
+            if self.state == CircuitState.HalfOpen: # the endpoint responded, it's up
+                self.state = CircuitState.Closed
+            return
+        self.stats.failures += 1
+        self.stats.consecutive_failures += 1
+        if self.options is None:
+            return
+        if self.state == CircuitState.HalfOpen or self.stats.consecutive_failures >= self.options.failure_threshold:
+            self.state = CircuitState.Open
+            self._opened_at = time.monotonic()
+            self.stats.opened += 1
+
+    def get_stats(self)->ResilienceStats:
+        self.stats.state = self.state.value
+        return self.stats.model_copy()
+
+class CircuitBreakerRegistry:
+    """Hands out one CircuitBreaker per endpoint, the options of the first client win."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._breakers:Dict[str, CircuitBreaker] = {}
+
+    def get(self, end_point:str, options:Optional[CircuitBreakerOptions] = None)->CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(end_point or "")
+            if breaker is None:
+                breaker = self._breakers[end_point or ""] = CircuitBreaker(end_point, options)
+            elif breaker.options is None and options is not None:
+                breaker.options = options
+            return breaker
+
+    def get_stats(self)->List[ResilienceStats]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.get_stats() for breaker in breakers]
+
+# the process-wide registry
+circuit_breaker_registry = CircuitBreakerRegistry()
+
+def get_resilience_stats()->List[ResilienceStats]:
+    return circuit_breaker_registry.get_stats()
+
+T = TypeVar("T")
+async def call_with_retry(call:Callable[[], Awaitable[T]],
+                          policy:Optional[RetryPolicy] = None,
+                          breaker:Optional[CircuitBreaker] = None)->T:
+    """Make the call with the retry policy and circuit breaker (both optional)."""
+    attempt = 0
+    while True:
+        if breaker:
+            breaker.before_call()
+        try:
+            result = await call()
+        except Exception as e:
+            if breaker:
+                breaker.on_error(e)
+            delay = policy.get_delay(e, attempt) if policy else None
+            if delay is None:
+                if breaker and policy and attempt > 0:
+                    breaker.stats.retries_exhausted += 1
+                raise
+            attempt += 1
+            if breaker:
+                breaker.stats.retries += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException: # cancelled
+            if breaker:
+                breaker.on_cancel()
+            raise
+        if breaker:
+            breaker.on_success()
+        return result
@@ -1,5 +1,8 @@
 from typing import Optional, override, Any, Dict, List
-from .base_agent import BaseAgent, Prompt, AgentContext, AgentStream, AgentStream, Chunk
+from .base_agent import BaseAgent, Prompt, AgentContext, AgentStream, AgentStream, Chunk, OPENAGENT_MEMORY_MAX_TOKENS
+from .compaction import Compactor
+from .tool_router import EmbedFunction
+from .memory_store import BaseMemoryStore
 
 # SequentailWorkflow execute sub agents sequantially.
 # SequentailWorkflow itself is a agent
@@ -11,12 +14,24 @@ class SequentialWorkflow(BaseAgent):
                  name:Optional[str] = "SequentialWorkflowAgent",
                  description:Optional[str] = "Execute sub-agent sequentially",
                  agents:Optional[List[BaseAgent]] = None, # a list of sub agents
+                 memory_max_tokens:Optional[int] = OPENAGENT_MEMORY_MAX_TOKENS, # the conversation history of the workflow
+                 memory_recall:Optional[int] = 0,
+                 memory_embed:Optional[EmbedFunction] = None,
+                 memory_store:Optional[BaseMemoryStore] = None,
+                 session_id:Optional[str] = None,
+                 memory_compactor:Optional[Compactor] = None,
                  logger = None,
                  verbose:Optional[bool] = False) -> None:
         super().__init__(llm_client = None,
                          name = name,
                          description = description,
                          instructions = None, # no instructions needed for worflow
+                         memory_max_tokens = memory_max_tokens,
+                         memory_recall = memory_recall,
+                         memory_embed = memory_embed,
+                         memory_store = memory_store,
+                         session_id = session_id,
+                         memory_compactor = memory_compactor,
                          logger = logger,
                          verbose = verbose)
         self.agents = agents or []
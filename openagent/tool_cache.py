@@ -0,0 +1,119 @@
+"""
+Cache of tool results, so the repeated identical calls of an agent (e.g. the same web search in several ReAct steps)
+are served without calling the tool again.
+The cache key is the tool name and the canonical json of the arguments. The scopes of the cached results:
+- run: the calls in one run of the agent (the context of the run), the default
+- session: the calls of one agent (the session id) across its runs
+- global: all calls in the process
+"""
+import hashlib, json, threading, weakref
+from enum import Enum
+from typing import Optional, Dict, Any, List, Literal
+from pydantic import BaseModel
+from .utils.cache import TTLCache
+
+ToolCacheScope = Literal["run", "session", "global"]
+
+class ToolCacheOptions(BaseModel):
+    scope: Optional[ToolCacheScope] = "run"
+    ttl: Optional[float] = None # seconds, never expire if None
+    max_size: Optional[int] = 256 # results of the tool kept in the scope, the least recently used are evicted
+
+class ToolCacheStats(BaseModel):
+    tool: Optional[str] = None
+    scope: Optional[str] = None
+    hits: Optional[int] = 0
+    misses: Optional[int] = 0 # called the tool
+    size: Optional[int] = 0 # results cached in session and global scope
+    hit_rate: Optional[float] = 0.0
+
+MISSING = object()
+
+def _json_default(value:Any)->Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+# canonical hash of the tool call, `instance` is the object of a tool bound to an instance
+def make_tool_cache_key(name:str, arguments:Dict[str, Any], instance:Optional[object] = None)->str:
+    canonical = json.dumps([name, id(instance) if instance is not None else None, arguments],
+                           sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ToolCache:
+    """
+    Cached results of one tool. The results of session and global scope are kept by the cache,
+    the results of run scope are kept by the context of the run (`run_results`) and dropped with it.
+    """
+    def __init__(self, name:str, options:ToolCacheOptions) -> None:
+        self.options = options
+        self.stats = ToolCacheStats(tool=name, scope=options.scope)
+        self._lock = threading.Lock()
+        self._results = TTLCache(max_size=options.max_size, ttl=options.ttl)
+
+    def _get_store(self, key:str, run_results:Optional[Dict["ToolCache", TTLCache]], session_id:Optional[str])->tuple[Optional[TTLCache], Any]:
+        if self.options.scope == "global":
+            return self._results, key
+        if self.options.scope == "session" and session_id:
+            return self._results, (session_id, key)
+        if run_results is None: # no run to cache the result in
+            return None, key
+        store = run_results.get(self)
+        if store is None:
+            store = run_results[self] = TTLCache(max_size=self.options.max_size, ttl=self.options.ttl)
+        return store, key
+
+    def get(self, key:str, run_results:Optional[Dict["ToolCache", TTLCache]] = None, session_id:Optional[str] = None)->Any:
+        """Return the cached result, or MISSING."""
+        with self._lock:
+            store, key = self._get_store(key, run_results, session_id)
+            if store is None:
+                return MISSING
+            result = store.get(key, MISSING)
+            if result is MISSING:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            return result
+
+    def set(self, key:str, result:Any, run_results:Optional[Dict["ToolCache", TTLCache]] = None, session_id:Optional[str] = None)->None:
+        with self._lock:
+            store, key = self._get_store(key, run_results, session_id)
+            if store is not None:
+                store.set(key, result)
+
+    def clear(self)->None:
+        with self._lock:
+            self._results.clear()
+
+    def get_stats(self)->ToolCacheStats:
+        with self._lock:
+            stats = self.stats.model_copy()
+            stats.size = len(self._results)
+        calls = stats.hits + stats.misses
+        stats.hit_rate = round(stats.hits/calls, 4) if calls else 0.0
+        return stats
+
+# the caches of the process, for the stats
+_tool_caches:"weakref.WeakSet[ToolCache]" = weakref.WeakSet()
+_tool_caches_lock = threading.Lock()
+
+def make_tool_cache(name:str, options:ToolCacheOptions)->ToolCache:
+    cache = ToolCache(name, options)
+    with _tool_caches_lock:
+        _tool_caches.add(cache)
+    return cache
+
+def get_tool_cache_stats()->List[ToolCacheStats]:
+    with _tool_caches_lock:
+        caches = list(_tool_caches)
+    return [cache.get_stats() for cache in caches]
+
+def clear_tool_caches()->None:
+    """Drop the cached results of session and global scope, e.g. after the data behind the tools changed."""
+    with _tool_caches_lock:
+        caches = list(_tool_caches)
+    for cache in caches:
+        cache.clear()
@@ -0,0 +1,226 @@
+"""
+Routing of large tool catalogs (e.g. several MCP servers): only the tools relevant to the current turn are sent to the LLM,
+in the tool definitions of the request and in the tool list of the system prompt, instead of every tool on every call.
+- Lexical: BM25 over the tool name, description and argument names/descriptions, no dependency.
+- Embedding (optional): cosine similarity of the embeddings of the turn and the tools, blended with the lexical score.
+  The embeddings of the tools are computed once.
+The pinned tools are always sent, and the tools called in the conversation stay available for the follow-up steps.
+Usage:
+router = ToolRouter(ToolRouterOptions(top_k=8, pinned=["calculator"]))
+agent = AssistantAgent(llm_client=client, mcps=[...], tool_router=router)
+"""
+import asyncio, math, re, threading, weakref
+from collections import Counter
+from typing import Optional, List, Dict, Callable, Awaitable, Sequence
+from pydantic import BaseModel
+from .tools import FunctionTool
+from .utils.tokens import estimate_json_tokens
+
+# embed a batch of texts, e.g. by the embeddings API of OpenAI
+EmbedFunction = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+class ToolRouterOptions(BaseModel):
+    top_k: Optional[int] = 8 # relevant tools sent in a turn, besides the pinned tools
+    pinned: Optional[List[str]] = [] # names of the tools always sent
+    min_tools: Optional[int] = None # route only if there are more tools than it, top_k + pinned if None
+    embedding_weight: Optional[float] = 0.5 # weight of the embedding similarity against the lexical score, if embed is set
+    bm25_k1: Optional[float] = 1.2
+    bm25_b: Optional[float] = 0.75
+
+class ToolRouterStats(BaseModel):
+    turns: Optional[int] = 0 # routed turns
+    requests: Optional[int] = 0 # LLM calls of the agent with the routed tools
+    tools_total: Optional[int] = 0 # tools of the catalog, summed over the turns
+    tools_selected: Optional[int] = 0 # tools sent, summed over the turns
+    fallbacks: Optional[int] = 0 # turns sent all tools, as no tool is relevant to the turn
+    prompt_tokens_total: Optional[int] = 0 # estimated tokens of all tool definitions, summed over the requests
+    prompt_tokens_saved: Optional[int] = 0 # estimated tokens of the tool definitions not sent, summed over the requests
+    saved_ratio: Optional[float] = 0.0 # prompt_tokens_saved/prompt_tokens_total
+
+STOP_WORDS = frozenset("a an and are as at be by can do does for from get how i if in into is it me my of on or "
+                       "please should that the their then this to use used what when which with you your".split())
+_CAMEL = re.compile(r'([a-z0-9])([A-Z])')
+_WORD = re.compile(r'[^\W_]+')
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+
+def _stem(word:str)->str:
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+def tokenize(text:Optional[str])->List[str]:
+    """Lowercase stemmed words, split by snake_case and camelCase, and the characters and bigrams of CJK text."""
+    if not text:
+        return []
+    tokens = []
+    for word in _WORD.findall(_CAMEL.sub(r'\1 \2', text)):
+        if _CJK.search(word):
+            for run in _CJK.findall(word):
+                tokens.extend(run)
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            word = _CJK.sub(' ', word)
+            tokens.extend(_stem(w) for w in word.lower().split() if len(w) > 1 and w not in STOP_WORDS)
+        else:
+            word = word.lower()
+            if len(word) > 1 and word not in STOP_WORDS:
+                tokens.append(_stem(word))
+    return tokens
+
+def tool_to_text(tool:FunctionTool)->str:
+    """The text of the tool to index: name, description, argument names and descriptions."""
+    parts = [tool.name, tool.name, tool.description or ""] # the name weighs twice
+    parameters = ((tool.json_schema or {}).get("function") or {}).get("parameters") or {}
+    for name, schema in (parameters.get("properties") or {}).items():
+        parts.append(name)
+        if isinstance(schema, dict) and schema.get("description"):
+            parts.append(str(schema["description"]))
+    return '\n'.join(parts)
+
+class _ToolIndex:
+    """BM25 index of a set of tools, rebuilt when the tools change."""
+    def __init__(self, tools:Sequence[FunctionTool], k1:float, b:float) -> None:
+        self.tools = list(tools)
+        self.k1 = k1
+        self.b = b
+        self.documents = [Counter(tokenize(tool_to_text(tool))) for tool in self.tools]
+        self.lengths = [sum(document.values()) for document in self.documents]
+        self.average_length = (sum(self.lengths)/len(self.lengths)) if self.lengths else 0.0
+        frequencies = Counter(term for document in self.documents for term in document)
+        count = len(self.documents)
+        self.idf = {term: math.log(1 + (count - n + 0.5)/(n + 0.5)) for term, n in frequencies.items()}
+        self.tokens = [estimate_json_tokens(tool.json_schema) for tool in self.tools]
+
+    def score(self, query:str)->List[float]:
+        terms = Counter(tokenize(query))
+        scores = []
+        for document, length in zip(self.documents, self.lengths):
+            score = 0.0
+            for term, query_count in terms.items():
+                frequency = document.get(term)
+                if frequency:
+                    norm = self.k1*(1 - self.b + self.b*length/(self.average_length or 1))
+                    score += self.idf[term]*frequency*(self.k1 + 1)/(frequency + norm)*query_count
+            scores.append(score)
+        return scores
+
+def _cosine(a:List[float], b:List[float])->float:
+    dot = sum(x*y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x*x for x in a))*math.sqrt(sum(y*y for y in b))
+    return dot/norm if norm else 0.0
+
+def _normalize(scores:List[float])->List[float]:
+    top = max(scores, default=0.0)
+    return [score/top for score in scores] if top > 0 else [0.0 for _ in scores]
+
+# the routers of the process, for the stats
+_tool_routers:"weakref.WeakSet[ToolRouter]" = weakref.WeakSet()
+_tool_routers_lock = threading.Lock()
+
+class ToolRouter:
+    """Select the tools relevant to a turn. A router can be shared by agents with the same or different tools."""
+    def __init__(self, options:Optional[ToolRouterOptions] = None, embed:Optional[EmbedFunction] = None) -> None:
+        self.options = options or ToolRouterOptions()
+        self.embed = embed
+        self.stats = ToolRouterStats()
+        self._lock = threading.Lock()
+        self._index:Optional[_ToolIndex] = None
+        self._index_key:Optional[tuple] = None
+        self._embeddings:Dict[str, List[float]] = {} # text of tool -> embedding
+        self._embed_lock:Optional[asyncio.Lock] = None
+        with _tool_routers_lock:
+            _tool_routers.add(self)
+
+    def _get_index(self, tools:Sequence[FunctionTool])->_ToolIndex:
+        key = tuple(id(tool) for tool in tools)
+        with self._lock:
+            if self._index is None or self._index_key != key:
+                self._index = _ToolIndex(tools, self.options.bm25_k1, self.options.bm25_b)
+                self._index_key = key
+            return self._index
+
+    def is_routed(self, tools:Sequence[FunctionTool])->bool:
+        min_tools = self.options.min_tools
+        if min_tools is None:
+            min_tools = self.options.top_k + len(self.options.pinned or [])
+        return len(tools) > min_tools
+
+    async def _embed_scores(self, query:str, tools:Sequence[FunctionTool])->Optional[List[float]]:
+        if self.embed is None or not query:
+            return None
+        if self._embed_lock is None:
+            self._embed_lock = asyncio.Lock()
+        texts = [tool_to_text(tool) for tool in tools]
+        async with self._embed_lock: # embed the new tools once
+            missing = list(dict.fromkeys(text for text in texts if text not in self._embeddings))
+            if missing:
+                self._embeddings.update(zip(missing, await self.embed(missing)))
+        query_embedding = (await self.embed([query]))[0]
+        return [max(_cosine(query_embedding, self._embeddings[text]), 0.0) for text in texts]
+
+    def rank(self, query:str, tools:Sequence[FunctionTool], embedding_scores:Optional[List[float]] = None)->List[FunctionTool]:
+        """Return the tools by relevance to the query, the most relevant first."""
+        index = self._get_index(tools)
+        scores = _normalize(index.score(query))
+        if embedding_scores is not None:
+            weight = self.options.embedding_weight
+            scores = [(1 - weight)*lexical + weight*semantic for lexical, semantic in zip(scores, embedding_scores)]
+        order = sorted(range(len(tools)), key=lambda i: -scores[i]) # stable, the registration order for ties
+        return [index.tools[i] for i in order if scores[i] > 0]
+
+    async def select(self,
+                     query:str,
+                     tools:Sequence[FunctionTool],
+                     pinned:Optional[List[str]] = None, # names of extra tools to keep, e.g. the tools called in the conversation
+                     history:Optional[str] = None, # the previous turns, to route a follow-up (e.g. "and in Paris?") that matches no tool
+                     )->List[FunctionTool]:
+        """
+        Return the pinned tools and the top-k tools relevant to the query, in the order of `tools`.
+        All tools are returned if none is relevant to the query, as the turn gives no hint of the tools it needs.
+        """
+        tools = list(tools)
+        if not self.is_routed(tools):
+            return tools
+        ranked = self.rank(query, tools, await self._embed_scores(query, tools))
+        if not ranked and history:
+            query = f"{query}\n{history}"
+            ranked = self.rank(query, tools, await self._embed_scores(query, tools))
+        if not ranked:
+            with self._lock:
+                self.stats.turns += 1
+                self.stats.fallbacks += 1
+                self.stats.tools_total += len(tools)
+                self.stats.tools_selected += len(tools)
+            return tools
+        keep = set(self.options.pinned or []) | set(pinned or [])
+        selected = {tool.name for tool in tools if tool.name in keep}
+        selected.update(tool.name for tool in ranked[:self.options.top_k])
+        with self._lock:
+            self.stats.turns += 1
+            self.stats.tools_total += len(tools)
+            self.stats.tools_selected += len(selected)
+        return [tool for tool in tools if tool.name in selected]
+
+    def record_request(self, tools:Sequence[FunctionTool], selected:Sequence[FunctionTool])->None:
+        """Count the estimated prompt tokens of the tool definitions saved in one LLM call."""
+        index = self._get_index(tools)
+        names = {tool.name for tool in selected}
+        self.record_tokens(sum(index.tokens), sum(tokens for tool, tokens in zip(index.tools, index.tokens) if tool.name in names))
+
+    def record_tokens(self, total:int, sent:int)->None:
+        """Count the estimated prompt tokens of all tool definitions and of the ones sent in one LLM call, e.g. by the chat client."""
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.prompt_tokens_total += total
+            self.stats.prompt_tokens_saved += total - sent
+
+    def get_stats(self)->ToolRouterStats:
+        with self._lock:
+            stats = self.stats.model_copy()
+        stats.saved_ratio = round(stats.prompt_tokens_saved/stats.prompt_tokens_total, 4) if stats.prompt_tokens_total else 0.0
+        return stats
+
+def get_tool_router_stats()->List[ToolRouterStats]:
+    with _tool_routers_lock:
+        routers = list(_tool_routers)
+    return [router.get_stats() for router in routers]
@@ -1,19 +1,45 @@
-import asyncio, types, inspect
+import asyncio, types, inspect, threading, weakref, importlib
+from contextlib import AsyncExitStack
 from dataclasses import dataclass
-from typing import Optional, Callable, Any, Dict, List
+from functools import partial
+from typing import Optional, Callable, Any, Dict, List, Iterable, Awaitable, Literal, AsyncGenerator
 import regex as re
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, ValidationError, create_model
+from .default import OPENAGENT_MAX_TOOL_CONCURRENCY
+from .utils.multitask import get_executor
+from .utils.tokens import estimate_text_tokens, CHARS_PER_TOKEN
+from .utils.cache import TTLCache
+from .tool_cache import ToolCache, ToolCacheOptions, make_tool_cache, make_tool_cache_key, MISSING
 
 """
 Implementation class for OpenAI LLM model.
 """
 
 __CTX_NAME__ = "context" # the conversation history
+MAX_STORED_RESULTS = 32 # oversized tool results stored in a run, the least recently read are dropped
 class ContextType(BaseModel):
-    pass
     #messages: List[Dict[str,Any]] # conversation history
+    _tool_results: Dict[ToolCache, Any] = PrivateAttr(default_factory=dict) # tool results cached in the run scope
+    _stored_results: TTLCache = PrivateAttr(default_factory=lambda: TTLCache(max_size=MAX_STORED_RESULTS)) # handle -> (oversized result, page tokens)
+    _stored_count: int = PrivateAttr(default=0) # results stored in the run, numbers the handles
 
 Callback = Callable[..., Any]
+# how a sync tool is executed:
+## - inline: on the event loop, only for fast non-blocking functions
+## - thread: in a thread pool (the default of sync tools), the event loop serves other sessions while the tool blocks
+## - process: in a process pool for cpu-bound functions, the tool must be a module-level function with picklable arguments
+ExecutionPolicy = Literal["inline", "thread", "process"]
+
+@dataclass
+class ToolProgress:
+    """
+    Progress (or partial result) of a streaming tool, shown to the user as a step but not sent to the LLM.
+    A streaming tool is an async generator: it yields ToolProgress while working, the last other value yielded is the result.
+    """
+    text: Optional[str] = None
+    tool: Optional[str] = None # the name of the tool, filled by the caller if None
+
+ProgressCallback = Callable[[ToolProgress], None]
 
 @dataclass
 class FunctionTool:
@@ -27,9 +53,19 @@ class FunctionTool:
     json_schema: Optional[dict[str, Any]] = None
     annotation: Optional[str] = None # arguments and return types
     is_async: Optional[bool] = False
+    is_async_gen: Optional[bool] = False # streaming tool yielding ToolProgress and the result
     """The JSON schema for the tool's parameters."""
     callback: Optional[Callback] = None #callback
     input_arguments: Optional[Dict[str, str]] = None
+    arguments_model: Optional[type[BaseModel]] = None # validate and coerce the arguments, compiled from the signature by `function_tool`
+    context_argument: Optional[bool] = None # whether the function takes the context, computed once
+    timeout: Optional[float] = None # seconds, the call is cancelled and reported to LLM as a timeout error
+    max_concurrency: Optional[int] = None # max concurrent calls of the tool (or the concurrency group)
+    concurrency_group: Optional[str] = None # tools of the same group share the concurrency limit, e.g. tools of one MCP server
+    execution: Optional[ExecutionPolicy] = "thread" # execution policy of sync tool, ignored by async tool
+    executor: Optional[str] = None # name of the executor (utils.multitask), "tools" for thread and "process" for process by default
+    strict: Optional[bool] = False # the json schema of arguments is strict, the endpoint decodes the arguments by the schema
+    cache: Optional[ToolCacheOptions] = None # cache the results of identical calls, no cache if None
 
     # call actual function
     def __call__(self, *args, **kwargs):
@@ -46,22 +82,394 @@ class FunctionTool:
         return types.MethodType(self, instance)
     
     def has_context_argument(self)->bool:
-        signature = inspect.signature(self.callback)
-        result = False
-        for param in signature.parameters.values():
-            if param.name == __CTX_NAME__ and issubclass(param.annotation, ContextType):
-                result = True
-                break
-        return result
+        if self.context_argument is None: # the tool isn't created by `function_tool`
+            try:
+                params = _get_tool_params(_get_signature(self.callback))
+            except (TypeError, ValueError):
+                params = []
+            self.context_argument = any(_is_context_param(param) for param in params)
+        return self.context_argument
+
+    def validate_arguments(self, arguments:Dict[str, Any])->Dict[str, Any]:
+        """Validate and coerce the arguments (e.g. "3" to 3) by the arguments model, raise pydantic.ValidationError if invalid."""
+        if self.arguments_model is None:
+            return arguments
+        inputs = arguments
+        context = None
+        if isinstance(arguments, dict) and __CTX_NAME__ in arguments and self.has_context_argument():
+            inputs = {key:value for key, value in arguments.items() if key != __CTX_NAME__}
+            context = arguments[__CTX_NAME__]
+        model = self.arguments_model.model_validate(inputs)
+        # pass the given arguments only, the function applies its own defaults
+        values = {field.alias:getattr(model, name) for name, field in self.arguments_model.model_fields.items() if name in model.model_fields_set}
+        if model.model_extra: # **kwargs
+            values.update(model.model_extra)
+        if context is not None:
+            values[__CTX_NAME__] = context
+        return values
+
+# structured error of tool call, returned to LLM as the call result
+class ToolError(BaseModel):
+    error: str # error type, e.g. "timeout", "invalid_arguments"
+    tool: Optional[str] = None
+    message: Optional[str] = None
+    def __str__(self)->str:
+        return f"[ERROR]: {self.model_dump_json(exclude_none=True)}"
+
+# the message of validation errors for LLM to fix the arguments
+def _format_validation_error(e:ValidationError)->str:
+    errors = []
+    for error in e.errors(include_url=False):
+        location = '.'.join(str(item) for item in error["loc"]) or "arguments"
+        if error["type"] == "missing":
+            errors.append(f"`{location}`: {error['msg']}")
+        else:
+            errors.append(f"`{location}`: {error['msg']}, got {repr(error['input'])[:100]}")
+    return f"Invalid arguments. {'; '.join(errors)}. Fix the arguments and call the tool again."
+
+class LoopSemaphore:
+    """Semaphore of `value` slots per event loop, as asyncio primitives are bound to the loop."""
+    def __init__(self, value:int) -> None:
+        self.value = value
+        self._lock = threading.Lock()
+        self._semaphores:weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+
+    def get(self)->asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.value)
+            return semaphore
+
+# the global limit of concurrent tool calls in the process, unlimited if None
+## note: agents as tools hold a slot while their inner tools wait for slots, keep the limit well above the nesting depth
+_global_tool_limit:Optional[LoopSemaphore] = LoopSemaphore(OPENAGENT_MAX_TOOL_CONCURRENCY) if OPENAGENT_MAX_TOOL_CONCURRENCY else None
+_group_limits:Dict[str, LoopSemaphore] = {}
+_group_limits_lock = threading.Lock()
+
+def set_max_tool_concurrency(max_concurrency:Optional[int])->None:
+    """Set the global limit of concurrent tool calls, None or 0 for unlimited."""
+    global _global_tool_limit
+    _global_tool_limit = LoopSemaphore(max_concurrency) if max_concurrency else None
+
+# the FunctionTool of a tool bound to an instance (types.MethodType)
+def unwrap_tool(tool:FunctionTool)->FunctionTool:
+    return getattr(tool, "__func__", tool)
+
+def _get_tool_limit(tool:FunctionTool)->Optional[LoopSemaphore]:
+    if not tool.max_concurrency:
+        return None
+    if tool.concurrency_group:
+        with _group_limits_lock:
+            limit = _group_limits.get(tool.concurrency_group)
+            if limit is None:
+                limit = _group_limits[tool.concurrency_group] = LoopSemaphore(tool.max_concurrency)
+            return limit
+    base = unwrap_tool(tool)
+    limit = base.__dict__.get("_limit")
+    if limit is None:
+        limit = base.__dict__["_limit"] = LoopSemaphore(tool.max_concurrency)
+    return limit
+
+# the result cache of the tool, the tools of a group (e.g. an MCP server) are recreated when the tool list is reloaded,
+## so they share the caches by name
+_group_caches:Dict[tuple[str, str], ToolCache] = {}
+_group_caches_lock = threading.Lock()
+
+def _get_tool_cache(tool:FunctionTool)->Optional[ToolCache]:
+    if not tool.cache:
+        return None
+    if tool.concurrency_group:
+        with _group_caches_lock:
+            cache = _group_caches.get((tool.concurrency_group, tool.name))
+            if cache is None:
+                cache = _group_caches[(tool.concurrency_group, tool.name)] = make_tool_cache(tool.name, tool.cache)
+            return cache
+    base = unwrap_tool(tool)
+    cache = base.__dict__.get("_cache")
+    if cache is None:
+        cache = base.__dict__["_cache"] = make_tool_cache(tool.name, tool.cache)
+    return cache
+
+# run the tool in the worker process by its module and name, as the decorated function can't be pickled by itself
+def _call_tool_by_reference(module:str, qualname:str, arguments:Dict[str, Any])->Any:
+    tool = importlib.import_module(module)
+    for name in qualname.split('.'):
+        tool = getattr(tool, name)
+    return tool(**arguments)
+
+# run the streaming tool to the end, relay its progress to `on_progress` and return the result
+async def _consume_tool_stream(tool:FunctionTool, arguments:Dict[str, Any], on_progress:Optional[ProgressCallback] = None)->Any:
+    result = None
+    stream = tool(**arguments)
+    try:
+        async for item in stream:
+            if not isinstance(item, ToolProgress):
+                result = item
+            elif on_progress:
+                on_progress(ToolProgress(text=item.text, tool=item.tool or tool.name))
+    finally:
+        await stream.aclose()
+    return result
+
+async def invoke_tool(tool:FunctionTool, arguments:Dict[str, Any], on_progress:Optional[ProgressCallback] = None)->Any:
+    if tool.is_async_gen: # async generator
+        return await _consume_tool_stream(tool, arguments, on_progress)
+    if tool.is_async: # async function
+        return await tool(**arguments)
+    if tool.execution == "inline":
+        return tool(**arguments)
+    # note: a timed out call stops waiting, but the worker runs the function to the end
+    if tool.execution == "process" and not isinstance(tool, types.MethodType):
+        callback = unwrap_tool(tool).callback
+        return await get_executor(tool.executor or "process").run(
+            partial(_call_tool_by_reference, callback.__module__, callback.__qualname__, arguments))
+    return await get_executor(tool.executor or "tools").run(partial(tool, **arguments))
+
+async def call_tool(tool:FunctionTool,
+                    arguments:Dict[str, Any],
+                    on_progress:Optional[ProgressCallback] = None,
+                    context:Optional[ContextType] = None,
+                    session_id:Optional[str] = None,
+                    max_result_tokens:Optional[int] = None)->Any:
+    """
+    Call the tool with the arguments (including the injected context) under the global and per-tool concurrency limits.
+    If the tool doesn't finish in its timeout, it's cancelled and a ToolError is returned as the result.
+    The progress of a streaming tool is passed to `on_progress`, if set.
+    Invalid arguments are returned as a ToolError without calling the tool.
+    If the tool has a cache, the result of an identical call in the scope (the run of `context`, `session_id` or global)
+    is returned without calling the tool. Errors are not cached.
+    A text result larger than `max_result_tokens` is stored in the run (`context`), a preview and the handle to read it
+    by `read_tool_result` are returned instead.
+    """
+    try:
+        arguments = tool.validate_arguments(arguments)
+    except ValidationError as e:
+        return str(ToolError(error="invalid_arguments", tool=tool.name, message=_format_validation_error(e)))
+    cache = _get_tool_cache(tool)
+    if cache is None:
+        result = await _call_tool_with_limits(tool, arguments, on_progress)
+        return str(result) if isinstance(result, ToolError) else store_tool_result(tool.name, result, context, max_result_tokens)
+
+    key = make_tool_cache_key(tool.name, {k:v for k, v in arguments.items() if k != __CTX_NAME__}, getattr(tool, "__self__", None))
+    run_results = context._tool_results if context is not None else None
+    result = cache.get(key, run_results, session_id)
+    if result is MISSING:
+        result = await _call_tool_with_limits(tool, arguments, on_progress)
+        if isinstance(result, ToolError):
+            return str(result)
+        cache.set(key, result, run_results, session_id) # the full result, stored per run below
+    return store_tool_result(tool.name, result, context, max_result_tokens)
+
+async def _call_tool_with_limits(tool:FunctionTool, arguments:Dict[str, Any], on_progress:Optional[ProgressCallback] = None)->Any:
+    async with AsyncExitStack() as stack:
+        if _global_tool_limit:
+            await stack.enter_async_context(_global_tool_limit.get())
+        limit = _get_tool_limit(tool)
+        if limit:
+            await stack.enter_async_context(limit.get())
+        timeout = asyncio.timeout(tool.timeout)
+        try:
+            async with timeout:
+                return await invoke_tool(tool, arguments, on_progress)
+        except TimeoutError:
+            if not timeout.expired(): # raised by the tool itself
+                raise
+            return ToolError(error="timeout",
+                             tool=tool.name,
+                             message=f"The tool call didn't finish in {tool.timeout} seconds and was cancelled. Try again with narrower arguments or use another way.")
+
+async def gather_tool_calls(calls:Iterable[Awaitable[Any]])->List[Any]:
+    """Run the tool calls concurrently and return the results in order. The pending calls are cancelled if any call fails or the caller is cancelled."""
+    tasks = [asyncio.ensure_future(call) for call in calls]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        await cancel_tool_calls(tasks)
+        raise
+
+async def cancel_tool_calls(tasks:Iterable[asyncio.Future])->None:
+    """Cancel the pending tool call tasks and wait for them to clean up."""
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel() # no-op for finished tasks
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def iter_tool_progress(tasks:Iterable[asyncio.Future], queue:asyncio.Queue)->AsyncGenerator[ToolProgress, None]:
+    """Yield the progress reported to the queue (by `on_progress=queue.put_nowait`) until all the tool call tasks are done."""
+    pending = set(tasks)
+    getter:Optional[asyncio.Future] = None
+    try:
+        while True:
+            while not queue.empty():
+                yield queue.get_nowait()
+            pending = {task for task in pending if not task.done()}
+            if not pending:
+                return
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(pending | {getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+            else:
+                getter.cancel()
+            getter = None
+    finally:
+        if getter is not None:
+            getter.cancel()
+
+JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+    type(None): "null",
+}
+
+# the signature with the string annotations (`from __future__ import annotations`) resolved
+def _get_signature(func:Callable)->inspect.Signature:
+    try:
+        return inspect.signature(func, eval_str=True)
+    except Exception: # e.g. unresolvable forward references
+        return inspect.signature(func)
+
+def _get_tool_params(signature:inspect.Signature)->List[inspect.Parameter]:
+    params = list(signature.parameters.values())
+    if len(params)>0 and params[0].name in ("self", "cls"):
+        params = params[1:] # ignore self and cls for class method
+    return params
+
+def _is_context_param(param:inspect.Parameter)->bool:
+    return param.name == __CTX_NAME__ and inspect.isclass(param.annotation) and issubclass(param.annotation, ContextType)
+
+_DOC_SECTION = re.compile(r"^\s*(Parameters|Params|Args|Arguments)\s*:?\s*$", re.IGNORECASE)
+_DOC_PARAM = re.compile(r"^\s*[-*]?\s*(\w+)\s*(?:\([^)]*\))?\s*:\s*(.*)$")
+
+# the descriptions of arguments in the docstring, in the styles used by the tools of the sdk:
+## Parameters:                                  Args:
+##     - query (type:str, required): search term     query: search term
+def _parse_param_descriptions(doc:Optional[str])->Dict[str, str]:
+    descriptions:Dict[str, str] = {}
+    name = None
+    in_section = False
+    for line in inspect.cleandoc(doc or "").splitlines():
+        if _DOC_SECTION.match(line):
+            in_section = True
+            name = None
+            continue
+        if not in_section or not line.strip():
+            continue
+        if not line[0].isspace(): # the next section, e.g. "Returns:"
+            in_section = False
+            continue
+        match = _DOC_PARAM.match(line)
+        if match:
+            name = match[1]
+            descriptions[name] = match[2].strip()
+        elif name: # continuation line
+            descriptions[name] = f"{descriptions[name]} {line.strip()}".strip()
+    return {key:value for key, value in descriptions.items() if value}
+
+# compile the arguments (except the context) into a pydantic model, None if the annotations aren't supported
+## the fields are aliased by the argument names, so arguments like `json` or `schema` don't shadow the model attributes
+def _make_arguments_model(name:str, params:List[inspect.Parameter], descriptions:Optional[Dict[str, str]] = None)->Optional[type[BaseModel]]:
+    fields = {}
+    extra = "forbid" # report unknown arguments rather than failing the call with TypeError
+    for n, param in enumerate(params):
+        if param.kind == param.VAR_KEYWORD:
+            extra = "allow"
+            continue
+        if param.kind == param.VAR_POSITIONAL or _is_context_param(param):
+            continue
+        annotation = Any if param.annotation is inspect.Parameter.empty else param.annotation
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        fields[f"arg{n}"] = (annotation, Field(default, alias=param.name, description=(descriptions or {}).get(param.name)))
+    try:
+        return create_model(f"{name}_arguments",
+                            __config__=ConfigDict(extra=extra, coerce_numbers_to_str=True, arbitrary_types_allowed=True),
+                            **fields)
+    except Exception: # e.g. unsupported annotations, call without validation
+        return None
+
+# remove the titles generated by pydantic (e.g. "title": "Query"), they cost tokens without telling more than the names
+def _strip_titles(schema:Any)->None:
+    if isinstance(schema, dict):
+        if isinstance(schema.get("title"), str):
+            schema.pop("title")
+        for key, value in schema.items():
+            if key in ("properties", "$defs", "definitions") and isinstance(value, dict): # keys are names, not keywords
+                for sub_schema in value.values():
+                    _strip_titles(sub_schema)
+            elif key not in ("default", "enum", "const", "examples"): # values, not schemas
+                _strip_titles(value)
+    elif isinstance(schema, list):
+        for item in schema:
+            _strip_titles(item)
+
+# the flat schema of bare types, for the arguments not supported by pydantic json schema (e.g. arbitrary classes)
+def _make_flat_parameters_schema(params:List[inspect.Parameter])->dict:
+    parameters = {}
+    required = []
+    for param in params:
+        if _is_context_param(param) or param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        parameters[param.name] = {"type": JSON_TYPES.get(param.annotation, "string")}
+        if param.default == inspect._empty:
+            required.append(param.name)
+    return {"type": "object", "properties": parameters, "required": required}
+
+def _make_parameters_schema(params:List[inspect.Parameter], arguments_model:Optional[type[BaseModel]], strict:bool = False)->dict:
+    schema = None
+    if arguments_model is not None:
+        try:
+            schema = arguments_model.model_json_schema(by_alias=True)
+            _strip_titles(schema)
+            schema.setdefault("properties", {})
+            schema.setdefault("required", [])
+        except Exception: # e.g. PydanticInvalidForJsonSchema of arbitrary classes
+            schema = None
+    if schema is None:
+        schema = _make_flat_parameters_schema(params)
+    if strict:
+        from .mcp.ensure_strict_json_schema import ensure_strict_json_schema # import here, mcp imports tools
+        try:
+            schema = ensure_strict_json_schema(schema)
+        except Exception as e: # e.g. **kwargs allows additional properties
+            raise ValueError(f"Failed to make strict json schema of arguments: {str(e)}") from e
+    return schema
+
+# the type of argument in the tool list of prompt, e.g. "array[string]", "string|null"
+def _schema_type_name(schema:dict)->str:
+    if "enum" in schema:
+        return f"enum{schema['enum']}"
+    if "anyOf" in schema:
+        return '|'.join(_schema_type_name(variant) for variant in schema["anyOf"])
+    if "$ref" in schema: # e.g. "#/$defs/Color"
+        return schema["$ref"].split('/')[-1]
+    schema_type = schema.get("type", "any")
+    if schema_type == "array" and isinstance(schema.get("items"), dict):
+        return f"array[{_schema_type_name(schema['items'])}]"
+    return schema_type if isinstance(schema_type, str) else '|'.join(schema_type)
+
 #!Note "context" is reserved parameter by agent, it will be removed from json desc of the function
-def function_to_json(func) -> dict:
+def function_to_json(func,
+                     signature:Optional[inspect.Signature] = None,
+                     arguments_model:Optional[type[BaseModel]] = None,
+                     strict:bool = False) -> dict:
     """
     Converts a Python function into a JSON-serializable dictionary
     that describes the function's signature, including its name,
     description, and parameters.
+    The parameters schema is generated from the type hints (generics, Optional, Literal, Enum, pydantic models),
+    with the argument descriptions in the docstring.
 
     Args:
         func: The function to be converted.
+        signature: The signature of the function, computed if None.
+        arguments_model: The compiled arguments model of the function, compiled if None.
+        strict: Make the schema strict for the structured outputs (constrained decoding) of the endpoint.
 
     Returns:
         A dictionary representing the function's signature in JSON format.
@@ -69,55 +477,27 @@ def function_to_json(func) -> dict:
     if isinstance(func, FunctionTool):
         return func.json_schema
 
-    type_map = {
-        str: "string",
-        int: "integer",
-        float: "number",
-        bool: "boolean",
-        list: "array",
-        dict: "object",
-        type(None): "null",
-    }
-
-    try:
-        signature = inspect.signature(func)
-    except ValueError as e:
-        raise ValueError(
-            f"Failed to get signature for function {func.__name__}: {str(e)}"
-        )
-
-    parameters = {}
-    required = []
-
-    signature_params = list(signature.parameters.values())
-    if len(signature_params)>0 and signature_params[0].name in ("self", "cls"):
-        signature_params = signature_params[1:] # ignore self and cls for class method
-    
-    for param in signature_params:
+    if signature is None:
         try:
-            if param.name == __CTX_NAME__ and issubclass(param.annotation, ContextType):
-                continue
-            param_type = type_map.get(param.annotation, "string")
-        except KeyError as e:
-            raise KeyError(
-                f"Unknown type annotation {param.annotation} for parameter {param.name}: {str(e)}"
+            signature = _get_signature(func)
+        except ValueError as e:
+            raise ValueError(
+                f"Failed to get signature for function {func.__name__}: {str(e)}"
             )
-        parameters[param.name] = {"type": param_type}
-        if param.default == inspect._empty:
-            required.append(param.name)
-    
+
+    params = _get_tool_params(signature)
+    if arguments_model is None:
+        arguments_model = _make_arguments_model(func.__name__, params, _parse_param_descriptions(func.__doc__))
     tool_js = {
         "type": "function",
         "function": {
             "name": func.__name__,
             "description": func.__doc__ or "",
-            "parameters": {
-                "type": "object",
-                "properties": parameters,
-                "required": required,
-            },
+            "parameters": _make_parameters_schema(params, arguments_model, strict),
         },
     }
+    if strict:
+        tool_js["function"]["strict"] = True
     return tool_js
 
 def transform_string_function_style(name: str) -> str:
@@ -132,36 +512,41 @@ def function_tool(
     *,
     name: str | None = None,
     description: str | None = None,
+    timeout: float | None = None, # seconds
+    max_concurrency: int | None = None,
+    concurrency_group: str | None = None,
+    execution: ExecutionPolicy | None = "thread", # for sync function
+    executor: str | None = None,
+    strict: bool | None = False, # strict json schema of arguments, for the endpoint to decode the arguments by the schema
+    cache: ToolCacheOptions | None = None # cache the results of identical calls
     )->FunctionTool:
-    function_tool = FunctionTool(name=name, description=description)
+    function_tool = FunctionTool(name=name,
+                                 description=description,
+                                 timeout=timeout,
+                                 max_concurrency=max_concurrency,
+                                 concurrency_group=concurrency_group,
+                                 execution=execution,
+                                 executor=executor,
+                                 strict=strict,
+                                 cache=cache)
     # THIS is the decorator that Python will call with your function
     def _decorate(callback:Callback):
         function_tool.name = function_tool.name if function_tool.name else callback.__name__ or ""
         function_tool.description = function_tool.description if function_tool.description else callback.__doc__ or ""
         function_tool.callback = callback     # store the real function
         function_tool.is_async = asyncio.iscoroutinefunction(callback)
-        function_tool.json_schema = function_to_json(callback)
+        function_tool.is_async_gen = inspect.isasyncgenfunction(callback)
+        # compile the tool once: the signature, schema and arguments model are reused by every call
+        signature = _get_signature(callback)
+        params = _get_tool_params(signature)
+        function_tool.arguments_model = _make_arguments_model(function_tool.name, params, _parse_param_descriptions(callback.__doc__))
+        function_tool.json_schema = function_to_json(callback, signature, function_tool.arguments_model, bool(function_tool.strict))
         function_tool.json_schema["function"]["name"] = function_tool.name
         function_tool.json_schema["function"]["description"] = function_tool.description
 
-        type_map = {
-            str: "string",
-            int: "integer",
-            float: "number",
-            bool: "boolean",
-            list: "array",
-            dict: "object",
-            type(None): "null",
-        }
-        function_tool.input_arguments = {}
-        signature = inspect.signature(callback)
-        signature_params = list(signature.parameters.values())
-        if len(signature_params)>0 and signature_params[0].name in ("self", "cls"):
-            signature_params = signature_params[1:] # ignore self and cls for class method
-        for param in signature_params:
-            if param.name == __CTX_NAME__ and issubclass(param.annotation, ContextType):
-                continue
-            function_tool.input_arguments[param.name] = type_map.get(param.annotation, "string")
+        properties = function_tool.json_schema["function"]["parameters"]["properties"]
+        function_tool.input_arguments = {key:_schema_type_name(value) for key, value in properties.items()}
+        function_tool.context_argument = any(_is_context_param(param) for param in params)
         
         return function_tool # replace `func` with your tool
     
@@ -173,8 +558,70 @@ def function_tool(
 def make_function_tool(
     name: str | None = None,
     description: str | None = None,
-    callback:Callback | None = None)->FunctionTool:
-    return function_tool(name=name, description=description)(callback)
+    callback:Callback | None = None,
+    timeout: float | None = None,
+    max_concurrency: int | None = None,
+    concurrency_group: str | None = None,
+    execution: ExecutionPolicy | None = "thread",
+    executor: str | None = None,
+    strict: bool | None = False,
+    cache: ToolCacheOptions | None = None)->FunctionTool:
+    return function_tool(name=name,
+                         description=description,
+                         timeout=timeout,
+                         max_concurrency=max_concurrency,
+                         concurrency_group=concurrency_group,
+                         execution=execution,
+                         executor=executor,
+                         strict=strict,
+                         cache=cache)(callback)
+
+# the head of the text within the tokens
+def _truncate_to_tokens(text:str, tokens:int)->str:
+    end = min(len(text), tokens*CHARS_PER_TOKEN)
+    while estimate_text_tokens(text[:end]) > tokens: # non-ascii text has more tokens per char
+        end = max(tokens, end*3//4)
+    return text[:end]
+
+def store_tool_result(tool_name:str, result:Any, context:Optional[ContextType], max_tokens:Optional[int])->Any:
+    """
+    Store the text result larger than `max_tokens` in the run (`context`), so it doesn't inflate the messages of the
+    following LLM calls in the run. Return the preview of the result and the handle to page through it by `read_tool_result`.
+    The run keeps the MAX_STORED_RESULTS most recently used results.
+    """
+    if not max_tokens or context is None or not isinstance(result, str) or estimate_text_tokens(result) <= max_tokens:
+        return result
+    page_tokens = max(1, max_tokens//2) # the preview and the pages take half of the budget
+    context._stored_count += 1
+    handle = f"{tool_name}-{context._stored_count}" # never reused in the run, even if older results are dropped
+    context._stored_results.set(handle, (result, page_tokens))
+    preview = _truncate_to_tokens(result, page_tokens)
+    return (f'[The result is too large ({len(result)} chars, ~{estimate_text_tokens(result)} tokens) and stored as handle "{handle}". '
+            f'The first {len(preview)} chars:]\n{preview}\n'
+            f'[Call `{read_tool_result.name}` with handle="{handle}" and offset={len(preview)} to read more.]')
+
+@function_tool(execution="inline")
+def read_tool_result(handle:str, context:ContextType, offset:int = 0, length:Optional[int] = None)->str:
+    """Read a page of the tool result stored by handle, as the result is too large to return in one piece.
+    Parameters:
+        - handle (type:str, required): the handle of the stored tool result
+        - offset (type:int, optional): the char offset to read from, 0 by default
+        - length (type:int, optional): the chars to read, a full page by default
+    Returns:
+        str: the page of the result from the offset, and the offset of the next page.
+    """
+    stored = context._stored_results.get(handle)
+    if stored is None:
+        return str(ToolError(error="invalid_arguments",
+                             tool="read_tool_result",
+                             message=f'Unknown or expired handle "{handle}". Handles: {context._stored_results.keys()}'))
+    result, page_tokens = stored
+    offset = min(max(0, offset), len(result))
+    page = _truncate_to_tokens(result[offset:offset + length] if length and length > 0 else result[offset:], page_tokens)
+    end = offset + len(page)
+    if end >= len(result):
+        return f"{page}\n[chars {offset}-{end} of {len(result)}, the end of the result.]"
+    return f'{page}\n[chars {offset}-{end} of {len(result)}. Call `read_tool_result` with handle="{handle}" and offset={end} to read more.]'
 
 
 
@@ -0,0 +1,143 @@
+"""
+Process-wide registry of pooled HTTP transports for LLM endpoints.
+All OpenAIChatClient instances (and their clones) targeting the same (end_point, api_key, api_version)
+share one httpx connection pool, so keep-alive connections and TLS sessions are reused across agents.
+"""
+import asyncio, hashlib, importlib.util, threading, weakref
+from typing import Optional, Dict, Tuple, List
+import httpx
+from pydantic import BaseModel
+from .utils.logger import get_global_logger
+
+class TransportOptions(BaseModel):
+    max_connections: Optional[int] = 100 # max concurrent connections to the endpoint
+    max_keepalive_connections: Optional[int] = 20 # max idle connections kept alive in the pool
+    keepalive_expiry: Optional[float] = 30.0 # seconds before an idle connection is closed
+    http2: Optional[bool] = False # requires package `h2`, fall back to http/1.1 if not installed
+    timeout: Optional[float] = 600.0 # read/write timeout in seconds
+    connect_timeout: Optional[float] = 5.0 # connect timeout in seconds
+
+    def key(self)->tuple:
+        return tuple(self.model_dump().values())
+
+class TransportStats(BaseModel):
+    end_point: Optional[str] = None
+    http2: Optional[bool] = False
+    clients: Optional[int] = 0 # number of live chat clients attached to the pool
+    requests: Optional[int] = 0 # total requests sent
+    errors: Optional[int] = 0 # requests failed at transport level (connect/read errors)
+    in_flight: Optional[int] = 0 # requests waiting for response headers
+    connections: Optional[int] = 0 # open connections in the pool
+    idle_connections: Optional[int] = 0 # open connections available for reuse
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """httpx transport which counts requests passing through the pool."""
+    def __init__(self, stats:TransportStats, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request:httpx.Request)->httpx.Response:
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.in_flight -= 1
+
+class SharedTransport:
+    """A pooled httpx.AsyncClient shared by all chat clients of one endpoint."""
+    def __init__(self, end_point:str, options:TransportOptions) -> None:
+        http2 = bool(options.http2)
+        if http2 and importlib.util.find_spec("h2") is None:
+            get_global_logger().warning(f"package `h2` is not installed, fall back to http/1.1. end_point:{end_point}")
+            http2 = False
+        self.stats = TransportStats(end_point=end_point, http2=http2)
+        self._clients:weakref.WeakSet = weakref.WeakSet() # the chat clients attached, counted once each
+        limits = httpx.Limits(max_connections=options.max_connections,
+                              max_keepalive_connections=options.max_keepalive_connections,
+                              keepalive_expiry=options.keepalive_expiry)
+        self._transport = _CountingTransport(self.stats, limits=limits, http2=http2)
+        self.http_client = httpx.AsyncClient(
+            transport=self._transport,
+            limits=limits,
+            timeout=httpx.Timeout(options.timeout, connect=options.connect_timeout),
+            follow_redirects=True)
+
+    def attach(self, client:object)->None:
+        self._clients.add(client)
+
+    def get_stats(self)->TransportStats:
+        self.stats.clients = len(self._clients)
+        connections = getattr(self._transport._pool, "connections", None) or []
+        self.stats.connections = len(connections)
+        self.stats.idle_connections = len([c for c in connections if c.is_idle()])
+        return self.stats.model_copy()
+
+    async def aclose(self)->None:
+        await self.http_client.aclose()
+
+TransportKey = Tuple[str, str, str, tuple]
+
+class TransportRegistry:
+    """
+    Hands out one SharedTransport per (end_point, api_key, api_version, options).
+    Connection pools are bound to an event loop, so the registry keeps one set of pools per running loop.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._transports:weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[TransportKey, SharedTransport]] = weakref.WeakKeyDictionary()
+        self._no_loop_transports:Dict[TransportKey, SharedTransport] = {}
+
+    def _loop_transports(self)->Dict[TransportKey, SharedTransport]:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError: # not in event loop
+            return self._no_loop_transports
+        transports = self._transports.get(loop)
+        if transports is None:
+            transports = self._transports[loop] = {}
+        return transports
+
+    def get(self,
+            end_point:str,
+            api_key:Optional[str] = None,
+            api_version:Optional[str] = None,
+            options:Optional[TransportOptions] = None,
+            client:Optional[object] = None)->SharedTransport: # the chat client to attach
+        options = options or TransportOptions()
+        # never keep api key in plain text as the key of the registry
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()
+        key = (end_point or "", key_hash, api_version or "", options.key())
+        with self._lock:
+            transports = self._loop_transports()
+            transport = transports.get(key)
+            if transport is None:
+                transport = transports[key] = SharedTransport(end_point, options)
+            if client is not None:
+                transport.attach(client)
+            return transport
+
+    def get_stats(self)->List[TransportStats]:
+        with self._lock:
+            transports = list(self._no_loop_transports.values())
+            for loop_transports in self._transports.values():
+                transports.extend(loop_transports.values())
+        return [transport.get_stats() for transport in transports]
+
+    async def aclose(self)->None:
+        """Close all pools of the running event loop."""
+        with self._lock:
+            transports = self._loop_transports()
+            closing = list(transports.values())
+            transports.clear()
+        for transport in closing:
+            await transport.aclose()
+
+# the process-wide registry
+transport_registry = TransportRegistry()
+
+def get_transport_stats()->List[TransportStats]:
+    return transport_registry.get_stats()
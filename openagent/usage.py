@@ -0,0 +1,59 @@
+"""
+Token usage reported by LLM endpoints, including the prompt tokens served from the provider's prompt (prefix) cache.
+"""
+import threading
+from typing import Optional, Dict, Tuple, List
+from pydantic import BaseModel
+
+class TokenUsage(BaseModel):
+    end_point: Optional[str] = None
+    model: Optional[str] = None
+    requests: Optional[int] = 0 # responses with usage
+    prompt_tokens: Optional[int] = 0
+    completion_tokens: Optional[int] = 0
+    cached_tokens: Optional[int] = 0 # prompt tokens served from the prompt cache of the provider
+    cached_ratio: Optional[float] = 0.0 # cached_tokens/prompt_tokens
+
+class UsageTracker:
+    """Accumulate the usage of one deployment."""
+    def __init__(self, end_point:str, model:str) -> None:
+        self.usage = TokenUsage(end_point=end_point, model=model)
+
+    def record(self, usage:object) -> None:
+        if usage is None:
+            return
+        self.usage.requests += 1
+        self.usage.prompt_tokens += getattr(usage, "prompt_tokens", None) or 0
+        self.usage.completion_tokens += getattr(usage, "completion_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.usage.cached_tokens += getattr(details, "cached_tokens", None) or 0
+
+    def get_stats(self) -> TokenUsage:
+        usage = self.usage.model_copy()
+        usage.cached_ratio = round(usage.cached_tokens/usage.prompt_tokens, 4) if usage.prompt_tokens else 0.0
+        return usage
+
+class UsageRegistry:
+    """Hands out one UsageTracker per deployment (end_point, model)."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._trackers:Dict[Tuple[str, str], UsageTracker] = {}
+
+    def get(self, end_point:str, model:str) -> UsageTracker:
+        key = (end_point or "", model or "")
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = UsageTracker(end_point, model)
+            return tracker
+
+    def get_stats(self) -> List[TokenUsage]:
+        with self._lock:
+            trackers = list(self._trackers.values())
+        return [tracker.get_stats() for tracker in trackers]
+
+# the process-wide registry
+usage_registry = UsageRegistry()
+
+def get_token_usage() -> List[TokenUsage]:
+    return usage_registry.get_stats()
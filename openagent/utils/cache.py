@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Hashable
+
+_MISSING = object()
+
+# size-bounded LRU cache with optional time-to-live of entries
+class TTLCache:
+    """
+    A LRU cache bounded by `max_size` entries. Entries expire `ttl` seconds after written (never if ttl is None).
+    Usage:
+    cache = TTLCache(max_size=128, ttl=60)
+    cache.set("key", "value")
+    value = cache.get("key")
+    """
+    def __init__(self, max_size:Optional[int] = 1024, ttl:Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data:OrderedDict[Hashable, tuple[Any, Optional[float]]] = OrderedDict() # key -> (value, expires_at)
+
+    def get(self, key:Hashable, default:Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key) # mark as recently used
+        return value
+
+    def set(self, key:Hashable, value:Any, ttl:Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while self.max_size is not None and len(self._data) > self.max_size:
+            self._data.popitem(last=False) # evict the least recently used
+
+    def pop(self, key:Hashable, default:Any = None) -> Any:
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def keys(self) -> list:
+        return list(self._data.keys())
+
+    def __contains__(self, key:Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
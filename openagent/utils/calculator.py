@@ -0,0 +1,180 @@
+"""
+Safe evaluation of arithmetic expressions, e.g. "sqrt(2)*3**2", "mean([1, 2, 3]) / 2", "[1, 2, 3] * 2 + 1".
+The expression is parsed into AST and only numbers, lists, arithmetic operators, math constants and the functions
+below are evaluated. Exponents, number sizes, list lengths, expression depth and wall time are bounded, so
+adversarial expressions (e.g. "9**9**9**9") fail fast with CalculatorError instead of pinning a CPU core.
+Lists are vectorized: operators and math functions apply elementwise, scalars are broadcast.
+"""
+import ast, math, operator, statistics, time
+from typing import Optional, Union, List, Callable, Any
+from pydantic import BaseModel
+
+Number = Union[int, float]
+Value = Union[Number, List[Number]]
+
+class CalculatorError(ValueError):
+    pass
+
+class CalculatorLimits(BaseModel):
+    max_length: Optional[int] = 2000 # chars of the expression
+    max_depth: Optional[int] = 32 # nesting of operators and calls
+    max_nodes: Optional[int] = 1000 # evaluated nodes of AST
+    max_int_bits: Optional[int] = 8192 # ~2466 decimal digits
+    max_list_length: Optional[int] = 10000
+    max_factorial: Optional[int] = 1000
+    timeout: Optional[float] = 0.1 # seconds
+
+DEFAULT_LIMITS = CalculatorLimits()
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf}
+
+BINARY_OPERATORS:dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow, # checked by check_power
+}
+
+UNARY_OPERATORS:dict[type, Callable[[Any], Any]] = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# functions applied to each element of list arguments
+ELEMENTWISE_FUNCTIONS:dict[str, Callable[..., Any]] = {
+    "abs": abs, "round": round, "floor": math.floor, "ceil": math.ceil, "trunc": math.trunc,
+    "sqrt": math.sqrt, "cbrt": math.cbrt, "exp": math.exp, "log": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos, "atan": math.atan,
+    "atan2": math.atan2, "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh,
+    "degrees": math.degrees, "radians": math.radians, "hypot": math.hypot,
+    "gcd": math.gcd, "lcm": math.lcm, "factorial": math.factorial, "comb": math.comb, "perm": math.perm,
+    "pow": operator.pow,
+}
+
+# functions of a list (or several numbers)
+AGGREGATE_FUNCTIONS:dict[str, Callable[[List[Number]], Any]] = {
+    "sum": math.fsum, "prod": math.prod, "min": min, "max": max, "len": len,
+    "mean": statistics.fmean, "median": statistics.median, "stdev": statistics.stdev, "variance": statistics.variance,
+}
+
+FUNCTION_NAMES = sorted(ELEMENTWISE_FUNCTIONS) + sorted(AGGREGATE_FUNCTIONS)
+
+class _Evaluator:
+    def __init__(self, limits:CalculatorLimits) -> None:
+        self.limits = limits
+        self.nodes = 0
+        self.deadline = time.monotonic() + limits.timeout
+
+    def check_number(self, value:Any)->Any:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise CalculatorError(f"unsupported value {value!r}")
+        if isinstance(value, int) and value.bit_length() > self.limits.max_int_bits:
+            raise CalculatorError(f"number too large (more than {self.limits.max_int_bits} bits)")
+        return value
+
+    def check_list(self, values:List[Any])->List[Any]:
+        if len(values) > self.limits.max_list_length:
+            raise CalculatorError(f"list too long (more than {self.limits.max_list_length} elements)")
+        return [self.check_number(value) for value in values]
+
+    def check(self, value:Any)->Value:
+        return self.check_list(value) if isinstance(value, list) else self.check_number(value)
+
+    # bound the size of result before computing a power
+    def check_power(self, base:Number, exponent:Number)->None:
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+            if exponent*math.log2(abs(base)) > self.limits.max_int_bits:
+                raise CalculatorError(f"number too large (more than {self.limits.max_int_bits} bits)")
+
+    def check_function(self, name:str, args:tuple)->None:
+        if name == "pow" and len(args) == 2:
+            self.check_power(*args)
+        elif name in ("factorial", "comb", "perm") and args and isinstance(args[0], int) and args[0] > self.limits.max_factorial:
+            raise CalculatorError(f"{name} argument too large (more than {self.limits.max_factorial})")
+
+    # apply the function to scalars, or elementwise to lists with the scalars broadcast
+    def vectorize(self, function:Callable[..., Any], args:List[Value], check:Optional[Callable[..., None]] = None)->Value:
+        lengths = {len(arg) for arg in args if isinstance(arg, list)}
+        if not lengths:
+            if check:
+                check(*args)
+            return self.check(function(*args))
+        if len(lengths) > 1:
+            raise CalculatorError(f"lists of different lengths {sorted(lengths)}")
+        results = []
+        for i in range(lengths.pop()):
+            row = [arg[i] if isinstance(arg, list) else arg for arg in args]
+            if check:
+                check(*row)
+            results.append(self.check_number(function(*row)))
+        return results
+
+    def eval(self, node:ast.AST, depth:int = 0)->Value:
+        self.nodes += 1
+        if self.nodes > self.limits.max_nodes:
+            raise CalculatorError(f"expression too complex (more than {self.limits.max_nodes} nodes)")
+        if depth > self.limits.max_depth:
+            raise CalculatorError(f"expression too deep (more than {self.limits.max_depth} levels)")
+        if time.monotonic() > self.deadline:
+            raise CalculatorError(f"evaluation exceeded {self.limits.timeout} seconds")
+
+        if isinstance(node, ast.Expression):
+            return self.eval(node.body, depth + 1)
+        if isinstance(node, ast.Constant):
+            return self.check_number(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in CONSTANTS:
+                raise CalculatorError(f"unknown name `{node.id}`")
+            return CONSTANTS[node.id]
+        if isinstance(node, (ast.List, ast.Tuple)):
+            if len(node.elts) > self.limits.max_list_length:
+                raise CalculatorError(f"list too long (more than {self.limits.max_list_length} elements)")
+            values = [self.eval(element, depth + 1) for element in node.elts]
+            if any(isinstance(value, list) for value in values):
+                raise CalculatorError("nested lists are not supported")
+            return values
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return self.vectorize(UNARY_OPERATORS[type(node.op)], [self.eval(node.operand, depth + 1)])
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left = self.eval(node.left, depth + 1)
+            right = self.eval(node.right, depth + 1)
+            return self.vectorize(BINARY_OPERATORS[type(node.op)], [left, right],
+                                  self.check_power if isinstance(node.op, ast.Pow) else None)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            name = node.func.id
+            if name not in AGGREGATE_FUNCTIONS and name not in ELEMENTWISE_FUNCTIONS:
+                raise CalculatorError(f"unknown function `{name}`")
+            args = [self.eval(arg, depth + 1) for arg in node.args]
+            if name in AGGREGATE_FUNCTIONS:
+                values = args[0] if len(args) == 1 and isinstance(args[0], list) else args
+                if any(isinstance(value, list) for value in values):
+                    raise CalculatorError(f"`{name}` takes one list or several numbers")
+                return self.check(AGGREGATE_FUNCTIONS[name](values))
+            return self.vectorize(ELEMENTWISE_FUNCTIONS[name], args, lambda *row: self.check_function(name, row))
+        raise CalculatorError(f"unsupported syntax `{type(node).__name__}`")
+
+def evaluate_expression(expression:str, limits:Optional[CalculatorLimits] = None)->Value:
+    """Evaluate the arithmetic expression within the limits, raise CalculatorError if invalid or out of the limits."""
+    limits = limits or DEFAULT_LIMITS
+    if len(expression) > limits.max_length:
+        raise CalculatorError(f"expression too long (more than {limits.max_length} chars)")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise CalculatorError(f"invalid expression: {str(e)}") from e
+    try:
+        return _Evaluator(limits).eval(tree)
+    except CalculatorError:
+        raise
+    except (ArithmeticError, ValueError, TypeError, statistics.StatisticsError, RecursionError) as e:
+        raise CalculatorError(f"{type(e).__name__}: {str(e)}") from e
+
+def format_value(value:Value)->str:
+    if isinstance(value, list):
+        return '[' + ', '.join(format_value(item) for item in value) + ']'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e16:
+        return str(int(value))
+    return str(value)
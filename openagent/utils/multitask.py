@@ -1,16 +1,144 @@
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
-__thread_pool_executor = ThreadPoolExecutor(max_workers=16) # to execute
-__single_executor = ThreadPoolExecutor(max_workers=1) # to execute
+import asyncio, os, threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Optional, Dict, List, Literal, Callable, Any
+from pydantic import BaseModel
+from . import env
+
+ExecutorKind = Literal["thread", "process"]
+
+class ExecutorStats(BaseModel):
+    name: Optional[str] = None
+    kind: Optional[str] = "thread"
+    max_workers: Optional[int] = 0
+    submitted: Optional[int] = 0
+    completed: Optional[int] = 0
+    failed: Optional[int] = 0
+    cancelled: Optional[int] = 0 # the caller stopped waiting (e.g. timeout), a thread keeps running the call to the end
+    running: Optional[int] = 0
+    queued: Optional[int] = 0 # submitted but waiting for a free worker
+    utilization: Optional[float] = 0.0 # running/max_workers
+
+class NamedExecutor:
+    """
+    A named, sized thread or process pool with queue depth and utilization metrics. The pool is created on first use.
+    Note: the functions (and arguments) run in a process pool must be picklable.
+    """
+    def __init__(self, name:str, kind:ExecutorKind = "thread", max_workers:Optional[int] = None) -> None:
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers or (os.cpu_count() or 4)
+        self.stats = ExecutorStats(name=name, kind=kind, max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._executor:Optional[Executor] = None
+        self._in_flight = 0
+
+    @property
+    def executor(self)->Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"openagent-{self.name}")
+            return self._executor
+
+    def _run_counted(self, function_:Callable[..., Any]) -> Any:
+        with self._lock:
+            self.stats.running += 1
+        try:
+            return function_()
+        finally:
+            with self._lock:
+                self.stats.running -= 1
+
+    async def run(self, function_:Callable[..., Any], *args_) -> Any:
+        loop = asyncio.get_running_loop()
+        call = partial(function_, *args_) if args_ else function_
+        with self._lock:
+            self.stats.submitted += 1
+            self._in_flight += 1
+        try:
+            if self.kind == "thread": # count the running calls in worker threads
+                result = await loop.run_in_executor(self.executor, self._run_counted, call)
+            else:
+                result = await loop.run_in_executor(self.executor, call)
+        except asyncio.CancelledError:
+            with self._lock:
+                self.stats.cancelled += 1
+            raise
+        except BaseException:
+            with self._lock:
+                self.stats.failed += 1
+            raise
+        else:
+            with self._lock:
+                self.stats.completed += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def get_stats(self)->ExecutorStats:
+        with self._lock:
+            stats = self.stats.model_copy()
+            if self.kind != "thread": # workers of process pool are not observable, estimate by calls in flight
+                stats.running = min(self._in_flight, self.max_workers)
+            stats.queued = max(0, self._in_flight - stats.running)
+        stats.utilization = round(stats.running/self.max_workers, 4)
+        return stats
+
+    def shutdown(self, wait:bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+
+# named executors of the process
+## - default: blocking io/parsing of the sdk (document loading, html parsing, sqlite cache)
+## - single: tasks must run one by one
+## - tools: sync function tools (the default of sync tools)
+## - process: cpu-bound function tools
+THREAD_POOL_SIZE = int(env.get("OPENAGENT_THREAD_POOL_SIZE", "16"))
+TOOL_THREAD_POOL_SIZE = int(env.get("OPENAGENT_TOOL_THREAD_POOL_SIZE", "32"))
+_executors:Dict[str, NamedExecutor] = {
+    "default": NamedExecutor("default", "thread", THREAD_POOL_SIZE),
+    "single": NamedExecutor("single", "thread", 1),
+    "tools": NamedExecutor("tools", "thread", TOOL_THREAD_POOL_SIZE),
+    "process": NamedExecutor("process", "process", None),
+}
+_executors_lock = threading.Lock()
+
+def register_executor(name:str, kind:ExecutorKind = "thread", max_workers:Optional[int] = None)->NamedExecutor:
+    """Register (or resize) a named executor, e.g. a dedicated pool for a slow tool."""
+    with _executors_lock:
+        old = _executors.get(name)
+        _executors[name] = NamedExecutor(name, kind, max_workers)
+    if old:
+        old.shutdown(wait=False)
+    return _executors[name]
+
+def get_executor(name:str)->NamedExecutor:
+    with _executors_lock:
+        executor = _executors.get(name)
+    if executor is None:
+        raise KeyError(f"Executor `{name}` is not registered")
+    return executor
+
+def get_executor_stats()->List[ExecutorStats]:
+    with _executors_lock:
+        executors = list(_executors.values())
+    return [executor.get_stats() for executor in executors]
 
 def get_thread_pool():
-    return __thread_pool_executor
+    return get_executor("default").executor
 
 # execute resource-consuming sync function in thread pool
 async def run_in_thread_pool(function_, *args_):
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(get_thread_pool(), function_, *args_)
+    return await get_executor("default").run(function_, *args_)
 
 async def run_in_single_worker(function_, *args_):
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(__single_executor, function_, *args_)
\ No newline at end of file
+    return await get_executor("single").run(function_, *args_)
+
+async def run_in_executor(name:str, function_, *args_):
+    return await get_executor(name).run(function_, *args_)
@@ -0,0 +1,42 @@
+import json
+from typing import Any, Dict, List, Optional
+
+# Fast local token estimation without tokenizer:
+## ~4 characters per token for ascii text, ~1 token per character for non-ascii text (e.g. CJK)
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 765 # a high-detail 512x512 tile image
+MESSAGE_OVERHEAD_TOKENS = 4 # role and separators of each message
+
+def estimate_text_tokens(text:Optional[str])->int:
+    if not text:
+        return 0
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return (ascii_count + CHARS_PER_TOKEN - 1)//CHARS_PER_TOKEN + (len(text) - ascii_count)
+
+def estimate_message_tokens(message:Dict[str, Any])->int:
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimate_text_tokens(content)
+    elif isinstance(content, list): # multi-modal content parts
+        for part in content:
+            if not isinstance(part, dict):
+                tokens += estimate_text_tokens(str(part))
+            elif part.get("type") == "text":
+                tokens += estimate_text_tokens(part.get("text"))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += estimate_text_tokens(json.dumps(part, ensure_ascii=False, default=str))
+    elif content is not None:
+        tokens += estimate_text_tokens(str(content))
+    for tool_call in message.get("tool_calls") or []:
+        function = (tool_call.get("function") or {}) if isinstance(tool_call, dict) else {}
+        tokens += estimate_text_tokens(function.get("name")) + estimate_text_tokens(function.get("arguments"))
+    return tokens
+
+def estimate_messages_tokens(messages:Optional[List[Dict[str, Any]]])->int:
+    return sum(estimate_message_tokens(message) for message in messages or [])
+
+def estimate_json_tokens(value:Any)->int:
+    return estimate_text_tokens(json.dumps(value, ensure_ascii=False, default=str))
@@ -0,0 +1,110 @@
+"""
+In-process vector index of cosine similarity, vectorized by numpy.
+- Brute force: exact search over all vectors, for small indexes.
+- IVF (inverted file): the vectors are clustered by k-means once the index is large, a search scans the vectors of
+  the `nprobe` clusters nearest to the query. The clusters are retrained when the index has doubled since the last training.
+Vectors are inserted incrementally, the ids are the insertion order.
+"""
+import math
+import numpy as np
+from typing import Optional, List, Tuple, Sequence
+from pydantic import BaseModel
+
+class VectorIndexOptions(BaseModel):
+    ivf_threshold: Optional[int] = 4096 # build IVF at this many vectors, brute force below it. None to always use brute force
+    nlist: Optional[int] = None # clusters of IVF, sqrt(size) if None
+    nprobe: Optional[int] = 8 # clusters scanned by a search
+    kmeans_iterations: Optional[int] = 10
+    seed: Optional[int] = 0
+
+def _normalize(vectors:np.ndarray)->np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors/norms
+
+def _top_k(scores:np.ndarray, k:int)->np.ndarray:
+    """The positions of the k highest scores, the highest first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+class VectorIndex:
+    def __init__(self, dim:int, options:Optional[VectorIndexOptions] = None) -> None:
+        self.dim = dim
+        self.options = options or VectorIndexOptions()
+        self._vectors = np.zeros((64, dim), dtype=np.float32) # normalized, grown by doubling
+        self._size = 0
+        self._centroids:Optional[np.ndarray] = None
+        self._lists:List[np.ndarray] = [] # ids of the vectors of each cluster
+        self._appended:List[List[int]] = [] # ids inserted to each cluster since it was last searched
+        self._trained_size = 0
+
+    def __len__(self)->int:
+        return self._size
+
+    @property
+    def is_ivf(self)->bool:
+        return self._centroids is not None
+
+    def add(self, vectors:Sequence[Sequence[float]]|np.ndarray)->List[int]:
+        """Insert the vectors, return their ids."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        count = len(vectors)
+        if self._size + count > len(self._vectors):
+            capacity = max(len(self._vectors)*2, self._size + count)
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        ids = list(range(self._size, self._size + count))
+        self._vectors[self._size:self._size + count] = vectors
+        self._size += count
+        threshold = self.options.ivf_threshold
+        if threshold and self._size >= threshold and self._size >= 2*self._trained_size:
+            self._train()
+        elif self.is_ivf:
+            for id, cluster in zip(ids, np.argmax(vectors @ self._centroids.T, axis=1)):
+                self._appended[cluster].append(id)
+        return ids
+
+    def _train(self)->None:
+        """Cluster the vectors by spherical k-means."""
+        vectors = self._vectors[:self._size]
+        nlist = min(self.options.nlist or int(math.sqrt(self._size)), self._size)
+        random = np.random.default_rng(self.options.seed)
+        centroids = vectors[random.choice(self._size, nlist, replace=False)].copy()
+        for _ in range(self.options.kmeans_iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty] # keep the centroids of empty clusters
+            centroids = _normalize(sums)
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self._centroids = centroids
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._appended = [[] for _ in range(nlist)]
+        self._trained_size = self._size
+
+    def _get_list(self, cluster:int)->np.ndarray:
+        if self._appended[cluster]:
+            self._lists[cluster] = np.concatenate([self._lists[cluster], np.asarray(self._appended[cluster], dtype=np.int64)])
+            self._appended[cluster] = []
+        return self._lists[cluster]
+
+    def search(self, vector:Sequence[float]|np.ndarray, top_k:int = 5)->List[Tuple[int, float]]:
+        """Return the (id, cosine similarity) of the most similar vectors, the most similar first."""
+        if self._size == 0 or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, self.dim))[0]
+        if not self.is_ivf:
+            scores = self._vectors[:self._size] @ query
+            return [(int(id), float(scores[id])) for id in _top_k(scores, top_k)]
+        clusters = _top_k(self._centroids @ query, min(self.options.nprobe, len(self._lists)))
+        candidates = np.concatenate([self._get_list(cluster) for cluster in clusters])
+        if len(candidates) == 0:
+            return []
+        scores = self._vectors[candidates] @ query
+        return [(int(candidates[i]), float(scores[i])) for i in _top_k(scores, top_k)]
@@ -0,0 +1,54 @@
+"""
+Benchmark of the memory store: append (write-behind) and hydrate (load the tail window) throughput for 10k sessions.
+Run: python tests/benchmark_memory_store.py [sessions] [messages per session]
+"""
+import asyncio, os, sys, tempfile, time
+from openagent import SQLiteMemoryStore, InMemoryMemoryStore
+from openagent.base_agent import Memory
+
+SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+MESSAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+TAIL_MESSAGES = 10 # the window hydrated on resume
+TAIL_TOKENS = 2000
+
+def make_message(session:int, n:int)->dict:
+    role = "user" if n % 2 == 0 else "assistant"
+    return {"role": role, "content": f"message {n} of session {session}: " + "lorem ipsum dolor sit amet " * 8}
+
+async def benchmark(name:str, store)->None:
+    # append: the agents add messages to their memories, persisted behind
+    memories = [Memory(store=store, session_id=f"session-{i}", max_messages=TAIL_MESSAGES) for i in range(SESSIONS)]
+    started = time.perf_counter()
+    for n in range(MESSAGES):
+        for i, memory in enumerate(memories):
+            memory.add(make_message(i, n))
+    appended = time.perf_counter() - started
+    await store.flush()
+    written = time.perf_counter() - started
+    total = SESSIONS*MESSAGES
+    stats = store.get_stats()
+    print(f"[{name}] append {total} messages of {SESSIONS} sessions: "
+          f"{total/appended:,.0f} msg/s on the caller ({appended*1e6/total:.1f}us/msg), "
+          f"{total/written:,.0f} msg/s written in {stats.batches} batches")
+
+    # hydrate: resume every session with the tail window
+    started = time.perf_counter()
+    for i in range(SESSIONS):
+        memory = Memory(store=store, session_id=f"session-{i}", max_messages=TAIL_MESSAGES, max_tokens=TAIL_TOKENS)
+        await memory.load()
+        assert len(memory) > 0
+    elapsed = time.perf_counter() - started
+    print(f"[{name}] hydrate {SESSIONS} sessions (tail of {TAIL_MESSAGES} messages): "
+          f"{SESSIONS/elapsed:,.0f} sessions/s ({elapsed*1e3/SESSIONS:.2f}ms/session)")
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteMemoryStore(os.path.join(directory, "memory.db"))
+        await benchmark("sqlite", store)
+        store.close()
+    store = InMemoryMemoryStore()
+    await benchmark("in-memory", store)
+    store.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""
+Tests of the replicas of LoadBalancedChatClient: the latency samples which the balancing relies on.
+Run: python -m pytest tests/test_balancer.py, or python tests/test_balancer.py
+"""
+import asyncio
+from openagent.balancer import Replica
+from openagent.resilience import CircuitBreaker
+
+class FakeClient:
+    """The endpoint client of a replica, responding after `delay` seconds."""
+    def __init__(self, delay:float) -> None:
+        self.end_point = "http://replica/v1"
+        self.delay = delay
+
+    async def _send_completion(self, params:dict)->object:
+        await asyncio.sleep(self.delay)
+        return "completion"
+
+def test_cancelled_request_is_not_a_latency_sample():
+    async def main():
+        replica = Replica(FakeClient(10.0), CircuitBreaker("http://replica/v1"))
+        task = asyncio.ensure_future(replica.send({}))
+        await asyncio.sleep(0.01)
+        task.cancel() # e.g. the loser of a hedged request
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        stats = replica.get_stats()
+        assert stats.outstanding == 0 and stats.errors == 0 and len(replica.latencies) == 0 and stats.latency_avg == 0.0
+        replica.client.delay = 0.01
+        assert await replica.send({}) == "completion"
+        stats = replica.get_stats()
+        assert len(replica.latencies) == 1 and 0.0 < stats.latency_avg < 1.0 and stats.outstanding == 0
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,57 @@
+"""
+Behavior tests of the calculator evaluator, which replaces `eval`: adversarial inputs are rejected fast
+with CalculatorError, never evaluated or allowed to hang.
+Run: python -m pytest tests/test_calculator.py, or python tests/test_calculator.py
+"""
+import time
+from openagent.utils.calculator import evaluate_expression, format_value, CalculatorError, CalculatorLimits
+
+def assert_rejected(expression:str, message:str)->None:
+    started_at = time.monotonic()
+    try:
+        value = evaluate_expression(expression)
+    except CalculatorError as e:
+        assert message in str(e), f"{expression!r}: {e}"
+    else:
+        raise AssertionError(f"{expression!r} is not rejected: {value!r}")
+    assert time.monotonic() - started_at < 1.0, f"{expression!r} is rejected too slowly"
+
+def test_arithmetic():
+    assert format_value(evaluate_expression("1 + 2*3")) == "7"
+    assert format_value(evaluate_expression("sqrt(16) + mean([1, 2, 3])")) == "6"
+    assert abs(evaluate_expression("2**0.5") - 1.4142135623730951) < 1e-12
+
+def test_huge_numbers():
+    assert_rejected("9**9**9**9", "number too large")
+    assert_rejected("factorial(1000)", "number too large")
+    assert_rejected("factorial(10**6)", "factorial argument too large")
+    assert_rejected("-(2**8192)", "number too large")
+
+def test_non_numeric_constants():
+    assert_rejected("'a'*3", "unsupported value")
+    assert_rejected("True+1", "unsupported value")
+    assert_rejected("None", "unsupported value")
+
+def test_unsupported_syntax():
+    assert_rejected("max(*[1, 2])", "unsupported syntax")
+    assert_rejected("[x for x in range(3)]", "unsupported syntax")
+    assert_rejected("(1).__class__", "unsupported syntax")
+    assert_rejected("lambda: 1", "unsupported syntax")
+    assert_rejected("__import__('os')", "unknown function")
+    assert_rejected("x = 1", "invalid expression")
+
+def test_limits():
+    assert_rejected("1+" * 1000 + "1", "too long")
+    assert_rejected("abs(" * 40 + "1" + ")" * 40, "too deep")
+    try:
+        evaluate_expression("2**100", CalculatorLimits(max_int_bits=64))
+    except CalculatorError:
+        pass
+    else:
+        raise AssertionError("max_int_bits is not applied")
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,83 @@
+"""
+Fixture tests of the context-length error detection: the errors of the providers (recovered by fitting the messages),
+and other 400 errors which must not be taken for context overflow, nor shrink the learned window.
+Run: python -m pytest tests/test_context_window.py, or python tests/test_context_window.py
+"""
+import httpx
+from openai import BadRequestError
+from openagent.context_window import is_context_length_error, parse_context_length_error, ContextWindowTracker, fit_messages
+
+def make_error(message:str, code:str|None = None)->BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "http://localhost/v1/chat/completions"))
+    return BadRequestError(message, response=response, body={"error": {"message": message, "type": "invalid_request_error", "code": code}})
+
+# (provider, message, code, window, prompt tokens)
+CONTEXT_LENGTH_ERRORS = [
+    ("openai", "This model's maximum context length is 128000 tokens. However, your messages resulted in 130532 tokens. "
+               "Please reduce the length of the messages.", "context_length_exceeded", 128000, 130532),
+    ("openai-completion", "This model's maximum context length is 8192 tokens. However, you requested 9000 tokens "
+                          "(8000 in the messages, 1000 in the completion). Please reduce the length of the messages or completion.",
+                          None, 8192, 8000),
+    ("vllm", "This model's maximum context length is 4096 tokens. However, you requested 5120 tokens (4096 in the messages, "
+             "1024 in the completion). Please reduce the length of the messages or completion.", None, 4096, 4096),
+    ("vllm-v1", "The prompt (total length 40960) is too long to fit into the model (context length 32768). "
+                "Make sure that `max_model_len` is no smaller than the number of text tokens.", None, 32768, 40960),
+    ("anthropic", "prompt is too long: 208451 tokens > 200000 maximum", None, 200000, 208451),
+    ("mistral", "Prompt contains 40212 tokens and 0 draft tokens, too large for model with 32768 maximum context length",
+                None, 32768, 40212),
+    ("gemini", "The input token count (1200000) exceeds the maximum number of tokens allowed (1048576).", None, 1048576, 1200000),
+    ("tgi", "Input validation error: `inputs` tokens + `max_new_tokens` must be <= 4096. Given: 4000 `inputs` tokens "
+            "and 512 `max_new_tokens`", None, 4096, 4000),
+    ("llama.cpp", "the request exceeds the available context size, try increasing it", "exceed_context_size_error", None, None),
+]
+
+OTHER_ERRORS = [
+    "Invalid 'tools': array too long. The number of tools exceeds the maximum of 128.",
+    "The image exceeds the maximum size of 20MB.",
+    "Invalid 'messages[1].content': string too long. Expected a string with maximum length 10485760, but got a string with length 20971520 instead.",
+    "max_tokens is too large: 100000. This model supports at most 16384 completion tokens, whereas you provided 100000.",
+    "Too many tokens in the request logit_bias map.",
+    "Invalid value for 'temperature': must be between 0 and 2.",
+]
+
+def test_context_length_errors():
+    for provider, message, code, window, tokens in CONTEXT_LENGTH_ERRORS:
+        error = make_error(message, code)
+        assert is_context_length_error(error), provider
+        assert parse_context_length_error(error) == (window, tokens), provider
+
+def test_other_errors():
+    for message in OTHER_ERRORS:
+        assert not is_context_length_error(make_error(message)), message
+    assert not is_context_length_error(ValueError("maximum context length is 4096"))
+
+def test_learn_window():
+    tracker = ContextWindowTracker("http://localhost/v1", "model")
+    tracker.learn(make_error(CONTEXT_LENGTH_ERRORS[0][1]), estimated_tokens=120000)
+    window = tracker.window
+    assert window == 128000*120000//130532 # calibrated by the tokens counted by the endpoint
+    # an error without the window never lowers the learned window
+    tracker.learn(make_error("the request exceeds the available context size, try increasing it", "exceed_context_size_error"), estimated_tokens=1000)
+    assert tracker.window == window
+    assert tracker.get_stats().overflows == 2
+    unknown = ContextWindowTracker("http://localhost/v1", "other")
+    unknown.learn(make_error("the request exceeds the available context size", "exceed_context_size_error"), estimated_tokens=1000)
+    assert unknown.window is None
+
+def test_fit_messages():
+    messages = [{"role": "system", "content": "system"}, {"role": "user", "content": "old question " * 200},
+                {"role": "assistant", "content": None, "tool_calls": [{"id": "c1", "type": "function", "function": {"name": "f", "arguments": "{}"}}]},
+                {"role": "tool", "tool_call_id": "c1", "content": "result " * 2000},
+                {"role": "user", "content": "new question"}]
+    fitted, report = fit_messages(messages, 1000)
+    assert report.fitted and report.tokens_after <= 1000
+    assert fitted[0]["role"] == "system" and fitted[-1] == messages[-1]
+    call_ids = {call["id"] for message in fitted for call in message.get("tool_calls") or []}
+    assert all(message["tool_call_id"] in call_ids for message in fitted if message.get("role") == "tool") # no orphan tool results
+    assert messages[3]["content"] == "result " * 2000 # the messages of the run are untouched
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,96 @@
+"""
+Tests of the hedged requests: the latency budget from the observed latencies, and the race of the primary and
+the hedge calls, where the loser is cancelled (or discarded if it succeeded too).
+Run: python -m pytest tests/test_hedging.py, or python tests/test_hedging.py
+"""
+import asyncio
+from openagent.hedging import Hedger, HedgingOptions, LatencyTracker
+
+def make_hedger(**options)->Hedger:
+    return Hedger("http://endpoint/v1", "model", HedgingOptions(**{"initial_delay": 0.05, "min_delay": 0.01, "min_samples": 5, **options}))
+
+def test_latency_budget():
+    tracker = LatencyTracker(10)
+    assert tracker.percentile(95) == 0.0
+    for latency in range(1, 21): # the window keeps the latest 10
+        tracker.record(float(latency))
+    assert len(tracker) == 10 and tracker.percentile(50) == 15.0 and tracker.percentile(95) == 20.0
+    hedger = make_hedger(percentile=50, min_delay=0.5, max_delay=3.0)
+    assert hedger.get_budget(False) == 0.5 # initial_delay bounded by min_delay before min_samples
+    for latency in (1.0, 2.0, 2.0, 4.0, 8.0):
+        hedger._trackers[False].record(latency)
+    assert hedger.get_budget(False) == 2.0 and hedger.get_budget(True) == 0.5 # streams have their own latencies
+    hedger._trackers[False].record(100.0)
+    hedger._trackers[False].record(100.0)
+    assert hedger.get_budget(False) == 3.0 # max_delay
+
+def test_fast_primary_is_not_hedged():
+    async def main():
+        hedger = make_hedger()
+        hedged = []
+        async def primary():
+            return "primary"
+        async def hedge():
+            hedged.append(True)
+            return "hedge"
+        assert await hedger.run(primary, hedge) == "primary"
+        assert not hedged and hedger.stats.hedged == 0 and len(hedger._trackers[False]) == 1
+    asyncio.run(main())
+
+def test_slow_primary_is_cancelled():
+    async def main():
+        hedger = make_hedger()
+        cancelled = asyncio.Event()
+        async def primary():
+            try:
+                await asyncio.Event().wait() # never responds
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        async def hedge():
+            return "hedge"
+        assert await hedger.run(primary, hedge, stream=True) == "hedge"
+        await asyncio.wait_for(cancelled.wait(), 1.0) # the loser is cancelled
+        stats = hedger.get_stats()
+        assert stats.requests == 1 and stats.hedged == 1 and stats.hedge_wins == 1 and len(hedger._trackers[True]) == 1
+    asyncio.run(main())
+
+def test_succeeded_loser_is_discarded():
+    async def main():
+        hedger = make_hedger()
+        responded = asyncio.Event()
+        discarded = []
+        async def primary():
+            await responded.wait()
+            return "primary"
+        async def hedge():
+            responded.set() # both respond at once
+            return "hedge"
+        async def discard(result):
+            discarded.append(result)
+        winner = await hedger.run(primary, hedge, discard=discard)
+        assert len(discarded) == 1 and discarded[0] != winner # e.g. the stream of the loser is closed
+    asyncio.run(main())
+
+def test_both_failed():
+    async def main():
+        hedger = make_hedger()
+        async def primary():
+            await asyncio.sleep(0.1)
+            raise ConnectionError("primary")
+        async def hedge():
+            raise ConnectionError("hedge")
+        try:
+            await hedger.run(primary, hedge)
+        except ConnectionError as e:
+            assert str(e) == "primary" # the error of the primary
+        else:
+            raise AssertionError("the error is not raised")
+        assert hedger.stats.hedge_wins == 0 and len(hedger._trackers[False]) == 0 # failures are not latency samples
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,69 @@
+"""
+Tests of the in-memory conversation history: eviction by the token budget, tool calls evicted with their results,
+and the cached snapshot of the messages.
+Run: python -m pytest tests/test_memory.py, or python tests/test_memory.py
+"""
+from openagent.memory import Memory, MAX_IN_MEMORY_MESSAGES
+from openagent.utils.tokens import estimate_message_tokens
+
+def user(content:str)->dict:
+    return {"role": "user", "content": content}
+
+def tool_call(call_id:str)->dict:
+    return {"role": "assistant", "content": None, "tool_calls": [{"id": call_id, "type": "function", "function": {"name": "f", "arguments": "{}"}}]}
+
+def tool_result(call_id:str, content:str)->dict:
+    return {"role": "tool", "tool_call_id": call_id, "content": content}
+
+def test_token_budget_eviction():
+    message_tokens = estimate_message_tokens(user("x"*40))
+    memory = Memory(max_tokens=message_tokens*3)
+    for i in range(10):
+        memory.add(user(f"{i}"*40))
+    assert [message["content"][0] for message in memory.get_messages()] == ["7", "8", "9"]
+    assert memory.tokens == message_tokens*3 and len(memory) == 3 and memory.evicted == 7
+
+def test_token_budget_without_message_cap():
+    memory = Memory(max_tokens=100000)
+    for i in range(MAX_IN_MEMORY_MESSAGES*2):
+        memory.add(user("hi"))
+    assert len(memory.get_messages()) == MAX_IN_MEMORY_MESSAGES*2 # small messages within the budget are kept
+    memory = Memory()
+    for i in range(MAX_IN_MEMORY_MESSAGES*2):
+        memory.add(user("hi"))
+    assert len(memory.get_messages()) == MAX_IN_MEMORY_MESSAGES # the message cap without a token budget
+    memory = Memory(max_tokens=100000, max_messages=10)
+    for i in range(20):
+        memory.add(user("hi"))
+    assert len(memory.get_messages()) == 10
+
+def test_tool_call_evicted_with_results():
+    memory = Memory(max_tokens=estimate_message_tokens(user("x"*400))*2)
+    memory.add(user("question"))
+    memory.add(tool_call("c1"))
+    memory.add(tool_result("c1", "a"*200))
+    memory.add(tool_result("c1", "b"*200))
+    memory.add(user("x"*400))
+    memory.add(user("y"*400))
+    messages = memory.get_messages()
+    assert all(message.get("role") != "tool" for message in messages) # no orphan tool results
+    assert [message["content"][0] for message in messages] == ["x", "y"]
+    memory = Memory(max_tokens=1)
+    memory.add(tool_call("c2"))
+    memory.add(tool_result("c2", "a"*200))
+    assert [message.get("role") for message in memory.get_messages()] == ["assistant", "tool"] # the latest group is kept whole
+    memory.add(user("next"))
+    assert [message.get("role") for message in memory.get_messages()] == ["user"]
+
+def test_snapshot():
+    memory = Memory(messages=[user("a"), user("b")])
+    snapshot = memory.get_messages()
+    assert isinstance(snapshot, tuple) and memory.get_messages() is snapshot # cached until the next change
+    memory.add(user("c"))
+    assert memory.get_messages() is not snapshot and len(memory.get_messages()) == 3 and len(snapshot) == 2
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
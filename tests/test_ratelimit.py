@@ -0,0 +1,103 @@
+"""
+Tests of the client-side rate limiting: the token buckets and the AIMD adaptive concurrency, by a fake clock.
+Run: python -m pytest tests/test_ratelimit.py, or python tests/test_ratelimit.py
+"""
+import asyncio
+from contextlib import contextmanager
+from openagent import ratelimit
+from openagent.ratelimit import TokenBucket, AdaptiveConcurrencyLimiter, RateLimiter, RateLimitOptions
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self)->float:
+        return self.now
+
+    def advance(self, seconds:float)->None:
+        self.now += seconds
+
+@contextmanager
+def fake_clock():
+    clock = FakeClock()
+    saved, ratelimit.time = ratelimit.time, clock
+    try:
+        yield clock
+    finally:
+        ratelimit.time = saved
+
+def test_token_bucket():
+    with fake_clock() as clock:
+        bucket = TokenBucket(60) # 1 per second, 60 at most
+        assert all(bucket.delay(1) == 0.0 for _ in range(60))
+        assert bucket.delay(1) == 1.0
+        clock.advance(0.5)
+        assert bucket.delay(1) == 0.5
+        clock.advance(0.5)
+        assert bucket.delay(1) == 0.0
+        clock.advance(3600)
+        assert bucket.tokens <= 60 and bucket.delay(100) == 0.0 # capped, a request larger than the bucket waits for a full bucket
+        bucket.consume(30) # the usage beyond the estimation
+        assert bucket.delay(1) == 31.0
+        clock.advance(60)
+        bucket.drain()
+        assert bucket.tokens == 0 and bucket.delay(1) == 1.0
+
+def test_aimd():
+    with fake_clock() as clock:
+        limiter = AdaptiveConcurrencyLimiter(RateLimitOptions(max_concurrency=8, min_concurrency=1, initial_concurrency=8, decrease_interval=1.0))
+        limiter.on_overload()
+        assert limiter.limit == 4.0
+        limiter.on_overload() # the same burst of 429s
+        assert limiter.limit == 4.0
+        clock.advance(1.0)
+        limiter.on_overload()
+        clock.advance(1.0)
+        limiter.on_overload()
+        clock.advance(1.0)
+        limiter.on_overload()
+        assert limiter.limit == 1.0 # the lower bound
+        limiter.on_success()
+        assert limiter.limit == 2.0 # +1/limit
+        limiter.on_success()
+        assert limiter.limit == 2.5
+        for _ in range(1000):
+            limiter.on_success()
+        assert limiter.limit == 8.0 # the upper bound
+
+def test_concurrency_slots():
+    async def main():
+        limiter = AdaptiveConcurrencyLimiter(RateLimitOptions(max_concurrency=1))
+        assert await limiter.acquire() is False
+        waiter = asyncio.ensure_future(limiter.acquire())
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done() and limiter.in_flight == 1
+        cancelled.cancel()
+        limiter.release() # handed over to the first waiter
+        assert await waiter is True and limiter.in_flight == 1
+        await asyncio.gather(cancelled, return_exceptions=True)
+        limiter.release()
+        assert limiter.in_flight == 0 and not limiter._waiters
+    asyncio.run(main())
+
+def test_rate_limiter():
+    with fake_clock():
+        async def main():
+            limiter = RateLimiter("http://endpoint/v1", "model", RateLimitOptions(requests_per_minute=2, tokens_per_minute=1000, max_concurrency=4))
+            await limiter.acquire(100)
+            limiter.release(extra_tokens=400) # charge the actual usage
+            assert limiter.token_bucket.tokens == 500 and limiter.concurrency.limit == 4.0
+            await limiter.acquire(100)
+            limiter.release(success=False, rate_limited=True)
+            stats = limiter.get_stats()
+            assert stats.requests == 2 and stats.rate_limited == 1 and stats.concurrency_limit == 2.0 and stats.in_flight == 0
+            assert limiter.token_bucket.tokens == 0 # drained by the 429
+            assert limiter.request_bucket.delay(1) == 30.0 # the quota of requests is used up
+        asyncio.run(main())
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
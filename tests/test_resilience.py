@@ -0,0 +1,137 @@
+"""
+Tests of the retry policy and the state transitions of the circuit breaker, by a fake clock.
+Run: python -m pytest tests/test_resilience.py, or python tests/test_resilience.py
+"""
+import asyncio
+from contextlib import contextmanager
+import httpx
+from openai import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+from openagent import resilience
+from openagent.exceptions import CircuitOpenError
+from openagent.resilience import RetryPolicy, CircuitBreaker, CircuitBreakerOptions, CircuitState, call_with_retry
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self)->float:
+        return self.now
+
+    def time(self)->float:
+        return self.now
+
+    def advance(self, seconds:float)->None:
+        self.now += seconds
+
+@contextmanager
+def fake_clock():
+    clock = FakeClock()
+    saved, resilience.time = resilience.time, clock
+    try:
+        yield clock
+    finally:
+        resilience.time = saved
+
+REQUEST = httpx.Request("POST", "http://endpoint/v1/chat/completions")
+
+def connection_error()->APIConnectionError:
+    return APIConnectionError(request=REQUEST)
+
+def status_error(error_class:type, status_code:int, headers:dict|None = None)->Exception:
+    return error_class("error", response=httpx.Response(status_code, request=REQUEST, headers=headers), body=None)
+
+def test_retry_policy():
+    policy = RetryPolicy(max_retries=3, initial_delay=0.5, multiplier=2.0, max_delay=1.5, jitter=0.0)
+    assert [policy.get_delay(connection_error(), attempt) for attempt in range(4)] == [0.5, 1.0, 1.5, None]
+    assert policy.get_delay(status_error(InternalServerError, 500), 0) == 0.5
+    assert policy.get_delay(status_error(BadRequestError, 400), 0) is None # not transient
+    assert policy.get_delay(CircuitOpenError(details="open", module="llm"), 0) is None # fail fast
+    assert policy.get_delay(status_error(RateLimitError, 429, {"retry-after": "3"}), 0) == 3.0
+    assert policy.get_delay(status_error(RateLimitError, 429, {"retry-after-ms": "250"}), 0) == 0.5 # the longer of both
+    assert policy.get_delay(status_error(RateLimitError, 429, {"retry-after": "120"}), 0) is None # longer than max_retry_after
+    jittered = RetryPolicy(initial_delay=1.0, jitter=1.0)
+    assert all(0.0 <= jittered.get_delay(connection_error(), 0) <= 1.0 for _ in range(100))
+
+def test_circuit_breaker_transitions():
+    with fake_clock() as clock:
+        breaker = CircuitBreaker("http://endpoint/v1", CircuitBreakerOptions(failure_threshold=2, recovery_timeout=10.0, half_open_max_calls=1))
+        breaker.before_call()
+        breaker.on_error(status_error(RateLimitError, 429)) # busy, not down
+        breaker.before_call()
+        breaker.on_error(connection_error())
+        assert breaker.state == CircuitState.Closed
+        breaker.before_call()
+        breaker.on_error(status_error(InternalServerError, 500))
+        assert breaker.state == CircuitState.Open and breaker.stats.opened == 1
+        clock.advance(4.0)
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            assert abs(e.retry_after - 6.0) < 1e-9
+        else:
+            raise AssertionError("the open circuit doesn't fail fast")
+        assert not breaker.ready_to_probe()
+        clock.advance(6.0)
+        assert breaker.ready_to_probe()
+        breaker.before_call() # the probe
+        assert breaker.state == CircuitState.HalfOpen
+        try:
+            breaker.before_call() # only one probe at a time
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("the half open circuit allows more probes than half_open_max_calls")
+        breaker.on_error(connection_error()) # the probe failed
+        assert breaker.state == CircuitState.Open and breaker.stats.opened == 2
+        clock.advance(10.0)
+        breaker.before_call()
+        breaker.on_cancel() # the probe is given back
+        breaker.before_call()
+        breaker.on_success()
+        assert breaker.state == CircuitState.Closed and breaker.stats.consecutive_failures == 0
+        stats = breaker.get_stats()
+        assert stats.state == "closed" and stats.rejected == 2 and stats.failures == 3
+
+def test_half_open_closed_by_response():
+    with fake_clock() as clock:
+        breaker = CircuitBreaker("http://endpoint/v1", CircuitBreakerOptions(failure_threshold=1, recovery_timeout=1.0))
+        breaker.before_call()
+        breaker.on_error(connection_error())
+        clock.advance(1.0)
+        breaker.before_call()
+        breaker.on_error(status_error(BadRequestError, 400)) # the endpoint responded, it's up
+        assert breaker.state == CircuitState.Closed
+
+def test_breaker_without_options_never_opens():
+    breaker = CircuitBreaker("http://endpoint/v1")
+    for _ in range(100):
+        breaker.before_call()
+        breaker.on_error(connection_error())
+    assert breaker.state == CircuitState.Closed and breaker.stats.failures == 100
+
+def test_call_with_retry():
+    async def main():
+        errors = [connection_error(), status_error(InternalServerError, 503)]
+        async def call():
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+        policy = RetryPolicy(max_retries=3, initial_delay=0.0, jitter=0.0)
+        breaker = CircuitBreaker("http://endpoint/v1")
+        assert await call_with_retry(call, policy, breaker) == "ok"
+        assert breaker.stats.calls == 3 and breaker.stats.retries == 2 and breaker.stats.consecutive_failures == 0
+        errors.extend(connection_error() for _ in range(5))
+        try:
+            await call_with_retry(call, policy, breaker)
+        except APIConnectionError:
+            pass
+        else:
+            raise AssertionError("the retries are not exhausted")
+        assert breaker.stats.retries_exhausted == 1 and len(errors) == 1
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,108 @@
+"""
+Tests of the streamed tool calls: the deltas assembled by index (interleaved, out of order, arguments split across chunks),
+and the tools dispatched while the stream is still going on, by a fake stream of completion chunks.
+Run: python -m pytest tests/test_tool_call_stream.py, or python tests/test_tool_call_stream.py
+"""
+import asyncio, json
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta, ChoiceDeltaToolCall, ChoiceDeltaToolCallFunction
+from openagent.chatclient import OpenAIChatClient, ToolCallAssembler, ChatContext
+from openagent.tools import function_tool
+
+def tool_delta(index:int|None, arguments:str, name:str|None = None, id:str|None = None)->ChoiceDeltaToolCall:
+    # constructed without validation as the responses of the endpoints, which may miss the index
+    return ChoiceDeltaToolCall.model_construct(index=index, id=id, type="function" if id else None,
+                                               function=ChoiceDeltaToolCallFunction(name=name, arguments=arguments))
+
+def make_chunk(tool_calls:list|None = None, content:str|None = None, finish_reason:str|None = None)->ChatCompletionChunk:
+    return ChatCompletionChunk(id="chunk", created=0, model="fake", object="chat.completion.chunk",
+                               choices=[Choice(index=0, delta=ChoiceDelta(content=content, tool_calls=tool_calls), finish_reason=finish_reason)])
+
+def test_interleaved_out_of_order():
+    completed = []
+    assembler = ToolCallAssembler(on_complete=lambda tool_call: completed.append(tool_call.function.name))
+    assembler.add([tool_delta(1, "", name="weather", id="call_b")])
+    assembler.add([tool_delta(0, '{"ci', name="search", id="call_a")])
+    assembler.add([tool_delta(1, '{"city": "Par')])
+    assembler.add([tool_delta(0, 'ty": "Oslo"')])
+    assembler.add([tool_delta(1, 'is"}')])
+    assert completed == ["weather"] # dispatched as soon as its arguments are complete
+    assembler.add([tool_delta(0, "}")])
+    assert completed == ["weather", "search"]
+    tool_calls = assembler.finish()
+    assert [(t.index, t.id, t.type, t.function.name) for t in tool_calls] == [(0, "call_a", "function", "search"), (1, "call_b", "function", "weather")]
+    assert json.loads(tool_calls[0].function.arguments) == {"city": "Oslo"}
+    assert json.loads(tool_calls[1].function.arguments) == {"city": "Paris"}
+    assert completed == ["weather", "search"] # each call completed once
+
+def test_fragments_and_missing_index():
+    completed = []
+    assembler = ToolCallAssembler(on_complete=lambda tool_call: completed.append(tool_call.function.arguments))
+    assembler.add([tool_delta(None, '{"text": "a}', name="echo", id="call_1")]) # a brace in a string doesn't complete the call
+    for fragment in [' b"', ', "n": {"x": 1}', "}"]:
+        assembler.add([tool_delta(None, fragment)])
+    assembler.add([tool_delta(None, '{"text": "c"}', name="echo", id="call_2")]) # a name starts the next call
+    assembler.add([tool_delta(None, '{"text": "d', name="echo", id="call_3")])
+    assert completed == ['{"text": "a} b", "n": {"x": 1}}', '{"text": "c"}']
+    tool_calls = assembler.finish() # the incomplete call is completed at the end of the stream
+    assert [t.id for t in tool_calls] == ["call_1", "call_2", "call_3"] and completed[-1] == '{"text": "d'
+
+class FakeStreamClient(OpenAIChatClient):
+    """Stream the scripted chunks of each call instead of calling the endpoint."""
+    def __init__(self, scripts:list, **kwargs) -> None:
+        super().__init__(end_point="http://localhost:1/v1", model="fake", api_key="none", **kwargs)
+        self.scripts = list(scripts)
+
+    async def _create_completion_in_window(self, params:dict, session_id:str|None = None)->object:
+        chunks = self.scripts.pop(0)
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(0.01)
+                yield chunk
+        return stream()
+
+def test_tools_dispatched_while_streaming():
+    context = ChatContext()
+    seen = {}
+    events = []
+    @function_tool(execution="inline")
+    def lookup(city:str)->str:
+        """Look up the city."""
+        call_message = next(message for message in reversed(context.messages) if message.get("role") == "assistant")
+        seen[city] = [tool_call["id"] for tool_call in call_message["tool_calls"]] # the message visible while the tool runs
+        events.append(f"call {city}")
+        return f"{city}: sunny"
+    class Client(FakeStreamClient):
+        async def _create_completion_in_window(self, params:dict, session_id:str|None = None)->object:
+            stream = await super()._create_completion_in_window(params, session_id)
+            async def relay():
+                async for chunk in stream:
+                    yield chunk
+                events.append("end of stream")
+            return relay()
+    scripts = [
+        [make_chunk([tool_delta(0, '{"city": ', name="lookup", id="call_a")]),
+         make_chunk([tool_delta(0, '"Oslo"}')]),
+         make_chunk([tool_delta(1, '{"city": "Par', name="lookup", id="call_b")]),
+         make_chunk([tool_delta(1, 'is"}')]),
+         make_chunk(finish_reason="tool_calls")],
+        [make_chunk(content="It is sunny."), make_chunk(content=" Enjoy.", finish_reason="stop")],
+    ]
+    client = Client(scripts, tools=[lookup])
+    async def main():
+        chunks = [chunk async for chunk in await client.send("weather?", context=context, stream=True)]
+        return chunks
+    chunks = asyncio.run(main())
+    assert chunks[-1].done and chunks[-1].text == "It is sunny. Enjoy."
+    assert events.index("call Oslo") < events.index("end of stream") # dispatched before the stream of tool calls ended
+    assert seen["Oslo"] and seen["Oslo"][0] == "call_a" # never an assistant message with empty tool_calls
+    roles = [message["role"] for message in context.messages]
+    assert roles == ["user", "assistant", "tool", "tool", "assistant"]
+    assert [tool_call["id"] for tool_call in context.messages[1]["tool_calls"]] == ["call_a", "call_b"]
+    assert [message["tool_call_id"] for message in context.messages[2:4]] == ["call_a", "call_b"]
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,151 @@
+"""
+Fixture suite of the tool router: selection accuracy (recall of the expected tools in the routed tools)
+and the estimated prompt tokens saved on a catalog of tools of several (MCP) servers.
+Run: python -m pytest tests/test_tool_router.py, or python tests/test_tool_router.py for the report
+"""
+import asyncio
+from openagent import env, make_function_tool, ToolRouter, ToolRouterOptions
+from openagent.utils.tokens import estimate_json_tokens
+
+# optional: blend the embedding similarity, if an embedding model is set
+OPENAI_LLM_ENDPOINT = env.get("OPENAGENT_OPENAI_LLM_ENDPOINT")
+OPENAI_LLM_API_KEY = env.get("OPENAGENT_OPENAI_LLM_API_KEY")
+OPENAI_EMBEDDING_DEPLOYMENT = env.get("OPENAGENT_OPENAI_EMBEDDING_DEPLOYMENT")
+
+def make_embed():
+    if not OPENAI_EMBEDDING_DEPLOYMENT:
+        return None
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(base_url=OPENAI_LLM_ENDPOINT, api_key=OPENAI_LLM_API_KEY)
+    async def embed(texts:list[str])->list[list[float]]:
+        response = await client.embeddings.create(model=OPENAI_EMBEDDING_DEPLOYMENT, input=texts)
+        return [item.embedding for item in response.data]
+    return embed
+
+def _tool(input:str)->str:
+    """Parameters:
+        - input (type:str, required): the input of the tool
+    """
+    return input
+
+CATALOG = {
+    # weather & maps
+    "get_current_weather": "Get the current weather (temperature, humidity, wind) of a city or location.",
+    "get_weather_forecast": "Get the weather forecast of the next days for a city, including rain probability.",
+    "geocode_address": "Convert a street address into latitude and longitude coordinates.",
+    "get_driving_directions": "Get driving directions and travel time between two places on the map.",
+    "search_nearby_places": "Search restaurants, shops, hotels or other points of interest near a location.",
+    # calendar & email
+    "create_calendar_event": "Create a meeting or event in the user's calendar with title, time and attendees.",
+    "list_calendar_events": "List the upcoming meetings and events in the user's calendar for a date range.",
+    "cancel_calendar_event": "Cancel or delete a meeting in the calendar by its event id.",
+    "send_email": "Send an email message to recipients with subject and body.",
+    "search_emails": "Search the user's mailbox for emails by sender, subject or keywords.",
+    "read_email": "Read the full content and attachments of an email by its message id.",
+    # files
+    "read_file": "Read the text content of a file from the local file system by path.",
+    "write_file": "Write text content to a file on the local file system, overwriting it.",
+    "list_directory": "List the files and folders in a directory of the local file system.",
+    "delete_file": "Delete a file from the local file system.",
+    # code hosting & issues
+    "github_create_issue": "Create a new issue in a GitHub repository with title and description.",
+    "github_list_pull_requests": "List the open pull requests of a GitHub repository.",
+    "github_merge_pull_request": "Merge a pull request of a GitHub repository by its number.",
+    "github_search_code": "Search source code across GitHub repositories by keywords.",
+    "jira_create_ticket": "Create a Jira ticket (bug, task or story) in a project.",
+    "jira_update_ticket_status": "Move a Jira ticket to another status, e.g. in progress or done.",
+    # database
+    "sql_query": "Run a read-only SQL query against the analytics database and return the rows.",
+    "list_database_tables": "List the tables and their columns in the analytics database.",
+    # finance
+    "get_stock_price": "Get the latest stock price and daily change of a ticker symbol.",
+    "convert_currency": "Convert an amount of money from one currency to another with the current exchange rate.",
+    "get_crypto_price": "Get the current price of a cryptocurrency such as bitcoin or ethereum.",
+    # language & knowledge
+    "translate_text": "Translate text from one language to another language.",
+    "summarize_document": "Summarize a long document or article into key points.",
+    "search_from_web": "Search up-to-date information from the web with a search query.",
+    "search_wikipedia": "Look up an encyclopedia article on Wikipedia about a topic.",
+    "calculator": "Evaluate an arithmetic expression, e.g. sqrt(2)*3**2, and return the number.",
+    "unit_converter": "Convert a quantity between units, e.g. miles to kilometers, fahrenheit to celsius.",
+    # messaging
+    "slack_post_message": "Post a message to a Slack channel.",
+    "slack_search_messages": "Search messages in Slack channels by keywords.",
+    "send_sms": "Send a text message (SMS) to a phone number.",
+    # shopping & travel
+    "search_flights": "Search flights between two airports on a date, with prices.",
+    "book_hotel": "Book a hotel room in a city for check-in and check-out dates.",
+    "track_package": "Track the delivery status of a package by its tracking number.",
+    "search_products": "Search products in the online store catalog by keywords and price range.",
+    # media
+    "generate_image": "Generate an image from a text prompt.",
+    "transcribe_audio": "Transcribe speech in an audio file into text.",
+}
+
+# (turn, expected tools)
+FIXTURES = [
+    ("What's the weather like in Paris right now?", ["get_current_weather"]),
+    ("Will it rain in Seattle this weekend?", ["get_weather_forecast"]),
+    ("How long does it take to drive from Boston to New York?", ["get_driving_directions"]),
+    ("Find a good sushi restaurant near Union Square", ["search_nearby_places"]),
+    ("Schedule a meeting with Alice tomorrow at 3pm", ["create_calendar_event"]),
+    ("What meetings do I have next week?", ["list_calendar_events"]),
+    ("Cancel my 10am meeting", ["cancel_calendar_event"]),
+    ("Email Bob the quarterly report summary", ["send_email"]),
+    ("Did I get any emails from the landlord about the lease?", ["search_emails"]),
+    ("Show me what's in config.yaml", ["read_file"]),
+    ("Save these notes to notes.txt", ["write_file"]),
+    ("What files are in the project folder?", ["list_directory"]),
+    ("Open an issue on GitHub about the login crash", ["github_create_issue"]),
+    ("Which pull requests are still open in our repo?", ["github_list_pull_requests"]),
+    ("Create a Jira bug for the payment timeout", ["jira_create_ticket"]),
+    ("How many orders did we get last month? Query the database", ["sql_query"]),
+    ("What's Apple's stock price today?", ["get_stock_price"]),
+    ("How much is 100 dollars in euros?", ["convert_currency"]),
+    ("What is bitcoin trading at?", ["get_crypto_price"]),
+    ("Translate 'good morning' into Japanese", ["translate_text"]),
+    ("Summarize this article for me", ["summarize_document"]),
+    ("What's the latest news about the election?", ["search_from_web"]),
+    ("What is 17.5% of 2480?", ["calculator"]),
+    ("Convert 26.2 miles to kilometers", ["unit_converter"]),
+    ("Post the release notes in the #eng Slack channel", ["slack_post_message"]),
+    ("Find me a flight from SFO to JFK on June 3", ["search_flights"]),
+    ("Book a hotel in Rome from May 1 to May 4", ["book_hotel"]),
+    ("Where is my package 1Z999AA10123456784?", ["track_package"]),
+    ("Draw a picture of a cat astronaut", ["generate_image"]),
+    ("Transcribe the recording of yesterday's call", ["transcribe_audio"]),
+]
+
+# regression thresholds of the fixture suite (lexical routing: recall@5 23/30, ~79% of the tool definition tokens saved)
+MIN_RECALL = 0.75
+MIN_SAVED_RATIO = 0.7
+
+async def main(top_k:int = 5):
+    tools = [make_function_tool(name=name, description=description, callback=_tool, execution="inline")
+             for name, description in CATALOG.items()]
+    embed = make_embed()
+    router = ToolRouter(ToolRouterOptions(top_k=top_k), embed=embed)
+    hits = 0
+    for turn, expected in FIXTURES:
+        selected = await router.select(turn, tools)
+        router.record_request(tools, selected)
+        names = [tool.name for tool in selected]
+        fallback = len(selected) == len(tools)
+        hit = not fallback and all(name in names for name in expected)
+        hits += hit
+        print(f"{'OK  ' if hit else 'ALL ' if fallback else 'MISS'} {turn[:60]:60} -> {'(all tools)' if fallback else names}")
+    stats = router.get_stats()
+    total_tokens = sum(estimate_json_tokens(tool.json_schema) for tool in tools)
+    print(f"\nrouting: {'lexical + embedding' if embed else 'lexical'}, tools: {len(tools)}, top_k: {top_k}, tool definitions: ~{total_tokens} tokens per request")
+    print(f"recall@{top_k}: {hits}/{len(FIXTURES)} = {hits/len(FIXTURES):.2%}, fallbacks to all tools: {stats.fallbacks}")
+    print(f"prompt tokens saved: {stats.prompt_tokens_saved}/{stats.prompt_tokens_total} ({stats.saved_ratio:.2%}) over {stats.requests} requests")
+    return hits/len(FIXTURES), stats
+
+def test_tool_router():
+    recall, stats = asyncio.run(main())
+    assert recall >= MIN_RECALL, f"recall@5 {recall:.2%} < {MIN_RECALL:.0%}"
+    assert stats.requests == len(FIXTURES)
+    assert stats.saved_ratio >= MIN_SAVED_RATIO, f"saved {stats.saved_ratio:.2%} of the tool tokens < {MIN_SAVED_RATIO:.0%}"
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Tests of the tools compiled by `function_tool`: the validation and coercion of the arguments before the call,
+and the json schema of the arguments generated from the type hints (strict or not).
+Run: python -m pytest tests/test_tools.py, or python tests/test_tools.py
+"""
+import asyncio
+from enum import Enum
+from typing import Optional, List, Literal
+from pydantic import BaseModel, ValidationError
+from openagent.tools import function_tool, call_tool, store_tool_result, read_tool_result, ContextType, MAX_STORED_RESULTS
+
+class Color(Enum):
+    red = "red"
+    green = "green"
+
+class Address(BaseModel):
+    city: str
+    zip: Optional[str] = None
+
+@function_tool
+def book(name:str, count:int, address:Address, color:Color = Color.red, tags:Optional[List[str]] = None,
+         unit:Literal["kg", "lb"] = "kg")->str:
+    """Book an order.
+    Parameters:
+        - name (type:str, required): the name of the customer
+        - count (type:int, required): the number of items
+    """
+    return f"{name} {count} {address.city} {color.value} {tags} {unit}"
+
+@function_tool(strict=True)
+def book_strict(name:str, address:Address, color:Optional[Color] = None)->str:
+    return f"{name} {address.city} {color}"
+
+@function_tool
+def echo(text:str, context:ContextType, **kwargs)->str:
+    return f"{text} {sorted(kwargs)}"
+
+def assert_invalid(arguments:dict, message:str)->None:
+    try:
+        book.validate_arguments(arguments)
+    except ValidationError as e:
+        assert message in str(e), str(e)
+    else:
+        raise AssertionError(f"{arguments} is not rejected")
+
+def test_coercion():
+    values = book.validate_arguments({"name": 42, "count": "3", "address": {"city": "Paris"}, "color": "green"})
+    assert values["name"] == "42" and values["count"] == 3 and values["color"] is Color.green
+    assert isinstance(values["address"], Address) and values["address"].city == "Paris"
+    assert "tags" not in values and "unit" not in values # the function applies its own defaults
+
+def test_invalid_arguments():
+    assert_invalid({"name": "a", "count": "many", "address": {"city": "Paris"}}, "count")
+    assert_invalid({"name": "a", "count": 1}, "address")
+    assert_invalid({"name": "a", "count": 1, "address": {"city": "Paris"}, "unit": "g"}, "unit")
+    assert_invalid({"name": "a", "count": 1, "address": {"city": "Paris"}, "weight": 2}, "weight") # extra=forbid
+
+def test_validation_error_message():
+    result = asyncio.run(call_tool(book, {"name": "a", "count": "many", "address": {}}))
+    assert result.startswith("[ERROR]:") and "invalid_arguments" in result
+    assert "`count`" in result and "'many'" in result and "`address.city`" in result
+    assert "call the tool again" in result
+
+def test_kwargs_and_context():
+    context = ContextType()
+    values = echo.validate_arguments({"text": "hi", "extra": 1, "context": context})
+    assert values == {"text": "hi", "extra": 1, "context": context} # **kwargs allow extra arguments, the context is passed through
+    assert "context" not in echo.json_schema["function"]["parameters"]["properties"]
+
+def test_schema():
+    parameters = book.json_schema["function"]["parameters"]
+    properties = parameters["properties"]
+    assert parameters["required"] == ["name", "count", "address"]
+    assert properties["name"] == {"type": "string", "description": "the name of the customer"}
+    assert properties["count"]["type"] == "integer"
+    assert properties["unit"]["enum"] == ["kg", "lb"] and properties["unit"]["default"] == "kg"
+    assert {"type": "null"} in properties["tags"]["anyOf"] # Optional
+    assert {"type": "array", "items": {"type": "string"}} in properties["tags"]["anyOf"]
+    assert properties["address"] == {"$ref": "#/$defs/Address"}
+    assert parameters["$defs"]["Address"]["required"] == ["city"] and parameters["$defs"]["Color"]["enum"] == ["red", "green"]
+    assert "title" not in parameters and "title" not in parameters["$defs"]["Address"]
+    assert book.input_arguments["tags"] == "array[string]|null" and book.input_arguments["address"] == "Address"
+    assert "strict" not in book.json_schema["function"]
+
+def test_strict_schema():
+    function = book_strict.json_schema["function"]
+    parameters = function["parameters"]
+    assert function["strict"] is True
+    assert parameters["additionalProperties"] is False and parameters["$defs"]["Address"]["additionalProperties"] is False
+    assert sorted(parameters["required"]) == ["address", "color", "name"] # all properties are required in strict mode
+    assert sorted(parameters["$defs"]["Address"]["required"]) == ["city", "zip"]
+    assert "default" not in parameters["properties"]["color"]
+    try:
+        function_tool(strict=True)(lambda text, **kwargs: text)
+    except ValueError as e:
+        assert "strict" in str(e)
+    else:
+        raise AssertionError("**kwargs is not rejected in strict mode")
+
+def test_stored_results():
+    context = ContextType()
+    result = "0123456789"*100
+    preview = store_tool_result("search", result, context, max_tokens=50)
+    assert 'handle "search-1"' in preview and len(preview) < len(result)
+    page = read_tool_result(handle="search-1", context=context, offset=100)
+    assert page.startswith(result[100:200]) and "offset=" in page
+    assert store_tool_result("search", "small", context, max_tokens=50) == "small"
+    assert "Unknown" in read_tool_result(handle="search-1", context=ContextType()) # not shared by other runs
+    for i in range(MAX_STORED_RESULTS):
+        store_tool_result("search", result, context, max_tokens=50)
+    assert "Unknown" in read_tool_result(handle="search-1", context=context) # the least recently used is dropped
+    assert 'handle "search-34"' in store_tool_result("search", result, context, max_tokens=50) # handles are never reused
+    assert read_tool_result(handle="search-34", context=context).startswith(result[:100])
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")
@@ -0,0 +1,79 @@
+"""
+Tests of the vector index: the exact search below the IVF threshold, and the recall of IVF against brute force
+on a seeded dataset, including the vectors inserted after the clusters are trained.
+Run: python -m pytest tests/test_vector_index.py, or python tests/test_vector_index.py
+"""
+import numpy as np
+from openagent.utils.vector_index import VectorIndex, VectorIndexOptions
+
+DIM = 32
+MIN_RECALL = 0.9 # of the top 10 by IVF against brute force
+
+def make_dataset(count:int, clusters:int = 50, seed:int = 1)->np.ndarray:
+    """Vectors around random centers, as embeddings of texts on several topics."""
+    random = np.random.default_rng(seed)
+    centers = random.normal(size=(clusters, DIM))
+    return (centers[random.integers(clusters, size=count)] + 0.3*random.normal(size=(count, DIM))).astype(np.float32)
+
+def brute_force(vectors:np.ndarray, query:np.ndarray, top_k:int)->list:
+    normalized = vectors/np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query/np.linalg.norm(query))
+    return list(np.argsort(-scores, kind="stable")[:top_k])
+
+def recall(index:VectorIndex, vectors:np.ndarray, queries:np.ndarray, top_k:int = 10)->float:
+    hits = 0
+    for query in queries:
+        expected = set(brute_force(vectors, query, top_k))
+        hits += len(expected & {id for id, _ in index.search(query, top_k)})
+    return hits/(len(queries)*top_k)
+
+def test_exact_search():
+    vectors = make_dataset(300)
+    index = VectorIndex(DIM, VectorIndexOptions(ivf_threshold=None))
+    assert index.search(vectors[0]) == [] # empty
+    assert index.add(vectors[:100]) == list(range(100)) and index.add(vectors[100:]) == list(range(100, 300))
+    assert not index.is_ivf and len(index) == 300
+    queries = make_dataset(20, seed=2)
+    for query in queries:
+        results = index.search(query, 10)
+        assert [id for id, _ in results] == brute_force(vectors, query, 10)
+        assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
+    id, score = index.search(vectors[42], 1)[0]
+    assert id == 42 and abs(score - 1.0) < 1e-5
+    assert len(index.search(queries[0], 1000)) == 300 and index.search(queries[0], 0) == []
+    index.add([[0.0]*DIM]) # a zero vector doesn't break the normalization
+    assert np.isfinite([score for _, score in index.search(queries[0], 301)]).all()
+
+def test_ivf_recall():
+    vectors = make_dataset(4000)
+    queries = make_dataset(50, seed=2)
+    index = VectorIndex(DIM, VectorIndexOptions(ivf_threshold=1000, nprobe=8, seed=0))
+    index.add(vectors[:999])
+    assert not index.is_ivf
+    index.add(vectors[999:1000])
+    assert index.is_ivf and len(index._lists) == int(np.sqrt(1000)) # trained at the threshold
+    for start in range(1000, 1500, 100): # inserted into the trained clusters
+        index.add(vectors[start:start + 100])
+    assert index._trained_size == 1000
+    assert recall(index, vectors[:1500], queries) >= MIN_RECALL
+    index.add(vectors[1500:]) # doubled, retrained
+    assert index._trained_size == 4000 and len(index._lists) == int(np.sqrt(4000))
+    assert recall(index, vectors, queries) >= MIN_RECALL
+    index.options.nprobe = len(index._lists) # scan all clusters, exact
+    assert recall(index, vectors, queries) == 1.0
+
+def test_ivf_is_deterministic():
+    vectors = make_dataset(2000)
+    query = make_dataset(1, seed=3)[0]
+    results = []
+    for _ in range(2):
+        index = VectorIndex(DIM, VectorIndexOptions(ivf_threshold=500, nprobe=4, seed=7))
+        index.add(vectors)
+        results.append(index.search(query, 10))
+    assert results[0] == results[1]
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: passed")